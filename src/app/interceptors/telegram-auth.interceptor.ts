@@ -0,0 +1,28 @@
+import { Injectable } from '@angular/core';
+import {
+  HttpEvent,
+  HttpInterceptor,
+  HttpHandler,
+  HttpRequest
+} from '@angular/common/http';
+import { Observable } from 'rxjs';
+import { environment } from '../../environments/environment';
+
+/**
+ * Подписывает запросы к API данными Mini App: Authorization: tma <initData>
+ * Без initData (страница открыта не из Telegram) запрос уходит как есть.
+ */
+@Injectable()
+export class TelegramAuthInterceptor implements HttpInterceptor {
+  intercept(request: HttpRequest<any>, next: HttpHandler): Observable<HttpEvent<any>> {
+    const initData: string | undefined = (window as any).Telegram?.WebApp?.initData;
+
+    if (!initData || !request.url.startsWith(environment.apiUrl) || request.headers.has('Authorization')) {
+      return next.handle(request);
+    }
+
+    return next.handle(request.clone({
+      setHeaders: { Authorization: `tma ${initData}` }
+    }));
+  }
+}
@@ -0,0 +1,285 @@
+"""
+Материализованные агрегаты по игрокам
+
+Счётчики matches/wins по (игрок, боец) и (игрок, карта, боец) обновляются
+при записи новых боёв в BattleStore, поэтому чтение статистики — это
+O(бойцов), а не пересчёт всей истории игрока.
+
+Версия игрока — число учтённых боёв. Хранилище append-only, так что версия
+монотонна и одинакова после перестроения с нуля.
+
+Проверка согласованности с сырыми боями:
+    python aggregates.py rebuild --check
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from storage import Battle, BattleStore
+
+
+def counter_columns(counters: Dict[str, List[int]]) -> Tuple[List[str], np.ndarray]:
+    """Счётчики {имя: [matches, wins]} столбцами: имена по алфавиту и массив (имена × 2)"""
+    names = sorted(counters)
+    counts = np.array([counters[name] for name in names], dtype=np.int64).reshape(-1, 2)
+    return names, counts
+
+
+class PlayerAggregates:
+    """Счётчики одного игрока"""
+
+    __slots__ = ("version", "brawlers", "maps", "_columns")
+
+    def __init__(self, version: int = 0,
+                 brawlers: Optional[Dict[str, List[int]]] = None,
+                 maps: Optional[Dict[str, Dict[str, List[int]]]] = None):
+        self.version = version
+        # brawler -> [matches, wins]
+        self.brawlers: Dict[str, List[int]] = brawlers or {}
+        # map -> brawler -> [matches, wins]
+        self.maps: Dict[str, Dict[str, List[int]]] = maps or {}
+        self._columns = None
+
+    def add(self, battles: Iterable[Battle]):
+        for battle in battles:
+            win = battle.is_win
+
+            counter = self.brawlers.get(battle.brawler)
+            if counter is None:
+                counter = self.brawlers[battle.brawler] = [0, 0]
+            counter[0] += 1
+            counter[1] += win
+
+            map_counters = self.maps.get(battle.map)
+            if map_counters is None:
+                map_counters = self.maps[battle.map] = {}
+            counter = map_counters.get(battle.brawler)
+            if counter is None:
+                counter = map_counters[battle.brawler] = [0, 0]
+            counter[0] += 1
+            counter[1] += win
+
+            self.version += 1
+
+    def columns(self) -> Tuple[List[str], np.ndarray]:
+        """
+        Счётчики бойцов столбцами (counter_columns) для выбора страниц рейтинга
+
+        Строятся один раз на версию, а не на каждый запрос: страница
+        выбирается по готовым массивам без обхода словаря.
+        """
+        if self._columns is None or self._columns[0] != self.version:
+            self._columns = (self.version, *counter_columns(self.brawlers))
+        return self._columns[1], self._columns[2]
+
+    def to_dict(self) -> dict:
+        return {"version": self.version, "brawlers": self.brawlers, "maps": self.maps}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PlayerAggregates":
+        return cls(data["version"], data["brawlers"], data["maps"])
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, PlayerAggregates):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+
+class AggregateStore:
+    """
+    Агрегаты всех игроков поверх BattleStore
+
+    Состояние хранится в checkpoint (aggregates.json) и журнале изменений
+    (aggregates.log): каждые checkpoint_every записей в журнал дописываются
+    строки только изменившихся игроков, так что запись в event loop стоит
+    O(изменившихся), а не O(всех игроков). Когда журнал перерастает
+    checkpoint, он сливается с checkpoint в фоновом потоке по файлам, не
+    трогая состояние в памяти. При открытии догоняются только бои,
+    записанные после checkpoint и журнала.
+    """
+
+    def __init__(self, store: BattleStore, checkpoint_every: int = 1000):
+        self.store = store
+        self.path = store.path / "aggregates.json"
+        self.log_path = store.path / "aggregates.log"
+        # Журнал, который сейчас сливается с checkpoint
+        self.merging_path = store.path / "aggregates.log.merging"
+        self.checkpoint_every = checkpoint_every
+        self._players: Dict[str, PlayerAggregates] = {}
+        self._dirty: Set[str] = set()
+        self._ingests = 0
+        self._merge: Optional[threading.Thread] = None
+
+        self._load()
+        store.add_listener(self._on_ingest)
+
+    @staticmethod
+    def _read_log(path: Path) -> Dict[str, dict]:
+        players = {}
+        if path.exists():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        player_id, player = json.loads(line)
+                    except ValueError:
+                        # Строка, оборванная падением; бои догонятся из хранилища
+                        break
+                    players[player_id] = player
+        return players
+
+    def _load(self):
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self._players = {
+                player_id: PlayerAggregates.from_dict(player)
+                for player_id, player in data["players"].items()
+            }
+        if self.merging_path.exists():
+            # Слияние прервано остановкой: доделываем до приёма записей
+            self._merge_log()
+        for player_id, player in self._read_log(self.log_path).items():
+            self._players[player_id] = PlayerAggregates.from_dict(player)
+
+        # Догоняем бои, записанные после последнего checkpoint
+        for player_id in self.store.players():
+            aggregates = self._players.get(player_id)
+            if aggregates is None:
+                aggregates = self._players[player_id] = PlayerAggregates()
+            if aggregates.version < self.store.battle_count(player_id):
+                aggregates.add(self.store.iter_player(player_id, skip=aggregates.version))
+                self._dirty.add(player_id)
+
+    def _on_ingest(self, player_id: str, battles: List[Battle]):
+        aggregates = self._players.get(player_id)
+        if aggregates is None:
+            aggregates = self._players[player_id] = PlayerAggregates()
+        aggregates.add(battles)
+
+        self._dirty.add(player_id)
+        self._ingests += 1
+        if self._ingests >= self.checkpoint_every:
+            self.flush()
+
+    def get(self, player_id: str) -> Optional[PlayerAggregates]:
+        return self._players.get(player_id)
+
+    def version(self, player_id: str) -> int:
+        aggregates = self._players.get(player_id)
+        return aggregates.version if aggregates else 0
+
+    def flush(self):
+        """Дописать в журнал изменившихся игроков; O(изменившихся)"""
+        self._ingests = 0
+        if not self._dirty:
+            return
+        lines = "".join(
+            json.dumps([player_id, self._players[player_id].to_dict()], ensure_ascii=False) + "\n"
+            for player_id in self._dirty
+        )
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(lines)
+        self._dirty.clear()
+
+        if self._merge is None or not self._merge.is_alive():
+            base_size = self.path.stat().st_size if self.path.exists() else 0
+            if self.log_path.stat().st_size > base_size and not self.merging_path.exists():
+                # Новые строки пойдут в свежий журнал, пока этот сливается с checkpoint
+                os.replace(self.log_path, self.merging_path)
+                self._merge = threading.Thread(target=self._merge_log, name="aggregates-merge")
+                self._merge.start()
+
+    def _merge_log(self):
+        """checkpoint + сливаемый журнал -> новый checkpoint; только файлы, без состояния в памяти"""
+        players = {}
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                players = json.load(f)["players"]
+        players.update(self._read_log(self.merging_path))
+        self._write(players)
+        self.merging_path.unlink()
+
+    def _write(self, players: Dict[str, dict]):
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"players": players}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def checkpoint(self):
+        """Атомарно сохранить все агрегаты на диск и очистить журнал (остановка, rebuild)"""
+        if self._merge is not None:
+            self._merge.join()
+        self._write({
+            player_id: aggregates.to_dict()
+            for player_id, aggregates in self._players.items()
+        })
+        for log_path in (self.merging_path, self.log_path):
+            log_path.unlink(missing_ok=True)
+        self._dirty.clear()
+        self._ingests = 0
+
+    def rebuild_player(self, player_id: str) -> PlayerAggregates:
+        """Пересчитать агрегаты игрока с нуля по сырым боям"""
+        aggregates = PlayerAggregates()
+        aggregates.add(self.store.iter_player(player_id))
+        return aggregates
+
+    def verify(self) -> List[str]:
+        """Сравнить материализованные агрегаты с пересчётом. Возвращает расходящихся игроков"""
+        mismatched = []
+        for player_id in self.store.players():
+            if self._players.get(player_id) != self.rebuild_player(player_id):
+                mismatched.append(player_id)
+        return mismatched
+
+    def rebuild(self):
+        """Перестроить все агрегаты по сырым боям и сохранить checkpoint"""
+        self._players = {
+            player_id: self.rebuild_player(player_id)
+            for player_id in self.store.players()
+        }
+        self.checkpoint()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обслуживание агрегатов")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--data-dir", default=None, help="каталог хранилища (по умолчанию DATA_DIR)")
+    parser.add_argument("--check", action="store_true", help="только проверить, ничего не перезаписывая")
+    args = parser.parse_args()
+
+    data_dir = args.data_dir
+    if data_dir is None:
+        from config import settings
+        data_dir = settings.DATA_DIR
+
+    if not Path(data_dir).exists():
+        print(f"Каталог хранилища {data_dir} не найден")
+        sys.exit(1)
+
+    store = BattleStore(data_dir)
+    aggregates = AggregateStore(store)
+
+    mismatched = aggregates.verify()
+    print(f"Игроков: {len(store.players())}, расхождений: {len(mismatched)}")
+    for player_id in mismatched[:20]:
+        print(f"  {player_id}: версия {aggregates.version(player_id)}, боёв {store.battle_count(player_id)}")
+
+    if args.check:
+        store.close()
+        sys.exit(1 if mismatched else 0)
+
+    aggregates.rebuild()
+    print("Агрегаты перестроены")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
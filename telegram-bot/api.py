@@ -1,16 +1,192 @@
-from fastapi import FastAPI, HTTPException, Query
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
-from datetime import datetime, timedelta
-import random
+from starlette.concurrency import run_in_threadpool
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+from datetime import datetime, timedelta, timezone
+import asyncio
+import base64
+import bisect
+import hashlib
+import hmac
+import inspect
+import os
+import time
+from urllib.parse import quote
 
+import aiohttp
+import numpy as np
+import orjson
+
+from aggregates import AggregateStore, PlayerAggregates, counter_columns
+from brawl_api import BrawlStarsAPIError, BrawlStarsClient, canonical_player_id
+from cache import ResponseCache
+from compression import ENCODINGS, Compressor
 from config import settings
+from events import EventBroker
+from export import FORMATS, export_battles
+from map_engine import SORTS, After, MapEngine, PlayerMapMatrix, select
+from metrics import CONTENT_TYPE, MetricsMiddleware, Registry
+from rollups import GRANULARITIES, PlayerRollup, RollupStore, epoch_day, window_buckets
+from singleflight import SingleFlight
+from snapshot import (
+    SnapshotAggregates, SnapshotBattles, SnapshotMaps, SnapshotPublisher, SnapshotReader, SnapshotRollups,
+    SnapshotWriter
+)
+from storage import Battle, BattleStore
+from telegram_webapp import TelegramWebApp
+
+# Роли процессов prefork.py: писатель ведёт хранилище и публикует снимки,
+# воркеры отвечают на запросы по снимку в общей памяти
+snapshot_reader: Optional[SnapshotReader] = None
+snapshot_publisher: Optional[SnapshotPublisher] = None
+# Воркер: соединение с писателем через unix-сокет (создаётся при старте)
+writer_session: Optional[aiohttp.ClientSession] = None
+
+if settings.API_ROLE == "worker":
+    snapshot_reader = SnapshotReader(settings.DATA_DIR, settings.ROLLUP_MAX_PLAYERS)
+    battle_store = SnapshotBattles(snapshot_reader)
+    aggregate_store = SnapshotAggregates(snapshot_reader)
+    rollup_store = SnapshotRollups(snapshot_reader)
+    map_engine = SnapshotMaps(battle_store)
+else:
+    battle_store = BattleStore(settings.DATA_DIR, settings.SEGMENT_MAX_BYTES)
+    aggregate_store = AggregateStore(battle_store)
+    rollup_store = RollupStore(battle_store, settings.ROLLUP_MAX_PLAYERS)
+    map_engine = MapEngine(battle_store, settings.MAP_ENGINE_MAX_BYTES)
+    if settings.API_ROLE == "writer":
+        snapshot_publisher = SnapshotPublisher(
+            SnapshotWriter(battle_store, aggregate_store, rollup_store, map_engine),
+            settings.SNAPSHOT_BATCH_PLAYERS
+        )
+brawl_client = BrawlStarsClient(
+    api_key=settings.BRAWL_STARS_API_KEY,
+    base_url=settings.BRAWL_STARS_API_URL,
+    rate=settings.BRAWL_STARS_RATE_LIMIT,
+    burst=settings.BRAWL_STARS_BURST,
+    max_connections=settings.BRAWL_STARS_MAX_CONNECTIONS,
+    timeout=settings.BRAWL_STARS_TIMEOUT,
+    max_retries=settings.BRAWL_STARS_MAX_RETRIES
+)
+# Параллельные синхронизации одного игрока делят один запрос к Brawl Stars API
+sync_flight = SingleFlight()
+event_broker = EventBroker(settings.SSE_BUFFER_SIZE, settings.SSE_HEARTBEAT)
+telegram_webapp = TelegramWebApp(
+    settings.BOT_TOKEN,
+    max_age=settings.WEBAPP_AUTH_MAX_AGE,
+    cache_size=settings.WEBAPP_AUTH_CACHE_SIZE
+)
+service_token = settings.service_token.encode()
+compressor = Compressor(settings.COMPRESSION_MIN_BYTES, settings.GZIP_LEVEL, settings.BROTLI_QUALITY)
+response_cache = ResponseCache(
+    max_entries=settings.CACHE_MAX_ENTRIES,
+    ttl=settings.CACHE_TTL,
+    redis_host=settings.REDIS_HOST if settings.REDIS_ENABLED else None,
+    redis_port=settings.REDIS_PORT,
+    redis_db=settings.REDIS_DB
+)
+
+# Метрики процесса для /metrics
+metrics_registry = Registry()
+sync_duration = metrics_registry.histogram(
+    "api_sync_duration_seconds", "Загрузка battlelog из Brawl Stars API при синхронизации", ("result",)
+)
+metrics_registry.callback(
+    "api_cache_lookups", "Обращения к кэшу ответов", "counter",
+    lambda: [((result,), response_cache.stats[key])
+             for result, key in (("lru_hit", "lru_hits"), ("redis_hit", "redis_hits"), ("miss", "misses"))],
+    ("result",)
+)
+metrics_registry.callback(
+    "api_cache_hit_ratio", "Доля попаданий в кэш ответов", "gauge",
+    lambda: [((), response_cache.snapshot()["hit_rate"])]
+)
+metrics_registry.callback(
+    "brawl_api_events", "Запросы клиента Brawl Stars API: requests, retries, throttled, errors", "counter",
+    lambda: [((event,), value) for event, value in brawl_client.stats.items()],
+    ("event",)
+)
+metrics_registry.callback(
+    "api_sync_calls", "Синхронизации: calls — запросы к API, shared — присоединившиеся к идущей", "counter",
+    lambda: [((kind,), value) for kind, value in sync_flight.stats.items()],
+    ("kind",)
+)
+metrics_registry.callback(
+    "api_compressed_responses", "Ответы с кэшем по отданной кодировке: identity, gzip, br", "counter",
+    lambda: [((encoding,), compressor.stats[encoding]) for encoding in ("identity", *ENCODINGS)],
+    ("encoding",)
+)
+metrics_registry.callback(
+    "api_compression_bytes", "Байты ответов с кэшем до (raw) и после (sent) сжатия", "counter",
+    lambda: [((kind,), compressor.stats[f"{kind}_bytes"]) for kind in ("raw", "sent")],
+    ("kind",)
+)
+metrics_registry.callback(
+    "api_compressions", "Сжатия тел ответов (промахи кэша сжатых тел)", "counter",
+    lambda: [((), compressor.stats["compressions"])]
+)
+metrics_registry.callback(
+    "api_sse_subscribers", "Открытые SSE-подписки", "gauge",
+    lambda: [((), event_broker.stats["subscribers"])]
+)
+if settings.API_ROLE != "single":
+    metrics_registry.callback(
+        "api_snapshot_generation", "Поколение снимка агрегатов: опубликованное писателем или видимое воркеру",
+        "gauge",
+        lambda: [((), snapshot_reader.generation if snapshot_reader else snapshot_publisher.writer.generation)]
+    )
+
+
+async def wait_for_snapshot():
+    """Воркер: не принимать запросы, пока писатель не опубликовал первое поколение"""
+    attempts = 0
+    while not snapshot_reader.refresh():
+        attempts += 1
+        if attempts == 50:
+            print(f"Воркер {os.getpid()}: ждём первый снимок от писателя...")
+        await asyncio.sleep(0.1)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global writer_session
+    watcher = backfill = None
+    if snapshot_publisher is not None:
+        # Писатель: игроки, которых нет в снимке (первый запуск — все), публикуются
+        # пачками в фоне, не блокируя запуск; воркеры ждут первое поколение
+        backfill = asyncio.create_task(snapshot_publisher.backfill(snapshot_publisher.writer.stale()))
+    if snapshot_reader is not None:
+        await wait_for_snapshot()
+        writer_session = aiohttp.ClientSession(
+            connector=aiohttp.UnixConnector(path=settings.writer_socket),
+            timeout=aiohttp.ClientTimeout(total=settings.BRAWL_STARS_TIMEOUT * (settings.BRAWL_STARS_MAX_RETRIES + 1))
+        )
+        watcher = asyncio.create_task(watch_snapshot())
+
+    yield
+
+    if watcher is not None:
+        watcher.cancel()
+    if backfill is not None and not backfill.done():
+        backfill.cancel()
+        await asyncio.gather(backfill, return_exceptions=True)
+    if writer_session is not None:
+        await writer_session.close()
+    await brawl_client.close()
+    await response_cache.close()
+    aggregate_store.checkpoint()
+    battle_store.close()
+    if snapshot_publisher is not None:
+        snapshot_publisher.writer.close()
+
 
 app = FastAPI(
     title="Brawl Stars Analytics API",
     description="API для аналитики игроков Brawl Stars",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS для Angular приложения
@@ -20,8 +196,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Content-Disposition"],
 )
 
+# Время, размер и статус каждого ответа по шаблону маршрута
+app.add_middleware(MetricsMiddleware, registry=metrics_registry, prefix="api")
+
 
 # ============= Models =============
 
@@ -36,6 +216,7 @@ class TopBrawlersResponse(BaseModel):
     player_id: str
     count: int
     brawlers: List[BrawlerStats]
+    next_cursor: Optional[str] = None
 
 
 class WinrateHistoryPoint(BaseModel):
@@ -45,10 +226,20 @@ class WinrateHistoryPoint(BaseModel):
     win_rate: float
 
 
+class DailySummaryResponse(BaseModel):
+    player_id: str
+    date: str
+    matches: int
+    wins: int
+    win_rate: float
+    brawlers: List[BrawlerStats]
+
+
 class BrawlerWinrateHistoryResponse(BaseModel):
     player_id: str
     brawler: str
     days: int
+    granularity: str = "day"
     history: List[WinrateHistoryPoint]
 
 
@@ -65,12 +256,44 @@ class MapBrawlersResponse(BaseModel):
     map: str
     count: int
     brawlers: List[MapBrawlerStats]
+    next_cursor: Optional[str] = None
+
+
+class MapStats(BaseModel):
+    map: str
+    matches: int
+    wins: int
+    win_rate: float
+
+
+class TopMapsResponse(BaseModel):
+    player_id: str
+    count: int
+    maps: List[MapStats]
+    next_cursor: Optional[str] = None
+
+
+class BrawlerHistory(BaseModel):
+    brawler: str
+    history: List[WinrateHistoryPoint]
+
+
+class DashboardResponse(BaseModel):
+    player_id: str
+    version: int
+    days: int
+    granularity: str
+    brawlers: Optional[List[BrawlerStats]] = None
+    histories: Optional[List[BrawlerHistory]] = None
+    best_maps: Optional[List[MapStats]] = None
+    worst_maps: Optional[List[MapStats]] = None
 
 
 class SyncResponse(BaseModel):
     player_id: str
     last_match_time: str
     message: str
+    new_battles: int = 0
 
 
 class ErrorResponse(BaseModel):
@@ -79,70 +302,527 @@ class ErrorResponse(BaseModel):
     message: str
 
 
-# ============= Mock Data Generator =============
+# ============= Analytics =============
 
-def generate_mock_brawlers(player_id: str) -> List[BrawlerStats]:
-    """Генерирует моковые данные бойцов"""
-    brawlers = [
-        "Shelly", "Colt", "Bull", "Brock", "Rico", 
-        "Spike", "Crow", "Leon", "Sandy", "Amber",
-        "Edgar", "Mortis", "Poco", "Pam", "Frank"
+def _win_rate(wins: int, matches: int) -> float:
+    return round(wins / matches, 3) if matches > 0 else 0.0
+
+
+def _day_start(date) -> int:
+    return int(datetime.combine(date, datetime.min.time(), timezone.utc).timestamp())
+
+
+class Page(NamedTuple):
+    """Страница рейтинга: элементы и позиция последнего, если дальше есть ещё"""
+    items: List[dict]
+    last: Optional[After]
+
+
+def make_page(rows: List[Tuple[Union[int, str], int, int]], limit: Optional[int],
+              item: Callable[[Union[int, str], int, int], dict]) -> Page:
+    """Страница из строк (id, matches, wins), отобранных с запасом в одну: лишняя значит «есть ещё»"""
+    if limit is None or len(rows) <= limit:
+        return Page([item(*row) for row in rows], None)
+    rows = rows[:limit]
+    last_id, matches, wins = rows[-1]
+    return Page([item(*row) for row in rows], (matches, wins, last_id))
+
+
+def brawler_page(names: List[str], counts: np.ndarray, limit: Optional[int] = None,
+                 sort: str = "win_rate", after: Optional[After] = None) -> Page:
+    """
+    Рейтинг бойцов по счётчикам столбцами (counter_columns) в виде dict по схеме BrawlerStats
+
+    Выбор через select(): при limit сортируются только limit + 1 кандидатов.
+    Имена идут по алфавиту, поэтому id для select() — их номера, а имя из
+    курсора переводится в номер бинарным поиском.
+    """
+    if after is not None:
+        matches, wins, name = after
+        # Номера больше bisect_right - 0.5 — ровно имена после name, даже если его уже нет
+        after = (matches, wins, bisect.bisect_right(names, name) - 0.5)
+    chosen = select(
+        np.arange(len(names)), counts[:, 0], counts[:, 1], None if limit is None else limit + 1, sort, after=after
+    )
+    rows = [(names[i], matches, wins) for i, (matches, wins) in zip(chosen.tolist(), counts[chosen].tolist())]
+    return make_page(rows, limit, lambda brawler, matches, wins: {
+        "brawler": brawler, "matches": matches, "wins": wins, "win_rate": _win_rate(wins, matches)
+    })
+
+
+def rank_brawlers(counters: Dict[str, List[int]]) -> List[dict]:
+    """Бойцы по убыванию винрейта в виде dict по схеме BrawlerStats"""
+    return brawler_page(*counter_columns(counters)).items
+
+
+def compute_top_brawlers(player_id: str, limit: Optional[int] = None, sort: str = "win_rate",
+                         after: Optional[After] = None) -> Page:
+    """Статистика бойцов игрока из материализованных счётчиков"""
+    return brawler_page(*aggregate_store.get(player_id).columns(), limit, sort, after)
+
+
+def history_points(rollup: PlayerRollup, brawler: str, days: int, granularity: str = "day") -> List[dict]:
+    """
+    Точки истории винрейта бойца из роллапа
+
+    Точки собираются из массивов роллапа сразу в dict по схеме
+    WinrateHistoryPoint: построение сотен pydantic-моделей стоит дороже
+    самого расчёта.
+    """
+    last_day = epoch_day(datetime.now(timezone.utc).date())
+    bounds, labels = window_buckets(last_day - days + 1, last_day, granularity)
+    matches, wins = rollup.buckets(brawler, bounds)
+    rates = np.round(np.divide(wins, matches, out=np.zeros(len(matches)), where=matches > 0), 3)
+
+    return [
+        {"date": label, "matches": m, "wins": w, "win_rate": rate}
+        for label, m, w, rate in zip(labels, matches.tolist(), wins.tolist(), rates.tolist())
     ]
-    
-    result = []
-    for brawler in brawlers[:10]:
-        matches = random.randint(50, 200)
-        wins = random.randint(10, matches)
-        result.append(BrawlerStats(
-            brawler=brawler,
-            matches=matches,
-            wins=wins,
-            win_rate=round(wins / matches, 3)
-        ))
-    
-    # Сортируем по винрейту
-    result.sort(key=lambda x: x.win_rate, reverse=True)
+
+
+def compute_history(player_id: str, brawler: str, days: int, granularity: str = "day") -> List[dict]:
+    """Винрейт бойца за последние days дней (UTC) по дням, неделям или месяцам"""
+    return history_points(rollup_store.get(player_id), brawler, days, granularity)
+
+
+def compute_daily_summary(player_id: str, day: int) -> dict:
+    """Итоги дня day (эпохальный день UTC) по бойцам в виде dict по схеме DailySummaryResponse"""
+    brawlers, matches, wins = rollup_store.get(player_id).window_all(day, day)
+    counters = {
+        brawler: [m, w]
+        for brawler, m, w in zip(brawlers, matches.tolist(), wins.tolist())
+        if m > 0
+    }
+    total_matches = sum(m for m, _ in counters.values())
+    total_wins = sum(w for _, w in counters.values())
+    return {
+        "player_id": player_id,
+        "date": np.datetime_as_string(np.datetime64(day, "D")),
+        "matches": total_matches,
+        "wins": total_wins,
+        "win_rate": _win_rate(total_wins, total_matches),
+        "brawlers": rank_brawlers(counters)
+    }
+
+
+def compute_map_brawlers(player_id: str, map_name: str, min_matches: int = 1, limit: Optional[int] = None,
+                         sort: str = "win_rate", after: Optional[After] = None) -> Page:
+    """Рейтинг бойцов игрока на карте по матрице карта × боец (dict по схеме MapBrawlerStats)"""
+    map_id = map_engine.map_id(map_name)
+    if map_id is None:
+        return Page([], None)
+
+    rows = map_engine.get(player_id).map_brawlers(
+        map_id, None if limit is None else limit + 1, min_matches, sort, after
+    )
+    return make_page(rows, limit, lambda brawler_id, matches, wins: {
+        "brawler": map_engine.brawler_name(brawler_id),
+        "map": map_name,
+        "matches": matches,
+        "wins": wins,
+        "win_rate": _win_rate(wins, matches)
+    })
+
+
+def rank_maps(matrix: PlayerMapMatrix, limit: int, min_matches: int, brawler: Optional[str] = None,
+              worst: bool = False, sort: str = "win_rate", after: Optional[After] = None) -> Page:
+    """Лучшие или худшие карты матрицы в виде dict по схеме MapStats"""
+    brawler_id = None
+    if brawler is not None:
+        brawler_id = map_engine.brawler_id(brawler)
+        if brawler_id is None:
+            return Page([], None)
+
+    rows = matrix.top_maps(limit + 1, min_matches, brawler_id, worst, sort, after)
+    return make_page(rows, limit, lambda map_id, matches, wins: {
+        "map": map_engine.map_name(map_id), "matches": matches, "wins": wins, "win_rate": _win_rate(wins, matches)
+    })
+
+
+def compute_top_maps(player_id: str, limit: int, min_matches: int, brawler: Optional[str], worst: bool,
+                     sort: str = "win_rate", after: Optional[After] = None) -> Page:
+    """Лучшие или худшие карты игрока (опционально для одного бойца)"""
+    return rank_maps(map_engine.get(player_id), limit, min_matches, brawler, worst, sort, after)
+
+
+# ============= Dashboard =============
+
+DASHBOARD_SECTIONS = ("brawlers", "history", "maps")
+
+
+class PlayerSnapshot(NamedTuple):
+    """Согласованный срез данных игрока: копии, не меняющиеся при записи новых боёв"""
+    version: int
+    brawlers: List[dict]
+    rollup: PlayerRollup
+    maps: PlayerMapMatrix
+
+
+def take_snapshot(player_id: str, history_brawlers: int, with_maps: bool) -> PlayerSnapshot:
+    """
+    Снять срез данных игрока
+
+    Выполняется целиком в event loop без await, поэтому запись новых боёв
+    (слушатели хранилища) не может вклиниться между чтениями: счётчики,
+    роллап и матрица карт соответствуют одной версии.
+    """
+    brawlers = brawler_page(*aggregate_store.get(player_id).columns()).items
+    top = [item["brawler"] for item in brawlers[:history_brawlers]]
+    return PlayerSnapshot(
+        version=aggregate_store.version(player_id),
+        brawlers=brawlers,
+        rollup=rollup_store.get(player_id).copy(top) if top else PlayerRollup(),
+        maps=map_engine.get(player_id).copy() if with_maps else PlayerMapMatrix()
+    )
+
+
+async def build_dashboard(player_id: str, sections: List[str], top: int, days: int,
+                          granularity: str, maps_limit: int, min_matches: int) -> dict:
+    """Секции дашборда, посчитанные параллельно в пуле потоков по одному срезу"""
+    history_brawlers = top if "history" in sections else 0
+    snapshot = take_snapshot(player_id, history_brawlers, "maps" in sections)
+
+    def histories() -> List[dict]:
+        return [
+            {"brawler": item["brawler"], "history": history_points(snapshot.rollup, item["brawler"], days, granularity)}
+            for item in snapshot.brawlers[:history_brawlers]
+        ]
+
+    def maps(worst: bool) -> List[dict]:
+        return rank_maps(snapshot.maps, maps_limit, min_matches, worst=worst).items
+
+    # Схема ответа — DashboardResponse
+    result = {"player_id": player_id, "version": snapshot.version, "days": days, "granularity": granularity}
+    if "brawlers" in sections:
+        result["brawlers"] = snapshot.brawlers
+
+    tasks = {}
+    if "history" in sections:
+        tasks["histories"] = run_in_threadpool(histories)
+    if "maps" in sections:
+        tasks["best_maps"] = run_in_threadpool(maps, False)
+        tasks["worst_maps"] = run_in_threadpool(maps, True)
+    result.update(zip(tasks, await asyncio.gather(*tasks.values())))
     return result
 
 
-def generate_mock_history(player_id: str, brawler: str, days: int) -> List[WinrateHistoryPoint]:
-    """Генерирует моковую историю винрейта"""
-    history = []
-    base_date = datetime.now()
-    
-    for i in range(days):
-        date = base_date - timedelta(days=days - i - 1)
-        matches = random.randint(3, 12)
-        wins = random.randint(0, matches)
-        
-        history.append(WinrateHistoryPoint(
-            date=date.strftime("%Y-%m-%d"),
-            matches=matches,
-            wins=wins,
-            win_rate=round(wins / matches if matches > 0 else 0, 3)
-        ))
-    
-    return history
+def publish_brawlers(player_id: str, version: int, counters: Dict[str, List[int]], touched: List[str]):
+    """Событие brawlers: обновлённые счётчики бойцов touched"""
+    event_broker.publish(player_id, "brawlers", {
+        "player_id": player_id,
+        "version": version,
+        "brawlers": [
+            BrawlerStats(
+                brawler=brawler,
+                matches=counters[brawler][0],
+                wins=counters[brawler][1],
+                win_rate=_win_rate(counters[brawler][1], counters[brawler][0])
+            ).model_dump()
+            for brawler in touched
+        ]
+    }, event_id=version)
 
 
-def generate_mock_map_brawlers(player_id: str, map_name: str) -> List[MapBrawlerStats]:
-    """Генерирует моковые данные бойцов для карты"""
-    brawlers = ["Poco", "Pam", "Gene", "Tara", "Sandy"]
-    
-    result = []
-    for brawler in brawlers:
-        matches = random.randint(10, 30)
-        wins = random.randint(5, matches)
-        result.append(MapBrawlerStats(
-            brawler=brawler,
-            map=map_name,
-            matches=matches,
-            wins=wins,
-            win_rate=round(wins / matches, 3)
-        ))
+def publish_deltas(player_id: str, battles: List[Battle]):
+    """
+    Разослать подписчикам игрока изменения после записи новых боёв
+
+    brawlers - обновлённые счётчики затронутых бойцов
+    history  - закрытые (прошедшие) дни, в которые попали новые бои или
+               предыдущий последний бой, с итоговыми значениями
+    """
+    if not event_broker.has_subscribers(player_id):
+        return
+
+    version = aggregate_store.version(player_id)
+    publish_brawlers(
+        player_id, version, aggregate_store.get(player_id).brawlers, sorted({battle.brawler for battle in battles})
+    )
+
+    # День предыдущего последнего боя мог закрыться с приходом новых боёв
+    first_new = battles[0].timestamp
+    previous_count = battle_store.battle_count(player_id) - len(battles)
+    if previous_count > 0:
+        previous = next(battle_store.iter_player(player_id, skip=previous_count - 1))
+        first_new = min(first_new, previous.timestamp)
+
+    today = datetime.now(timezone.utc).date()
+    first_day = datetime.fromtimestamp(first_new, timezone.utc).date()
+    if first_day >= today:
+        return
+
+    buckets: Dict[Tuple[str, str], List[int]] = {}
+    for battle in battle_store.iter_player(player_id, since=_day_start(first_day)):
+        if battle.timestamp >= _day_start(today):
+            break
+        counter = buckets.setdefault((battle.brawler, battle.date), [0, 0])
+        counter[0] += 1
+        counter[1] += battle.is_win
+
+    event_broker.publish(player_id, "history", {
+        "player_id": player_id,
+        "version": version,
+        "buckets": [
+            {
+                "brawler": brawler,
+                **WinrateHistoryPoint(
+                    date=date, matches=matches, wins=wins, win_rate=_win_rate(wins, matches)
+                ).model_dump()
+            }
+            for (brawler, date), (matches, wins) in sorted(buckets.items())
+        ]
+    }, event_id=version)
+
+
+# Воркер: счётчики игроков с подписчиками SSE на момент последнего события
+snapshot_seen: Dict[str, Optional[PlayerAggregates]] = {}
+
+
+async def watch_snapshot():
+    """
+    Воркер: события brawlers подписчикам SSE по новым поколениям снимка
+
+    Бои пишет писатель, поэтому изменения видны только как разница
+    счётчиков между поколениями; событий history в воркерах нет.
+    """
+    generation = snapshot_reader.generation
+    while True:
+        await asyncio.sleep(settings.SNAPSHOT_POLL_INTERVAL)
+        if snapshot_reader.refresh() == generation:
+            continue
+        generation = snapshot_reader.generation
+
+        players = event_broker.players()
+        for player_id in set(snapshot_seen).difference(players):
+            del snapshot_seen[player_id]
+        for player_id in players:
+            current = aggregate_store.get(player_id)
+            previous = snapshot_seen.get(player_id)
+            snapshot_seen[player_id] = current
+            if current is None or previous is None or current.version == previous.version:
+                continue
+            touched = sorted(
+                brawler for brawler, counter in current.brawlers.items()
+                if previous.brawlers.get(brawler) != counter
+            )
+            publish_brawlers(player_id, current.version, current.brawlers, touched)
+
+
+if snapshot_reader is None:
+    battle_store.add_listener(publish_deltas)
+
+
+def player_not_found(player_id: str) -> HTTPException:
+    return HTTPException(
+        status_code=404,
+        detail=ErrorResponse(
+            code=404,
+            error="Not Found",
+            message=f"Player {player_id} not found"
+        ).dict()
+    )
+
+
+def auth_error(status_code: int, message: str) -> HTTPException:
+    return HTTPException(
+        status_code=status_code,
+        detail=ErrorResponse(
+            code=status_code,
+            error="Unauthorized" if status_code == 401 else "Forbidden",
+            message=message
+        ).dict()
+    )
+
+
+async def require_webapp_user(
+    authorization: Optional[str] = Header(default=None),
+    x_service_token: Optional[str] = Header(default=None)
+) -> Optional[dict]:
+    """
+    Доступ к аналитике: initData Mini App или служебный токен бота
+
+    Authorization: tma <initData> (или просто initData) — возвращаются
+    проверенные поля initData. X-Service-Token — запросы бота, возвращается
+    None. Подпись initData проверяется один раз и кэшируется до истечения
+    WEBAPP_AUTH_MAX_AGE.
+
+    Проверяется только то, что запрос пришёл из Mini App, а не чей Player ID
+    в пути: аналитика открыта по любому Player ID, как и battlelog в
+    Brawl Stars API, из которого она считается.
+    """
+    if not settings.WEBAPP_AUTH_REQUIRED:
+        return None
+    if x_service_token and hmac.compare_digest(x_service_token.encode(), service_token):
+        return None
+    if not authorization:
+        raise auth_error(401, "Telegram initData required")
+
+    init_data = authorization[4:] if authorization.startswith("tma ") else authorization
+    data = telegram_webapp.validate(init_data)
+    if data is None:
+        raise auth_error(403, "Invalid or expired initData")
+    return data
+
+
+async def require_webapp_stream_user(
+    authorization: Optional[str] = Header(default=None),
+    x_service_token: Optional[str] = Header(default=None),
+    init_data: Optional[str] = Query(default=None)
+) -> Optional[dict]:
+    """
+    Доступ к потоку SSE: как require_webapp_user, но initData можно передать
+    в ?init_data=... — EventSource в браузере не умеет задавать заголовки
+    """
+    return await require_webapp_user(authorization or init_data, x_service_token)
+
+
+async def require_service_token(x_service_token: Optional[str] = Header(default=None)):
+    """
+    Служебные маршруты (/metrics, /admin/cache/stats): только X-Service-Token
+
+    Проверяется всегда, WEBAPP_AUTH_REQUIRED=false её не отключает.
+    """
+    if not x_service_token:
+        raise auth_error(401, "X-Service-Token required")
+    if not hmac.compare_digest(x_service_token.encode(), service_token):
+        raise auth_error(403, "Invalid service token")
+
+
+# Все маршруты /analytics/... и /admin/sync — только для Mini App и бота
+analytics_auth = [Depends(require_webapp_user)]
+stream_auth = [Depends(require_webapp_stream_user)]
+service_auth = [Depends(require_service_token)]
+
+
+def bad_request(message: str) -> HTTPException:
+    return HTTPException(
+        status_code=400,
+        detail=ErrorResponse(
+            code=400,
+            error="Bad Request",
+            message=message
+        ).dict()
+    )
+
+
+SORT_PATTERN = f"^({'|'.join(SORTS)})$"
+
+
+def fields_pattern(model: type) -> str:
+    """Шаблон fields=: имена полей model через запятую"""
+    names = "|".join(model.model_fields)
+    return f"^({names})(,({names}))*$"
+
+
+def encode_cursor(route: str, sort: str, after: Optional[After]) -> Optional[str]:
+    """Непрозрачный курсор следующей страницы: маршрут, порядок и позиция последнего элемента"""
+    if after is None:
+        return None
+    return base64.urlsafe_b64encode(orjson.dumps([route, sort, *after])).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: Optional[str], route: str, sort: str) -> Optional[After]:
+    """Позиция из курсора; курсор другого маршрута или порядка — 400"""
+    if not cursor:
+        return None
+    try:
+        cursor_route, cursor_sort, matches, wins, item_id = orjson.loads(
+            base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        )
+    except (ValueError, TypeError):
+        raise bad_request("Invalid cursor")
+    # id бойца в рейтинге по счётчикам — имя, в матрице карта × боец — номер в словаре
+    id_type = str if route == "brawlers" else int
+    if (cursor_route, cursor_sort) != (route, sort) or not (
+        type(matches) is int and type(wins) is int and type(item_id) is id_type
+    ):
+        raise bad_request("Invalid cursor")
+    return matches, wins, item_id
+
+
+def project(items: List[dict], fields: Optional[str]) -> List[dict]:
+    """Оставить в элементах только поля fields (через запятую)"""
+    if not fields:
+        return items
+    keys = fields.split(",")
+    return [{key: item[key] for key in keys} for item in items]
+
+
+def make_etag(player_id: str, version: int, route: str, params: str) -> str:
+    """Сильный ETag: версия данных игрока + маршрут + параметры запроса"""
+    digest = hashlib.sha1(f"{player_id}:{version}:{route}:{params}".encode()).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+def etag_variant(etag: str, encoding: Optional[str]) -> str:
+    """ETag сжатого представления: у каждой кодировки свой, как требует RFC 9110"""
+    return f'{etag[:-1]}-{encoding}"' if encoding else etag
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match сравнивается слабо: W/"x" совпадает с "x", а ETag любой кодировки — с исходным
+    variants = {etag_variant(etag, encoding) for encoding in (None, *ENCODINGS)}
+    return any(tag.strip().removeprefix("W/") in variants for tag in header.split(","))
+
+
+async def cached_response(
+    request: Request,
+    player_id: str,
+    route: str,
+    params: str,
+    build: Callable[[], Union[dict, Awaitable[dict]]]
+) -> Response:
+    """
+    JSON-ответ из кэша или построенный build() и сохранённый в кэш
+
+    Ключ кэша и ETag включают версию данных игрока: после синхронизации
+    ответ пересчитывается. Если клиент прислал совпадающий If-None-Match,
+    отвечаем 304 без построения и сериализации модели.
     
-    result.sort(key=lambda x: x.win_rate, reverse=True)
-    return result
+    build() возвращает dict по схеме response_model (или корутину с ним),
+    собранный прямо из агрегатов. Он сериализуется orjson без pydantic:
+    FastAPI не валидирует возвращённый Response, а response_model остаётся
+    только для схемы OpenAPI.
+
+    Тела от COMPRESSION_MIN_BYTES сжимаются gzip или brotli по
+    Accept-Encoding; сжатое тело кэшируется рядом с несжатым, поэтому
+    ответ сжимается один раз на версию данных игрока.
+    """
+    version = aggregate_store.version(player_id)
+    etag = make_etag(player_id, version, route, params)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    key = response_cache.key(player_id, version, route, params)
+    body = await response_cache.get(key)
+    if body is None:
+        result = build()
+        if inspect.isawaitable(result):
+            result = await result
+        body = orjson.dumps(result)
+        await response_cache.set(key, body, player_id)
+
+    encoding = compressor.choose(request.headers.get("accept-encoding"), len(body))
+    if encoding is None:
+        compressor.record(None, len(body), len(body))
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    encoded_key = response_cache.key(player_id, version, route, params, encoding)
+    encoded = await response_cache.get(encoded_key)
+    if encoded is None:
+        encoded = compressor.compress(body, encoding)
+        await response_cache.set(encoded_key, encoded, player_id)
+    compressor.record(encoding, len(body), len(encoded))
+    headers["ETag"] = etag_variant(etag, encoding)
+    headers["Content-Encoding"] = encoding
+    return Response(content=encoded, media_type="application/json", headers=headers)
 
 
 # ============= Endpoints =============
@@ -157,28 +837,54 @@ async def root():
             "analytics": "/analytics/{player_id}/brawlers",
             "history": "/analytics/{player_id}/brawlers/{brawler}/winrate-history",
             "map": "/analytics/{player_id}/maps/{map}/brawlers",
+            "best_maps": "/analytics/{player_id}/maps/best",
+            "worst_maps": "/analytics/{player_id}/maps/worst",
+            "dashboard": "/analytics/{player_id}/dashboard",
+            "daily": "/analytics/{player_id}/daily",
+            "events": "/analytics/{player_id}/events",
+            "export": "/analytics/{player_id}/battles/export",
             "sync": "/admin/sync/{player_id}"
         }
     }
 
 
-@app.get("/analytics/{player_id}/brawlers", response_model=TopBrawlersResponse)
-async def get_top_brawlers(player_id: str):
+@app.get("/analytics/{player_id}/brawlers", response_model=TopBrawlersResponse, dependencies=analytics_auth)
+async def get_top_brawlers(
+    request: Request,
+    player_id: str,
+    limit: Optional[int] = Query(default=None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: str = Query(default="win_rate", pattern=SORT_PATTERN),
+    fields: Optional[str] = Query(default=None, pattern=fields_pattern(BrawlerStats))
+):
     """
     Получить топ бойцов игрока
     
     Используется для:
     - главного экрана аналитики
     - таблицы «кем чаще всего играет»
+    
+    sort: win_rate | matches | wins (по убыванию). limit — размер страницы,
+    next_cursor из ответа передаётся в cursor за следующей. fields —
+    поля бойца через запятую (brawler,win_rate), остальные не отдаются.
     """
+    player_id = canonical_player_id(player_id)
+    if not battle_store.has_player(player_id):
+        raise player_not_found(player_id)
+    after = decode_cursor(cursor, "brawlers", sort)
+
+    def build() -> dict:
+        # Схема ответа — TopBrawlersResponse
+        page = compute_top_brawlers(player_id, limit, sort, after)
+        return {
+            "player_id": player_id,
+            "count": len(page.items),
+            "brawlers": project(page.items, fields),
+            "next_cursor": encode_cursor("brawlers", sort, page.last)
+        }
+
     try:
-        brawlers = generate_mock_brawlers(player_id)
-        
-        return TopBrawlersResponse(
-            player_id=player_id,
-            count=len(brawlers),
-            brawlers=brawlers
-        )
+        return await cached_response(request, player_id, "brawlers", f"{limit}:{sort}:{cursor}:{fields}", build)
     except Exception as e:
         raise HTTPException(
             status_code=404,
@@ -192,12 +898,15 @@ async def get_top_brawlers(player_id: str):
 
 @app.get(
     "/analytics/{player_id}/brawlers/{brawler}/winrate-history",
-    response_model=BrawlerWinrateHistoryResponse
+    response_model=BrawlerWinrateHistoryResponse,
+    dependencies=analytics_auth
 )
 async def get_brawler_winrate_history(
+    request: Request,
     player_id: str,
     brawler: str,
-    days: int = Query(default=30, ge=1, le=365)
+    days: int = Query(default=30, ge=1, le=365),
+    granularity: str = Query(default="day", pattern=f"^({'|'.join(GRANULARITIES)})$")
 ):
     """
     Получить историю винрейта бойца
@@ -205,16 +914,27 @@ async def get_brawler_winrate_history(
     Используется для:
     - line chart
     - аналитики прогресса
+    
+    granularity: day | week | month — точка на день, неделю или месяц окна
     """
+    player_id = canonical_player_id(player_id)
+    if not battle_store.has_player(player_id):
+        raise player_not_found(player_id)
+
+    def build() -> dict:
+        # Схема ответа — BrawlerWinrateHistoryResponse
+        return {
+            "player_id": player_id,
+            "brawler": brawler,
+            "days": days,
+            "granularity": granularity,
+            "history": compute_history(player_id, brawler, days, granularity)
+        }
+
+    # Окно истории сдвигается каждый день, поэтому дата входит в ключ
+    today = datetime.now(timezone.utc).date().isoformat()
     try:
-        history = generate_mock_history(player_id, brawler, days)
-        
-        return BrawlerWinrateHistoryResponse(
-            player_id=player_id,
-            brawler=brawler,
-            days=days,
-            history=history
-        )
+        return await cached_response(request, player_id, "history", f"{brawler}:{days}:{granularity}:{today}", build)
     except Exception as e:
         raise HTTPException(
             status_code=404,
@@ -226,24 +946,82 @@ async def get_brawler_winrate_history(
         )
 
 
-@app.get("/analytics/{player_id}/maps/{map_name}/brawlers", response_model=MapBrawlersResponse)
-async def get_map_brawlers(player_id: str, map_name: str):
+@app.get(
+    "/analytics/{player_id}/maps/{map_name}/brawlers",
+    response_model=MapBrawlersResponse,
+    dependencies=analytics_auth
+)
+async def get_map_brawlers(
+    request: Request,
+    player_id: str,
+    map_name: str,
+    min_matches: int = Query(default=1, ge=1),
+    limit: Optional[int] = Query(default=None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: str = Query(default="win_rate", pattern=SORT_PATTERN),
+    fields: Optional[str] = Query(default=None, pattern=fields_pattern(MapBrawlerStats))
+):
     """
     Получить лучших бойцов на конкретной карте
     
     Используется для:
     - выбора бойца под карту
     - map-specific аналитики
+    
+    limit, cursor, sort и fields — как в /analytics/{player_id}/brawlers.
     """
+    player_id = canonical_player_id(player_id)
+    if not battle_store.has_player(player_id):
+        raise player_not_found(player_id)
+    after = decode_cursor(cursor, "map", sort)
+
+    def build() -> dict:
+        # Схема ответа — MapBrawlersResponse
+        page = compute_map_brawlers(player_id, map_name, min_matches, limit, sort, after)
+        map_id = map_engine.map_id(map_name)
+        return {
+            "player_id": player_id,
+            "map": map_engine.map_title(map_engine.get(player_id), map_id) if map_id is not None else map_name,
+            "count": len(page.items),
+            "brawlers": project(page.items, fields),
+            "next_cursor": encode_cursor("map", sort, page.last)
+        }
+
+    params = f"{map_name}:{min_matches}:{limit}:{sort}:{cursor}:{fields}"
     try:
-        brawlers = generate_mock_map_brawlers(player_id, map_name)
-        
-        return MapBrawlersResponse(
-            player_id=player_id,
-            map=f"Gem Grab - {map_name}",
-            count=len(brawlers),
-            brawlers=brawlers
+        return await cached_response(request, player_id, "map", params, build)
+    except Exception as e:
+        raise HTTPException(
+            status_code=404,
+            detail=ErrorResponse(
+                code=404,
+                error="Not Found",
+                message=f"Map data not found"
+            ).dict()
         )
+
+
+async def top_maps_response(request: Request, player_id: str, limit: int, min_matches: int,
+                            brawler: Optional[str], worst: bool, cursor: Optional[str], sort: str,
+                            fields: Optional[str]):
+    if not battle_store.has_player(player_id):
+        raise player_not_found(player_id)
+    route = "maps-worst" if worst else "maps-best"
+    after = decode_cursor(cursor, route, sort)
+
+    def build() -> dict:
+        # Схема ответа — TopMapsResponse
+        page = compute_top_maps(player_id, limit, min_matches, brawler, worst, sort, after)
+        return {
+            "player_id": player_id,
+            "count": len(page.items),
+            "maps": project(page.items, fields),
+            "next_cursor": encode_cursor(route, sort, page.last)
+        }
+
+    params = f"{limit}:{min_matches}:{brawler}:{sort}:{cursor}:{fields}"
+    try:
+        return await cached_response(request, player_id, route, params, build)
     except Exception as e:
         raise HTTPException(
             status_code=404,
@@ -255,20 +1033,332 @@ async def get_map_brawlers(player_id: str, map_name: str):
         )
 
 
-@app.post("/admin/sync/{player_id}", response_model=SyncResponse)
+@app.get("/analytics/{player_id}/maps/best", response_model=TopMapsResponse, dependencies=analytics_auth)
+async def get_best_maps(
+    request: Request,
+    player_id: str,
+    limit: int = Query(default=3, ge=1, le=100),
+    min_matches: int = Query(default=3, ge=1),
+    brawler: Optional[str] = None,
+    cursor: Optional[str] = None,
+    sort: str = Query(default="win_rate", pattern=SORT_PATTERN),
+    fields: Optional[str] = Query(default=None, pattern=fields_pattern(MapStats))
+):
+    """
+    Лучшие карты игрока по винрейту
+    
+    Карты с числом матчей меньше min_matches не учитываются.
+    brawler ограничивает статистику одним бойцом.
+    cursor, sort и fields — как в /analytics/{player_id}/brawlers.
+    """
+    player_id = canonical_player_id(player_id)
+    return await top_maps_response(request, player_id, limit, min_matches, brawler, False, cursor, sort, fields)
+
+
+@app.get("/analytics/{player_id}/maps/worst", response_model=TopMapsResponse, dependencies=analytics_auth)
+async def get_worst_maps(
+    request: Request,
+    player_id: str,
+    limit: int = Query(default=3, ge=1, le=100),
+    min_matches: int = Query(default=3, ge=1),
+    brawler: Optional[str] = None,
+    cursor: Optional[str] = None,
+    sort: str = Query(default="win_rate", pattern=SORT_PATTERN),
+    fields: Optional[str] = Query(default=None, pattern=fields_pattern(MapStats))
+):
+    """
+    Худшие карты игрока по винрейту
+    
+    Карты с числом матчей меньше min_matches не учитываются.
+    brawler ограничивает статистику одним бойцом.
+    cursor, sort и fields — как в /analytics/{player_id}/brawlers.
+    """
+    player_id = canonical_player_id(player_id)
+    return await top_maps_response(request, player_id, limit, min_matches, brawler, True, cursor, sort, fields)
+
+
+@app.get("/analytics/{player_id}/dashboard", response_model=DashboardResponse, dependencies=analytics_auth)
+async def get_dashboard(
+    request: Request,
+    player_id: str,
+    sections: str = Query(
+        default=",".join(DASHBOARD_SECTIONS),
+        pattern=f"^({'|'.join(DASHBOARD_SECTIONS)})(,({'|'.join(DASHBOARD_SECTIONS)}))*$"
+    ),
+    top: int = Query(default=3, ge=1, le=20),
+    days: int = Query(default=30, ge=1, le=365),
+    granularity: str = Query(default="day", pattern=f"^({'|'.join(GRANULARITIES)})$"),
+    maps_limit: int = Query(default=3, ge=1, le=100),
+    min_matches: int = Query(default=3, ge=1)
+):
+    """
+    Все панели Mini App одним запросом
+    
+    sections: brawlers, history, maps через запятую
+    - brawlers: топ бойцов
+    - history: история винрейта top лучших бойцов за days дней
+    - maps: лучшие и худшие карты (maps_limit, min_matches)
+    
+    Секции считаются параллельно по одному срезу данных игрока;
+    version в ответе — число учтённых боёв.
+    """
+    player_id = canonical_player_id(player_id)
+    if not battle_store.has_player(player_id):
+        raise player_not_found(player_id)
+
+    selected = [section for section in DASHBOARD_SECTIONS if section in sections.split(",")]
+
+    def build() -> Awaitable[dict]:
+        return build_dashboard(player_id, selected, top, days, granularity, maps_limit, min_matches)
+
+    # Окно истории сдвигается каждый день, поэтому дата входит в ключ
+    today = datetime.now(timezone.utc).date().isoformat()
+    params = f"{','.join(selected)}:{top}:{days}:{granularity}:{maps_limit}:{min_matches}:{today}"
+    try:
+        return await cached_response(request, player_id, "dashboard", params, build)
+    except Exception as e:
+        raise HTTPException(
+            status_code=404,
+            detail=ErrorResponse(
+                code=404,
+                error="Not Found",
+                message=f"Dashboard for {player_id} not found"
+            ).dict()
+        )
+
+
+@app.get("/analytics/{player_id}/daily", response_model=DailySummaryResponse, dependencies=analytics_auth)
+async def get_daily_summary(
+    request: Request,
+    player_id: str,
+    date: Optional[str] = Query(default=None, pattern=r"^\d{4}-\d{2}-\d{2}$")
+):
+    """
+    Итоги игрока за день (UTC): винрейт по бойцам
+    
+    Используется для ежедневной сводки в боте; по умолчанию — вчера.
+    """
+    player_id = canonical_player_id(player_id)
+    if not battle_store.has_player(player_id):
+        raise player_not_found(player_id)
+
+    try:
+        day = datetime.strptime(date, "%Y-%m-%d").date() if date else (
+            datetime.now(timezone.utc).date() - timedelta(days=1)
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail=ErrorResponse(
+                code=400,
+                error="Bad Request",
+                message=f"Invalid date: {date}"
+            ).dict()
+        )
+
+    def build() -> dict:
+        return compute_daily_summary(player_id, epoch_day(day))
+
+    try:
+        return await cached_response(request, player_id, "daily", day.isoformat(), build)
+    except Exception as e:
+        raise HTTPException(
+            status_code=404,
+            detail=ErrorResponse(
+                code=404,
+                error="Not Found",
+                message=f"Daily summary for {player_id} not found"
+            ).dict()
+        )
+
+
+def parse_since(since: str) -> int:
+    """since выгрузки: unix-время в секундах или дата/время ISO 8601 (без зоны — UTC)"""
+    if since.isdigit():
+        return int(since)
+    moment = datetime.fromisoformat(since)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp())
+
+
+async def forward_export(request: Request) -> Response:
+    """Воркер: выгрузку читает писатель (в снимке нет сырых боёв), поток передаётся как есть"""
+    try:
+        response = await writer_session.get(
+            f"http://writer{request.url.path}?{request.url.query}",
+            headers={"X-Service-Token": service_token.decode()},
+            # Выгрузка длинной истории дольше общего таймаута сессии; ограничиваем паузы, а не всё время
+            timeout=aiohttp.ClientTimeout(total=None, sock_read=60)
+        )
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        raise HTTPException(
+            status_code=503,
+            detail=ErrorResponse(
+                code=503,
+                error="Service Unavailable",
+                message="Writer process unavailable"
+            ).dict()
+        )
+    if response.status != 200:
+        body = await response.read()
+        response.release()
+        return Response(content=body, status_code=response.status, media_type=response.content_type)
+
+    async def relay():
+        try:
+            async for chunk in response.content.iter_any():
+                yield chunk
+        finally:
+            response.release()
+
+    return StreamingResponse(
+        relay(),
+        media_type=response.headers["Content-Type"],
+        headers={"Content-Disposition": response.headers.get("Content-Disposition", "attachment")}
+    )
+
+
+@app.get("/analytics/{player_id}/battles/export", dependencies=analytics_auth)
+async def export_player_battles(
+    request: Request,
+    player_id: str,
+    format: str = Query(default="ndjson", pattern=f"^({'|'.join(FORMATS)})$"),
+    since: Optional[str] = None
+):
+    """
+    Выгрузка сырых боёв игрока потоком: NDJSON (строка на бой) или CSV
+    
+    since — unix-время или дата ISO 8601 (2024-05-01, 2024-05-01T18:00:00+03:00):
+    бои раньше него не выгружаются. История читается из хранилища кусками
+    по EXPORT_CHUNK_RECORDS боёв, память не зависит от её длины.
+    """
+    player_id = canonical_player_id(player_id)
+    if not battle_store.has_player(player_id):
+        raise player_not_found(player_id)
+
+    try:
+        since_ts = parse_since(since) if since else None
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail=ErrorResponse(
+                code=400,
+                error="Bad Request",
+                message=f"Invalid since: {since}"
+            ).dict()
+        )
+
+    if writer_session is not None:
+        return await forward_export(request)
+
+    # Синхронный генератор: Starlette читает его в пуле потоков, цикл событий не блокируется
+    return StreamingResponse(
+        export_battles(battle_store, player_id, format, since_ts, settings.EXPORT_CHUNK_RECORDS),
+        media_type=FORMATS[format],
+        headers={
+            "Content-Disposition": f"attachment; filename*=UTF-8''{quote(player_id, safe='')}-battles.{format}"
+        }
+    )
+
+
+@app.get("/analytics/{player_id}/events", dependencies=stream_auth)
+async def player_events(player_id: str):
+    """
+    Поток изменений аналитики игрока (Server-Sent Events)
+    
+    События:
+    - brawlers: обновлённые счётчики бойцов после синхронизации
+    - history: итоговые значения закрывшихся дней истории винрейта
+      (только в однопроцессном режиме)
+    """
+    player_id = canonical_player_id(player_id)
+    if snapshot_reader is not None:
+        snapshot_seen.setdefault(player_id, aggregate_store.get(player_id))
+    subscriber = event_broker.subscribe(player_id)
+    return StreamingResponse(
+        event_broker.stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def run_sync(player_id: str) -> SyncResponse:
+    started = time.perf_counter()
+    try:
+        battles = await brawl_client.get_battlelog(player_id)
+    except BrawlStarsAPIError as e:
+        sync_duration.labels("not_found" if e.status == 404 else "error").observe(time.perf_counter() - started)
+        raise
+    except Exception:
+        sync_duration.labels("error").observe(time.perf_counter() - started)
+        raise
+    sync_duration.labels("ok").observe(time.perf_counter() - started)
+
+    new_battles = battle_store.append(player_id, battles)
+    if new_battles:
+        await response_cache.invalidate_player(player_id)
+        if snapshot_publisher is not None:
+            # Ответ уходит после того, как воркеры увидят новые бои
+            await snapshot_publisher.publish([player_id])
+
+    last_ts = battle_store.last_battle_time(player_id)
+    last_match_time = (
+        datetime.fromtimestamp(last_ts, timezone.utc).isoformat() if last_ts else "Неизвестно"
+    )
+
+    return SyncResponse(
+        player_id=player_id,
+        last_match_time=last_match_time,
+        message=f"Данные игрока {player_id} успешно синхронизированы",
+        new_battles=len(new_battles)
+    )
+
+
+async def forward_sync(player_id: str) -> Response:
+    """Воркер: синхронизацию выполняет писатель, его ответ передаётся как есть"""
+    try:
+        async with writer_session.post(
+            f"http://writer/admin/sync/{quote(player_id, safe='')}",
+            headers={"X-Service-Token": service_token.decode()}
+        ) as response:
+            body = await response.read()
+            return Response(content=body, status_code=response.status, media_type="application/json")
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        raise HTTPException(
+            status_code=503,
+            detail=ErrorResponse(
+                code=503,
+                error="Service Unavailable",
+                message="Writer process unavailable"
+            ).dict()
+        )
+
+
+@app.post("/admin/sync/{player_id}", response_model=SyncResponse, dependencies=analytics_auth)
 async def sync_player(player_id: str):
     """
     Ручная синхронизация игрока
     
-    Используется для принудительного обновления данных игрока
+    Используется для принудительного обновления данных игрока.
+    Одновременные запросы по одному игроку ждут одну синхронизацию
+    и получают её результат.
     """
+    player_id = canonical_player_id(player_id)
+    if writer_session is not None:
+        return await forward_sync(player_id)
     try:
-        # TODO: Реальная синхронизация с Brawl Stars API
-        
-        return SyncResponse(
-            player_id=player_id,
-            last_match_time=datetime.now().isoformat(),
-            message=f"Данные игрока {player_id} успешно синхронизированы"
+        return await sync_flight.do(player_id, lambda: run_sync(player_id))
+    except BrawlStarsAPIError as e:
+        if e.status == 404:
+            raise player_not_found(player_id)
+        raise HTTPException(
+            status_code=502,
+            detail=ErrorResponse(
+                code=502,
+                error="Bad Gateway",
+                message=f"Brawl Stars API error: {e}"
+            ).dict()
         )
     except Exception as e:
         raise HTTPException(
@@ -281,6 +1371,18 @@ async def sync_player(player_id: str):
         )
 
 
+@app.get("/admin/cache/stats", dependencies=service_auth)
+async def cache_stats():
+    """Счётчики попаданий и промахов кэша ответов"""
+    return response_cache.snapshot()
+
+
+@app.get("/metrics", include_in_schema=False, dependencies=service_auth)
+async def metrics():
+    """Метрики в текстовом формате Prometheus"""
+    return Response(content=metrics_registry.render(), media_type=CONTENT_TYPE)
+
+
 @app.get("/health")
 async def health_check():
     """Проверка здоровья API"""
@@ -293,5 +1395,5 @@ if __name__ == "__main__":
         "api:app",
         host=settings.API_HOST,
         port=settings.API_PORT,
-        reload=True
+        reload=settings.API_RELOAD
     )
@@ -0,0 +1,248 @@
+"""
+Клиент API аналитики для бота
+
+Одна aiohttp-сессия с пулом keep-alive соединений на всё время жизни бота,
+таймаут на каждый запрос, ограниченные повторы на временных ошибках и
+circuit breaker: после серии отказов запросы к API не отправляются
+вовсе, и обработчики сразу отвечают пользователю, а не ждут таймаута.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import Any, Dict, Mapping, Optional, Tuple
+from urllib.parse import quote
+
+import aiohttp
+
+from brawl_api import canonical_player_id
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {502, 503, 504}
+
+
+class BackendError(Exception):
+    """Ошибка ответа API аналитики"""
+
+    def __init__(self, status: int, message: str = ""):
+        self.status = status
+        super().__init__(f"{status}: {message}".strip(": "))
+
+
+class CircuitOpenError(Exception):
+    """API недоступно: circuit breaker разомкнут"""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"Backend unavailable, retry in {retry_after:.0f}s")
+
+
+class CircuitBreaker:
+    """
+    Предохранитель: closed -> open -> half_open -> closed
+
+    closed:    запросы идут, отказы подряд считаются
+    open:      после failure_threshold отказов подряд запросы сразу
+               отклоняются в течение reset_timeout секунд
+    half_open: пропускается один пробный запрос; успех замыкает цепь,
+               отказ снова размыкает её
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at = 0.0
+        self._state = self.CLOSED
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    @property
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self._trial_in_flight = False
+        self._state = self.CLOSED
+
+    def cancel_trial(self):
+        """Пробный запрос отменён, не дойдя до результата"""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self._state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                logger.warning(f"API аналитики недоступно, запросы приостановлены на {self.reset_timeout:.0f} с")
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+
+
+class BackendClient:
+    """Асинхронный клиент API аналитики (FastAPI из api.py)"""
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float = 10.0,
+        max_connections: int = 20,
+        max_retries: int = 1,
+        backoff_base: float = 0.2,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        service_token: str = ""
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.service_token = service_token
+        self.max_connections = max_connections
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=min(timeout, 3.0))
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.stats = {"requests": 0, "retries": 0, "errors": 0, "rejected": 0}
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Очередь за соединением — до проверки предохранителя: если API
+        # отказало, пока запрос ждал, он будет отклонён сразу, а не по таймауту
+        self._slots = asyncio.Semaphore(max_connections)
+        self._sync_flight = SingleFlight()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections,
+                keepalive_timeout=60,
+                ttl_dns_cache=300
+            )
+            headers = {"Accept": "application/json"}
+            if self.service_token:
+                # Доступ к /analytics без initData Mini App
+                headers["X-Service-Token"] = self.service_token
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers=headers
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, self.backoff_base * 2 ** attempt)
+
+    async def request(self, method: str, path: str) -> Any:
+        """JSON-ответ API (исключения — как у send)"""
+        _, _, body = await self.send(method, path)
+        return json.loads(body)
+
+    async def get_conditional(self, path: str, etag: Optional[str] = None) -> Tuple[Optional[bytes], Optional[str]]:
+        """
+        GET с If-None-Match: (тело, ETag), а если данные не менялись — (None, etag)
+        """
+        headers = {"If-None-Match": etag} if etag else None
+        status, response_headers, body = await self.send("GET", path, headers)
+        if status == 304:
+            return None, etag
+        return body, response_headers.get("ETag")
+
+    async def send(self, method: str, path: str,
+                   headers: Optional[Dict[str, str]] = None) -> Tuple[int, Mapping[str, str], bytes]:
+        """
+        Запрос к API: (статус, заголовки, тело) для ответов 1xx-3xx
+
+        Raises:
+            CircuitOpenError: API недавно не отвечало, запрос не отправлялся
+            BackendError: API ответило ошибкой (4xx или 5xx после повторов)
+            aiohttp.ClientError, asyncio.TimeoutError: сеть после повторов
+        """
+        url = f"{self.base_url}{path}"
+
+        for attempt in range(self.max_retries + 1):
+            async with self._slots:
+                if not self.breaker.allow():
+                    self.stats["rejected"] += 1
+                    raise CircuitOpenError(self.breaker.retry_after)
+                self.stats["requests"] += 1
+
+                try:
+                    async with self.session.request(method, url, headers=headers) as response:
+                        if response.status < 400:
+                            body = await response.read()
+                            self.breaker.record_success()
+                            # Копия заголовков без учёта регистра: ETag и etag — один заголовок
+                            return response.status, response.headers.copy(), body
+
+                        error = BackendError(response.status, await response.text())
+                        if response.status < 500:
+                            # Ошибка запроса, а не отказ API — предохранитель не трогаем
+                            self.breaker.record_success()
+                            raise error
+                        self.breaker.record_failure()
+                        if response.status not in RETRY_STATUSES:
+                            self.stats["errors"] += 1
+                            raise error
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    self.breaker.record_failure()
+                    error = e
+                except asyncio.CancelledError:
+                    self.breaker.cancel_trial()
+                    raise
+
+            if attempt == self.max_retries:
+                self.stats["errors"] += 1
+                raise error
+
+            self.stats["retries"] += 1
+            logger.warning(f"API аналитики {method} {path}: {error!r}, повтор #{attempt + 1}")
+            await asyncio.sleep(self._backoff(attempt))
+
+    async def get_history(self, player_id: str, brawler: str, days: int,
+                          etag: Optional[str] = None) -> Tuple[Optional[bytes], Optional[str]]:
+        """История винрейта бойца (JSON-байты) с условным запросом по ETag"""
+        path = (
+            f"/analytics/{quote(player_id, safe='')}/brawlers/{quote(brawler, safe='')}"
+            f"/winrate-history?days={days}"
+        )
+        return await self.get_conditional(path, etag)
+
+    async def sync_player(self, player_id: str) -> Dict[str, Any]:
+        """Синхронизация игрока; параллельные вызовы по одному игроку делят один запрос"""
+        player_id = canonical_player_id(player_id)
+        return await self._sync_flight.do(
+            player_id, lambda: self.request("POST", f"/admin/sync/{quote(player_id, safe='')}")
+        )
+
+    async def get_daily_summary(self, player_id: str, day: Optional[str] = None) -> Dict[str, Any]:
+        """Итоги игрока за день YYYY-MM-DD (по умолчанию — вчера, UTC)"""
+        path = f"/analytics/{quote(player_id, safe='')}/daily"
+        if day:
+            path += f"?date={day}"
+        return await self.request("GET", path)
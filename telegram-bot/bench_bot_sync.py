@@ -0,0 +1,216 @@
+"""
+Нагрузочный тест /sync в боте
+
+Пачка одновременных апдейтов /sync прогоняется через диспетчер бота
+(dp.feed_update) против заглушек Telegram Bot API и API аналитики.
+
+Сценарии:
+    1. сессия на каждый вызов (как было) — API работает
+    2. общий клиент BackendClient — API работает
+    3. API зависло — после серии таймаутов предохранитель размыкается,
+       остальные пользователи получают ответ сразу
+    4. API восстановилось — пробный запрос замыкает цепь
+    5. повтор после восстановления
+    6. шквал нажатий: много /sync от одних и тех же пользователей с общими
+       Player ID — cooldown на пользователя и single flight на игрока
+
+Запуск:
+    python bench_bot_sync.py --updates 500 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from urllib.parse import quote
+
+import aiohttp
+from aiohttp import web
+
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except:
+        pass
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiogram.types import Update  # noqa: E402
+
+import bot as bot_module  # noqa: E402
+from backend_client import BackendClient  # noqa: E402
+from benchutil import percentile  # noqa: E402
+from fake_telegram import create_app as create_telegram_app, make_update  # noqa: E402
+from ratelimit import Cooldown  # noqa: E402
+from user_store import UserStore  # noqa: E402
+
+
+def create_backend_app(latency: float) -> web.Application:
+    """Заглушка POST /admin/sync/{player_id}; stats["hang"] — API не отвечает"""
+    app = web.Application()
+    stats = {"requests": 0, "peers": set(), "hang": False}
+    app["stats"] = stats
+
+    async def sync(request: web.Request) -> web.Response:
+        stats["requests"] += 1
+        stats["peers"].add(request.transport.get_extra_info("peername"))
+        await asyncio.sleep(3600 if stats["hang"] else latency)
+        return web.json_response({
+            "player_id": request.match_info["player_id"],
+            "last_match_time": "2025-01-01T12:00:00Z",
+            "message": "Sync completed",
+            "new_battles": 0,
+        })
+
+    app.router.add_post("/admin/sync/{player_id}", sync)
+    return app
+
+
+async def start(app: web.Application) -> tuple:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+
+class PerCallClient:
+    """Прежнее поведение: новая ClientSession на каждую синхронизацию"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+
+    async def sync_player(self, player_id: str) -> dict:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(f"{self.base_url}/admin/sync/{quote(player_id, safe='')}") as response:
+                return await response.json()
+
+
+async def burst(bot: Bot, telegram: web.Application, users: list, first_id: int) -> dict:
+    """Апдейт /sync от каждого пользователя из users (повторы — повторные нажатия)"""
+    sent_before = len(telegram["sent"])
+    latencies = []
+
+    async def one(i: int):
+        update = Update.model_validate(make_update(first_id + i, users[i], "/sync"), context={"bot": bot})
+        started = time.perf_counter()
+        await bot_module.dp.feed_update(bot, update)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(len(users))))
+    elapsed = time.perf_counter() - started
+
+    replies = [m["text"] for m in telegram["sent"][sent_before:] if not m["text"].startswith("🔄")]
+    return {
+        "elapsed": elapsed,
+        "p50": percentile(latencies, 0.5),
+        "p99": percentile(latencies, 0.99),
+        "ok": sum(text.startswith("✅") for text in replies),
+        "unavailable": sum(text.startswith("⏳ <b>") for text in replies),
+        "cooldown": sum(text.startswith("⏳ Данные") for text in replies),
+        "failed": sum(text.startswith(("❌", "⚠️")) for text in replies),
+    }
+
+
+def report(title: str, result: dict, backend_app: web.Application, requests_before: int, peers_before: int):
+    stats = backend_app["stats"]
+    print(f"\n{title}")
+    print(f"  время: {result['elapsed']:.2f} с, обработчик p50 {result['p50']:.0f} мс, p99 {result['p99']:.0f} мс")
+    print(f"  ответы: ✅ {result['ok']}, ⏳ недоступно {result['unavailable']}, "
+          f"⏳ cooldown {result['cooldown']}, ошибок {result['failed']}")
+    print(f"  запросов к API: {stats['requests'] - requests_before}, "
+          f"TCP-соединений: {len(stats['peers']) - peers_before}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест /sync")
+    parser.add_argument("--updates", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка API аналитики, с")
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--connections", type=int, default=20)
+    parser.add_argument("--reset-timeout", type=float, default=2.0)
+    parser.add_argument("--flood-users", type=int, default=50)
+    parser.add_argument("--flood-taps", type=int, default=20, help="нажатий на пользователя")
+    parser.add_argument("--flood-players", type=int, default=10, help="разных Player ID у пользователей")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    telegram = create_telegram_app()
+    backend_app = create_backend_app(args.latency)
+    telegram_runner, telegram_url = await start(telegram)
+    backend_runner, backend_url = await start(backend_app)
+
+    bot = Bot("0:bench", session=AiohttpSession(api=TelegramAPIServer.from_base(telegram_url)))
+    client = BackendClient(
+        backend_url,
+        timeout=args.timeout,
+        max_connections=args.connections,
+        max_retries=1,
+        backoff_base=0.05,
+        failure_threshold=5,
+        reset_timeout=args.reset_timeout
+    )
+    stats = backend_app["stats"]
+    bot_module.user_store = UserStore("sqlite+aiosqlite:///:memory:")
+    await bot_module.user_store.open()
+    bot_module.sync_cooldown = Cooldown(60)
+    update_id = 0
+    next_user = 100_000
+
+    async def scenario(title: str, users: int = args.updates, taps: int = 1, players: int = 0):
+        """users новых пользователей по taps нажатий; players > 0 — общие Player ID"""
+        nonlocal update_id, next_user
+        user_ids = list(range(next_user, next_user + users))
+        next_user += users
+        for user_id in user_ids:
+            bot_module.user_store.set(user_id, f"#P{user_id % players if players else user_id}")
+
+        requests_before, peers_before = stats["requests"], len(stats["peers"])
+        result = await burst(bot, telegram, user_ids * taps, update_id)
+        update_id += users * taps
+        report(title, result, backend_app, requests_before, peers_before)
+
+    print("=" * 64)
+    print(f"{args.updates} одновременных /sync, задержка API {args.latency * 1000:.0f} мс, "
+          f"таймаут {args.timeout} с, соединений {args.connections}")
+
+    bot_module.backend = PerCallClient(backend_url)
+    await scenario("1. Сессия на каждый вызов")
+
+    bot_module.backend = client
+    await scenario("2. Общий клиент")
+
+    stats["hang"] = True
+    await scenario("3. API зависло")
+    print(f"  предохранитель: {client.breaker.state}, отклонено сразу: {client.stats['rejected']}")
+
+    stats["hang"] = False
+    await asyncio.sleep(args.reset_timeout)
+    await scenario("4. API восстановилось (пробный запрос после reset_timeout)")
+    print(f"  предохранитель: {client.breaker.state}")
+    await scenario("5. Повтор после восстановления")
+
+    await scenario(
+        f"6. Шквал: {args.flood_users} пользователей x {args.flood_taps} нажатий, "
+        f"{args.flood_players} Player ID",
+        args.flood_users, args.flood_taps, args.flood_players
+    )
+    print("=" * 64)
+
+    await bot_module.user_store.close()
+    await client.close()
+    await bot.session.close()
+    await backend_runner.cleanup()
+    await telegram_runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+"""
+Бенчмарк клиента Brawl Stars API против локальной заглушки
+
+Сценарии:
+    1. лимитер клиента совпадает с бюджетом заглушки — 429 быть не должно
+    2. клиент настроен быстрее бюджета — 429 и 503 отрабатываются повторами
+
+Запуск:
+    python bench_brawl_api.py --requests 500 --rate 100
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+import time
+
+from aiohttp import web
+
+from brawl_api import BrawlStarsClient
+from fake_brawl_api import create_app
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except:
+        pass
+
+
+async def run_scenario(title: str, args, client_rate: float, server_rate: float, error_rate: float):
+    app = create_app(rate=server_rate, error_rate=error_rate, latency=args.latency)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+
+    client = BrawlStarsClient(
+        api_key="bench",
+        base_url=f"http://127.0.0.1:{port}/v1",
+        rate=client_rate,
+        burst=max(1, int(client_rate)),
+        max_connections=args.connections,
+        max_retries=args.retries,
+        backoff_base=0.05
+    )
+
+    failed = 0
+
+    async def fetch(i: int):
+        nonlocal failed
+        try:
+            await client.get_battlelog(f"#BENCH{i}")
+        except Exception:
+            failed += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(fetch(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    await client.close()
+    await runner.cleanup()
+
+    stats = app["stats"]
+    print(f"--- {title}")
+    print(f"Запросов:            {args.requests} за {elapsed:.2f} с ({args.requests / elapsed:.1f} успешных/с)")
+    print(f"Лимит клиента:       {client_rate:.0f}/с, бюджет заглушки: {server_rate:.0f}/с")
+    print(f"HTTP запросов:       {stats['requests']} (повторов {client.stats['retries']})")
+    print(f"429 / 503:           {stats['throttled']} / {stats['errors']}")
+    print(f"Не удалось:          {failed}")
+    print(f"TCP соединений:      {len(stats['peers'])} (лимит {args.connections})")
+    print(f"Параллельно на хост: {stats['max_in_flight']}")
+
+
+async def main():
+    logging.getLogger("brawl_api").setLevel(logging.ERROR)
+
+    parser = argparse.ArgumentParser(description="Бенчмарк BrawlStarsClient")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=100, help="бюджет запросов заглушки в секунду")
+    parser.add_argument("--connections", type=int, default=10)
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    args = parser.parse_args()
+
+    await run_scenario("Лимитер по бюджету ключа", args, args.rate, args.rate, 0)
+    await run_scenario("Клиент быстрее бюджета + 503", args, args.rate * 2, args.rate, args.error_rate)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,174 @@
+"""
+Нагрузочный тест рассылки
+
+Broadcaster отправляет сообщения через заглушку Telegram Bot API
+(fake_telegram.py), очередь — во временной SQLite-базе.
+
+Сценарии:
+    1. --messages сообщений без лимита на стороне заглушки: накладные
+       расходы очереди и отправки при --rate сообщений в секунду
+    2. заглушка пропускает меньше, чем просит рассылка, и отвечает 429
+       с retry_after — рассылка должна притормозить и дослать всё
+    3. процесс «падает» посреди рассылки и перезапускается — остаток
+       досылается, ни один чат не получает сообщение дважды
+
+Для настоящего Telegram rate — около 25-30 сообщений в секунду.
+
+Запуск:
+    python bench_broadcast.py --messages 100000 --rate 5000
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from aiohttp import web
+
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except:
+        pass
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+
+from broadcast import Broadcaster  # noqa: E402
+from fake_telegram import create_app as create_telegram_app  # noqa: E402
+
+
+async def start(app: web.Application) -> tuple:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+
+async def render(chat_id: int, player_id: str) -> str:
+    return f"📊 Итоги игрока {player_id}"
+
+
+async def wait_done(broadcaster: Broadcaster, broadcast_id: int, timeout: float = 3600) -> dict:
+    deadline = time.perf_counter() + timeout
+    while True:
+        progress = await broadcaster.progress(broadcast_id)
+        if progress["status"] != "running":
+            return progress
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f"рассылка не завершилась: {progress['counts']}")
+        await asyncio.sleep(0.2)
+
+
+def report(title: str, progress: dict, telegram: web.Application, sent_before: int,
+           elapsed: float, broadcaster: Broadcaster):
+    sent = telegram["sent"][sent_before:]
+    per_chat = Counter(message["chat_id"] for message in sent)
+    counts = progress["counts"]
+    print(f"\n{title}")
+    print(f"  время: {elapsed:.1f} с, {len(sent) / elapsed:.0f} сообщений/с")
+    print(f"  получателей {progress['total']}: отправлено {counts.get('sent', 0)}, "
+          f"неизвестно {counts.get('unknown', 0)}, ошибок {counts.get('failed', 0)}")
+    print(f"  доставлено заглушкой: {len(sent)}, дублей: {sum(n > 1 for n in per_chat.values())}, "
+          f"429 от заглушки: {broadcaster.stats['retry_after']}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест рассылки")
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--rate", type=float, default=5000, help="лимит рассылки, сообщений/с")
+    parser.add_argument("--telegram-rate", type=float, default=1000,
+                        help="лимит заглушки в сценарии 429, запросов/с")
+    parser.add_argument("--small", type=int, default=20_000, help="сообщений в сценариях 2 и 3")
+    parser.add_argument("--workers", type=int, default=64)
+    parser.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    directory = tempfile.mkdtemp(prefix="bench-broadcast-")
+    database_url = f"sqlite+aiosqlite:///{os.path.join(directory, 'broadcast.db')}"
+    next_chat = 1
+
+    def recipients(count: int) -> list:
+        nonlocal next_chat
+        chats = range(next_chat, next_chat + count)
+        next_chat += count
+        return [(chat_id, f"#P{chat_id}") for chat_id in chats]
+
+    def make_broadcaster(bot: Bot) -> Broadcaster:
+        return Broadcaster(bot, database_url, render, rate=args.rate,
+                           workers=args.workers, batch=args.batch)
+
+    print("=" * 64)
+    print(f"Рассылка: лимит {args.rate:.0f} сообщений/с, {args.workers} отправок, пачка {args.batch}")
+
+    # 1. Без лимита у заглушки
+    telegram = create_telegram_app()
+    runner, url = await start(telegram)
+    bot = Bot("0:bench", session=AiohttpSession(api=TelegramAPIServer.from_base(url)))
+    broadcaster = make_broadcaster(bot)
+    await broadcaster.open()
+    started = time.perf_counter()
+    broadcast_id = await broadcaster.create("bench-1", recipients=recipients(args.messages))
+    enqueue = time.perf_counter() - started
+    progress = await wait_done(broadcaster, broadcast_id)
+    report(f"1. {args.messages} сообщений (постановка в очередь {enqueue:.2f} с)",
+           progress, telegram, 0, time.perf_counter() - started, broadcaster)
+    await broadcaster.close()
+    await bot.session.close()
+    await runner.cleanup()
+
+    # 2. Заглушка отвечает 429
+    telegram = create_telegram_app(rate=args.telegram_rate)
+    runner, url = await start(telegram)
+    bot = Bot("0:bench", session=AiohttpSession(api=TelegramAPIServer.from_base(url)))
+    broadcaster = make_broadcaster(bot)
+    await broadcaster.open()
+    started = time.perf_counter()
+    broadcast_id = await broadcaster.create("bench-2", recipients=recipients(args.small))
+    progress = await wait_done(broadcaster, broadcast_id)
+    report(f"2. {args.small} сообщений, заглушка пропускает {args.telegram_rate:.0f}/с",
+           progress, telegram, 0, time.perf_counter() - started, broadcaster)
+    await broadcaster.close()
+
+    # 3. Падение посреди рассылки и перезапуск
+    telegram["sent"].clear()
+    broadcaster = make_broadcaster(bot)
+    await broadcaster.open()
+    started = time.perf_counter()
+    broadcast_id = await broadcaster.create("bench-3", recipients=recipients(args.small))
+    # Посреди пачки, а не на её границе
+    while len(telegram["sent"]) < args.small // 2 + args.batch // 2:
+        await asyncio.sleep(0.01)
+    # Как kill -9: результаты текущей пачки не записаны
+    broadcaster._runner.cancel()
+    await asyncio.gather(broadcaster._runner, return_exceptions=True)
+    broadcaster._runner = None
+    await broadcaster.close()
+    crashed_at = len(telegram["sent"])
+
+    broadcaster = make_broadcaster(bot)
+    await broadcaster.open()
+    progress = await wait_done(broadcaster, broadcast_id)
+    report(f"3. {args.small} сообщений, падение после {crashed_at} и перезапуск",
+           progress, telegram, 0, time.perf_counter() - started, broadcaster)
+    print("=" * 64)
+
+    await broadcaster.close()
+    await bot.session.close()
+    await runner.cleanup()
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+"""
+Проверка и бенчмарк кэша ответов против локальной Redis-заглушки
+
+Поднимает fake_redis в процессе, проверяет попадания обоих уровней,
+инвалидацию игрока и работу без Redis, затем меряет задержку get().
+
+Запуск:
+    python bench_cache.py --iterations 20000
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+
+from cache import ResponseCache
+from fake_redis import start_server
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except:
+        pass
+
+
+async def timed(coro_factory, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await coro_factory()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк ResponseCache")
+    parser.add_argument("--iterations", type=int, default=20_000)
+    args = parser.parse_args()
+
+    server, storage = await start_server()
+    port = server.sockets[0].getsockname()[1]
+    cache = ResponseCache(max_entries=1000, ttl=60, redis_host="127.0.0.1", redis_port=port)
+    body = b'{"player_id":"101","count":1,"brawlers":[]}' * 20
+
+    # --- Проверки
+    key = cache.key("101", 7, "brawlers")
+    assert await cache.get(key) is None
+    await cache.set(key, body, "101")
+    assert await cache.get(key) == body and cache.stats["lru_hits"] == 1
+
+    cache.lru.clear()
+    assert await cache.get(key) == body and cache.stats["redis_hits"] == 1
+    assert await cache.get(key) == body and cache.stats["lru_hits"] == 2, "Redis-попадание поднимается в LRU"
+
+    await cache.set(cache.key("102", 1, "brawlers"), body, "102")
+    await cache.invalidate_player("101")
+    assert await cache.get(key) is None
+    cache.lru.clear()
+    assert await cache.get(key) is None, "инвалидация удаляет ключи и из Redis"
+    assert await cache.get(cache.key("102", 1, "brawlers")) == body, "чужие игроки не затронуты"
+
+    offline = ResponseCache(redis_host="127.0.0.1", redis_port=1, redis_timeout=0.05)
+    await offline.set(key, body, "101")
+    assert await offline.get(key) == body and offline.stats["redis_errors"] == 1
+    await offline.close()
+    print("Проверки пройдены")
+
+    # --- Задержки
+    await cache.set(key, body, "101")
+    lru_us = await timed(lambda: cache.get(key), args.iterations)
+
+    async def redis_hit():
+        cache.lru.clear()
+        await cache.get(key)
+    redis_us = await timed(redis_hit, args.iterations // 10)
+
+    missing = cache.key("103", 1, "brawlers")
+    miss_us = await timed(lambda: cache.get(missing), args.iterations // 10)
+
+    print("=" * 50)
+    print(f"LRU hit:     {lru_us:8.2f} мкс")
+    print(f"Redis hit:   {redis_us:8.2f} мкс")
+    print(f"Miss:        {miss_us:8.2f} мкс")
+    print(f"Команд Redis: {storage.commands:,}")
+    print(f"Статистика:  {cache.snapshot()}")
+    print("=" * 50)
+
+    await cache.close()
+    server.close()
+    await server.wait_closed()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,197 @@
+"""
+Бенчмарк /chart: рендер PNG и повторные запросы
+
+Что меряется:
+    1. время рендера одного графика (matplotlib, Agg)
+    2. задержка event loop бота, пока рендерится пачка графиков:
+       прямо в цикле против пула процессов
+    3. /chart через диспетчер бота против заглушки Telegram и настоящего
+       API (через call_asgi): первый запрос рендерит и загружает картинку,
+       повторные получают 304 от API и отправляют сохранённый file_id
+
+Запуск:
+    python bench_charts.py --charts 20 --users 50
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from aiohttp import web
+
+from benchutil import call_asgi, percentile, seed_player, use_temp_data_dir
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except:
+        pass
+
+DATA_DIR = use_temp_data_dir()
+CHART_DIR = tempfile.mkdtemp(prefix="bench-charts-")
+os.environ["CHART_CACHE_DIR"] = CHART_DIR
+
+import api  # noqa: E402
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiogram.types import Update  # noqa: E402
+
+import bot as bot_module  # noqa: E402
+from backend_client import BackendClient  # noqa: E402
+from charts import ChartRenderer, render_winrate_chart  # noqa: E402
+from fake_telegram import create_app as create_telegram_app, make_update  # noqa: E402
+from user_store import UserStore  # noqa: E402
+
+PLAYER = "BENCH"
+
+
+def create_api_proxy() -> web.Application:
+    """HTTP-обёртка над api.app: BackendClient ходит в настоящее API"""
+    app = web.Application()
+    stats = {"requests": 0, "not_modified": 0}
+    app["stats"] = stats
+
+    async def proxy(request: web.Request) -> web.Response:
+        stats["requests"] += 1
+        headers = {k: v for k, v in request.headers.items() if k.lower() == "if-none-match"}
+        status, response_headers, body = await call_asgi(api.app, request.method, request.path_qs, headers)
+        if status == 304:
+            stats["not_modified"] += 1
+        return web.Response(status=status, body=body or None, headers={
+            k: v for k, v in response_headers.items() if k in ("etag", "content-type")
+        })
+
+    app.router.add_route("*", "/{tail:.*}", proxy)
+    return app
+
+
+async def start(app: web.Application) -> tuple:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+
+async def loop_lag(work) -> float:
+    """Максимальная задержка тика 10 мс, пока выполняется work"""
+    lags = []
+    done = False
+
+    async def ticker():
+        while not done:
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append((time.perf_counter() - started - 0.01) * 1000)
+
+    task = asyncio.create_task(ticker())
+    await work()
+    done = True
+    await task
+    return max(lags) if lags else 0.0
+
+
+async def chart_burst(bot: Bot, telegram: web.Application, users: list, first_id: int, text: str) -> dict:
+    sent_before = len(telegram["sent"])
+    latencies = []
+
+    async def one(i: int):
+        update = Update.model_validate(make_update(first_id + i, users[i], text), context={"bot": bot})
+        started = time.perf_counter()
+        await bot_module.dp.feed_update(bot, update)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(len(users))))
+    photos = [m for m in telegram["sent"][sent_before:] if m["method"] == "sendPhoto"]
+    return {
+        "elapsed": time.perf_counter() - started,
+        "p50": percentile(latencies, 0.5),
+        "p99": percentile(latencies, 0.99),
+        "photos": len(photos),
+        "uploads": sum(m["photo"] == "upload" for m in photos),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк /chart")
+    parser.add_argument("--charts", type=int, default=20, help="графиков в пачке для замера event loop")
+    parser.add_argument("--users", type=int, default=50, help="одновременных /chart")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--processes", type=int, default=2)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    seed_player(api.battle_store, PLAYER, days=365, per_day=20, brawlers=20)
+    history = api.compute_history(PLAYER, "Shelly", args.days)
+
+    print("=" * 64)
+    render_winrate_chart("Shelly", args.days, history)  # прогрев шрифтов
+    started = time.perf_counter()
+    for _ in range(5):
+        png = render_winrate_chart("Shelly", args.days, history)
+    render_ms = (time.perf_counter() - started) / 5 * 1000
+    print(f"Рендер: {render_ms:.0f} мс на график, {len(png) / 1024:.0f} КБ PNG")
+
+    async def inline():
+        for _ in range(args.charts):
+            render_winrate_chart("Shelly", args.days, history)
+            await asyncio.sleep(0)
+
+    renderer = ChartRenderer(args.processes)
+    await renderer.render("Shelly", args.days, history)  # запуск процессов
+
+    async def pooled():
+        await asyncio.gather(*(renderer.render("Shelly", args.days, history) for _ in range(args.charts)))
+
+    print(f"\nЗадержка event loop, {args.charts} графиков:")
+    print(f"  в цикле бота:        {await loop_lag(inline):8.1f} мс")
+    print(f"  пул {args.processes} процессов:     {await loop_lag(pooled):8.1f} мс")
+    renderer.close()
+
+    telegram = create_telegram_app()
+    api_proxy = create_api_proxy()
+    telegram_runner, telegram_url = await start(telegram)
+    api_runner, api_url = await start(api_proxy)
+    bot = Bot("0:bench", session=AiohttpSession(api=TelegramAPIServer.from_base(telegram_url)))
+    bot_module.backend = BackendClient(api_url)
+    bot_module.chart_renderer = ChartRenderer(args.processes)
+    bot_module.user_store = UserStore("sqlite+aiosqlite:///:memory:")
+    await bot_module.user_store.open()
+
+    users = list(range(1000, 1000 + args.users))
+    for user_id in users:
+        bot_module.user_store.set(user_id, PLAYER)
+    text = f"/chart Shelly {args.days}"
+    update_id = 0
+    print(f"\n{args.users} одновременных «{text}» одного игрока:")
+    for title in ("первый раз", "повтор", "повтор"):
+        proxy_before = dict(api_proxy["stats"])
+        result = await chart_burst(bot, telegram, users, update_id, text)
+        update_id += len(users)
+        print(f"  {title:<11} {result['elapsed'] * 1000:7.0f} мс, p99 {result['p99']:6.0f} мс, "
+              f"фото {result['photos']}, загрузок {result['uploads']}, "
+              f"304 от API {api_proxy['stats']['not_modified'] - proxy_before['not_modified']}")
+    print(f"  кэш графиков: {bot_module.chart_cache.stats}")
+    print("=" * 64)
+
+    bot_module.chart_renderer.close()
+    await bot_module.user_store.close()
+    await bot_module.backend.close()
+    await bot.session.close()
+    await api_runner.cleanup()
+    await telegram_runner.cleanup()
+    api.battle_store.close()
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+    shutil.rmtree(CHART_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
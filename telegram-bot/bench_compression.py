@@ -0,0 +1,111 @@
+"""
+Бенчмарк сжатия ответов аналитики (gzip / brotli по Accept-Encoding)
+
+Для каждого маршрута печатает размер тела без сжатия, в gzip и brotli
+(экономия трафика) и время сжатия одного тела (CPU), затем сравнивает
+время ответа:
+    identity  - без Accept-Encoding, тело из кэша
+    gzip, br  - сжатое тело из кэша (как в api.py: сжатие раз на версию данных)
+    .../req   - сжатие на каждый запрос (кэш сжатых тел очищается перед запросом)
+
+Запуск:
+    python bench_compression.py --iterations 2000
+"""
+
+import argparse
+import asyncio
+import shutil
+import sys
+import time
+
+from benchutil import call_asgi, seed_player, use_temp_data_dir
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except:
+        pass
+
+DATA_DIR = use_temp_data_dir()
+
+import api  # noqa: E402
+
+ROUTES = [
+    ("brawlers", "/analytics/BENCH/brawlers"),
+    ("brawlers top5", "/analytics/BENCH/brawlers?limit=5"),
+    ("history 365d", "/analytics/BENCH/brawlers/Shelly/winrate-history?days=365"),
+    ("map", "/analytics/BENCH/maps/Hard%20Rock%20Mine/brawlers"),
+]
+
+
+def compress_us(body: bytes, encoding: str, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        api.compressor.compress(body, encoding)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def drop_encoded():
+    """Удалить из LRU только сжатые тела, оставив несжатые"""
+    lru = api.response_cache.lru
+    for key in [key for key in lru._data if "#" in key]:
+        del lru._data[key]
+
+
+async def measure(path: str, iterations: int, headers=None, per_request: bool = False) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        if per_request:
+            drop_encoded()
+        await call_asgi(api.app, "GET", path, headers)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк сжатия ответов")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    seed_player(api.battle_store, "BENCH", days=365, per_day=20, brawlers=80)
+
+    print("=" * 84)
+    print(f"{'маршрут':<15}{'байт':>8}{'gzip':>8}{'br':>8}{'экономия br':>13}"
+          f"{'gzip, мкс':>11}{'br, мкс':>10}")
+    bodies = []
+    for title, path in ROUTES:
+        status, _, body = await call_asgi(api.app, "GET", path)
+        assert status == 200
+        bodies.append((title, path, body))
+        if len(body) < api.compressor.min_bytes:
+            print(f"{title:<15}{len(body):>8}{'меньше COMPRESSION_MIN_BYTES, не сжимается':>58}")
+            continue
+        sizes = {encoding: len(api.compressor.compress(body, encoding)) for encoding in ("gzip", "br")}
+        iterations = max(10, args.iterations // 10)
+        print(f"{title:<15}{len(body):>8}{sizes['gzip']:>8}{sizes['br']:>8}"
+              f"{1 - sizes['br'] / len(body):>12.0%}"
+              f"{compress_us(body, 'gzip', iterations):>11.1f}{compress_us(body, 'br', iterations):>10.1f}")
+
+    print("-" * 84)
+    print(f"{'ответ, мкс':<15}{'identity':>10}{'gzip':>10}{'gzip/req':>10}{'br':>10}{'br/req':>10}")
+    for title, path, body in bodies:
+        row = [await measure(path, args.iterations)]
+        for encoding in ("gzip", "br"):
+            headers = {"Accept-Encoding": encoding}
+            row.append(await measure(path, args.iterations, headers))
+            row.append(await measure(path, args.iterations // 10, headers, per_request=True))
+        print(f"{title:<15}" + "".join(f"{value:>10.1f}" for value in row))
+
+    stats = api.compressor.stats
+    print("-" * 84)
+    print(f"Отдано {stats['sent_bytes'] / 1e6:.1f} МБ вместо {stats['raw_bytes'] / 1e6:.1f} МБ "
+          f"({1 - stats['sent_bytes'] / stats['raw_bytes']:.0%} трафика сэкономлено), "
+          f"сжатий: {stats['compressions']:,} на {stats['gzip'] + stats['br']:,} сжатых ответов")
+    print("=" * 84)
+
+    api.battle_store.close()
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+"""
+Бенчмарк ETag: 304 Not Modified против полного ответа
+
+Для каждого маршрута аналитики меряет три пути:
+    full  - ответ строится и сериализуется (кэш очищается перед запросом)
+    cache - ответ из кэша в процессе
+    304   - совпавший If-None-Match, тело не строится
+
+Запуск:
+    python bench_etag.py --iterations 2000
+"""
+
+import argparse
+import asyncio
+import shutil
+import sys
+import time
+
+from benchutil import call_asgi, seed_player, use_temp_data_dir
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except:
+        pass
+
+DATA_DIR = use_temp_data_dir()
+
+import api  # noqa: E402
+
+ROUTES = [
+    ("brawlers", "/analytics/BENCH/brawlers"),
+    ("history 365d", "/analytics/BENCH/brawlers/Shelly/winrate-history?days=365"),
+    ("map", "/analytics/BENCH/maps/Hard%20Rock%20Mine/brawlers"),
+]
+
+
+async def measure(path: str, iterations: int, headers=None, clear_cache: bool = False) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        if clear_cache:
+            api.response_cache.lru.clear()
+        await call_asgi(api.app, "GET", path, headers)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк ETag / 304")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    seed_player(api.battle_store, "BENCH", days=365, per_day=20, brawlers=80)
+
+    print("=" * 72)
+    print(f"{'маршрут':<14}{'байт':>8}{'full, мкс':>12}{'cache, мкс':>12}{'304, мкс':>12}{'x full':>10}")
+    for title, path in ROUTES:
+        status, headers, body = await call_asgi(api.app, "GET", path)
+        assert status == 200 and "etag" in headers
+        conditional = {"If-None-Match": headers["etag"]}
+        status, _, empty = await call_asgi(api.app, "GET", path, conditional)
+        assert status == 304 and not empty
+
+        full_us = await measure(path, args.iterations // 10, clear_cache=True)
+        cache_us = await measure(path, args.iterations)
+        not_modified_us = await measure(path, args.iterations, conditional)
+        print(f"{title:<14}{len(body):>8}{full_us:>12.1f}{cache_us:>12.1f}{not_modified_us:>12.1f}"
+              f"{full_us / not_modified_us:>9.1f}x")
+    print("=" * 72)
+
+    api.battle_store.close()
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,98 @@
+"""
+Бенчмарк рассылки SSE-событий
+
+Держит тысячи подписчиков на одном event loop: часть читает события,
+часть («медленные») не читает вовсе и должна быть отключена по
+переполнению буфера. Измеряет память на подписчика и время fan-out.
+
+Запуск:
+    python bench_events.py --subscribers 10000 --players 1000
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+import tracemalloc
+
+from events import EventBroker
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except:
+        pass
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк EventBroker")
+    parser.add_argument("--subscribers", type=int, default=10_000)
+    parser.add_argument("--players", type=int, default=1_000)
+    parser.add_argument("--events", type=int, default=100, help="событий на игрока")
+    parser.add_argument("--slow", type=float, default=0.05, help="доля не читающих клиентов")
+    parser.add_argument("--buffer", type=int, default=64)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    broker = EventBroker(buffer_size=args.buffer, heartbeat=3600)
+    players = [f"#P{i}" for i in range(args.players)]
+    received = 0
+
+    async def consume(stream):
+        nonlocal received
+        async for _ in stream:
+            received += 1
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    consumers = []
+    slow_streams = []
+    for _ in range(args.subscribers):
+        subscriber = broker.subscribe(rng.choice(players))
+        stream = broker.stream(subscriber)
+        if rng.random() < args.slow:
+            # Клиент подключился, но ничего не читает
+            slow_streams.append(stream)
+        else:
+            consumers.append(asyncio.create_task(consume(stream)))
+
+    await asyncio.sleep(0.1)
+    idle_memory = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    data = {"player_id": "", "version": 0, "brawlers": [
+        {"brawler": "Shelly", "matches": 120, "wins": 64, "win_rate": 0.533}
+    ]}
+
+    publish_time = 0.0
+    for version in range(args.events):
+        started = time.perf_counter()
+        for player in players:
+            broker.publish(player, "brawlers", data, event_id=version)
+        publish_time += time.perf_counter() - started
+        # Даём читающим клиентам разобрать очереди
+        await asyncio.sleep(0.01)
+
+    await asyncio.sleep(0.1)
+    published = args.events * args.players
+
+    print("=" * 50)
+    print(f"Подписчиков:          {args.subscribers:,} ({len(slow_streams)} не читают)")
+    print(f"Память в простое:     {idle_memory / args.subscribers:,.0f} байт на подписчика")
+    print(f"Событий опубликовано: {published:,}")
+    print(f"Fan-out:              {publish_time / published * 1e6:.1f} мкс на событие")
+    print(f"Доставлено:           {broker.stats['delivered']:,} (прочитано {received - len(consumers):,})")
+    print(f"Отключено медленных:  {broker.stats['dropped']:,}")
+    print(f"Активных подписчиков: {broker.stats['subscribers']:,}")
+    print("=" * 50)
+
+    for task in consumers:
+        task.cancel()
+    await asyncio.gather(*consumers, return_exceptions=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
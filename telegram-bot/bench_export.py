@@ -0,0 +1,166 @@
+"""
+Бенчмарк потоковой выгрузки боёв (/analytics/{player_id}/battles/export)
+
+Записывает одному игроку --rows боёв и меряет:
+    generator - export_battles() в процессе: МБ/с, боёв/с и пик памяти
+                (tracemalloc) — он не должен расти с числом боёв
+    http      - скачивание через uvicorn по HTTP (aiohttp, потоком)
+    list      - прежний способ для сравнения: read_player() + orjson всего
+                списка на первых --list-rows боях (память растёт с историей)
+
+Запуск:
+    python bench_export.py --rows 5000000
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import shutil
+import subprocess
+import sys
+import time
+import tracemalloc
+from itertools import islice
+
+import aiohttp
+import numpy as np
+import orjson
+
+from bench_load import free_port, wait_healthy
+from benchutil import use_temp_data_dir
+from game_data import BRAWLERS, EVENTS
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except:
+        pass
+
+PLAYER = "EXPORT"
+WRITE_CHUNK = 1_000_000
+
+
+def seed_long_history(store, rows: int, seed: int):
+    """Игрок с rows боями по бою в минуту, записанный блоками append_blocks"""
+    from map_engine import RECORD_DTYPE
+
+    rng = np.random.default_rng(seed)
+    encode = store.symbols.encode
+    brawler_ids = np.array([encode("brawler", name) for name in BRAWLERS], dtype=np.uint16)
+    map_ids = np.array([encode("map", name) for _, name in EVENTS], dtype=np.uint16)
+    mode_ids = np.array([encode("mode", mode) for mode, _ in EVENTS], dtype=np.uint8)
+
+    start = int(time.time()) - rows * 60
+    for first in range(0, rows, WRITE_CHUNK):
+        n = min(WRITE_CHUNK, rows - first)
+        event = rng.integers(0, len(EVENTS), n)
+        records = np.empty(n, dtype=RECORD_DTYPE)
+        records["timestamp"] = start + (first + np.arange(n)) * 60
+        records["brawler"] = brawler_ids[rng.integers(0, len(BRAWLERS), n)]
+        records["map"] = map_ids[event]
+        records["mode"] = mode_ids[event]
+        records["result"] = rng.random(n) < 0.52
+        store.append_blocks([(PLAYER, records.tobytes(), int(records["timestamp"][-1]))])
+
+
+def traced_peak(run) -> int:
+    """Пик памяти Python и NumPy за run() по tracemalloc (отдельный прогон: трассировка замедляет)"""
+    gc.collect()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def measure_generator(store, fmt: str, chunk_records: int):
+    from export import export_battles
+
+    def run() -> int:
+        return sum(len(chunk) for chunk in export_battles(store, PLAYER, fmt, chunk_records=chunk_records))
+
+    started = time.perf_counter()
+    size = run()
+    return size, time.perf_counter() - started, traced_peak(run)
+
+
+def measure_list(store, rows: int):
+    def run() -> int:
+        battles = list(islice(store.iter_player(PLAYER), rows))
+        return len(orjson.dumps([battle._asdict() for battle in battles]))
+
+    started = time.perf_counter()
+    size = run()
+    return size, time.perf_counter() - started, traced_peak(run)
+
+
+async def measure_http(fmt: str):
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        env=os.environ.copy(),
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None)) as session:
+            await wait_healthy(session, url, timeout=120)
+            size = 0
+            started = time.perf_counter()
+            async with session.get(f"{url}/analytics/{PLAYER}/battles/export?format={fmt}") as response:
+                assert response.status == 200, response.status
+                async for chunk in response.content.iter_any():
+                    size += len(chunk)
+            return size, time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк потоковой выгрузки боёв")
+    parser.add_argument("--rows", type=int, default=5_000_000, help="боёв у игрока")
+    parser.add_argument("--chunk", type=int, default=16384, help="боёв в куске (EXPORT_CHUNK_RECORDS)")
+    parser.add_argument("--list-rows", type=int, default=1_000_000, help="боёв для сравнения со списком")
+    parser.add_argument("--no-http", action="store_true", help="без замера через uvicorn")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    data_dir = use_temp_data_dir()
+    os.environ["EXPORT_CHUNK_RECORDS"] = str(args.chunk)
+    from storage import BattleStore
+
+    try:
+        store = BattleStore(data_dir)
+        print(f"Засев: {args.rows:,} боёв игроку {PLAYER}...")
+        seed_long_history(store, args.rows, args.seed)
+
+        print("=" * 72)
+        print(f"{'способ':<18}{'МБ':>9}{'МБ/с':>9}{'боёв/с':>14}{'пик памяти':>14}")
+        print("-" * 72)
+        for fmt in ("ndjson", "csv"):
+            size, elapsed, peak = measure_generator(store, fmt, args.chunk)
+            print(f"{'generator ' + fmt:<18}{size / 1e6:>9.0f}{size / 1e6 / elapsed:>9.1f}"
+                  f"{args.rows / elapsed:>14,.0f}{peak / 1e6:>11.1f} МБ")
+
+        rows = min(args.list_rows, args.rows)
+        size, elapsed, peak = measure_list(store, rows)
+        print(f"{'list json':<18}{size / 1e6:>9.0f}{size / 1e6 / elapsed:>9.1f}"
+              f"{rows / elapsed:>14,.0f}{peak / 1e6:>11.1f} МБ  ({rows:,} боёв)")
+        store.close()
+
+        if not args.no_http:
+            for fmt in ("ndjson", "csv"):
+                size, elapsed = await measure_http(fmt)
+                print(f"{'http ' + fmt:<18}{size / 1e6:>9.0f}{size / 1e6 / elapsed:>9.1f}"
+                      f"{args.rows / elapsed:>14,.0f}{'':>14}")
+        print("=" * 72)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
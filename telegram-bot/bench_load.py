@@ -0,0 +1,368 @@
+"""
+Нагрузочный тест API аналитики
+
+Воркеры (--concurrency) в замкнутом цикле шлют запросы по взвешенной смеси
+маршрутов: аналитика, синхронизация и /health. Итог по каждому маршруту:
+запросы в секунду, ошибки, p50/p95/p99.
+
+Цели:
+    asgi     - api.app в этом же процессе, вызов ASGI напрямую (по умолчанию);
+               генератор и API делят один event loop, это меряет стоимость
+               обработки, а не сети
+    uvicorn  - отдельный процесс uvicorn api:app на свободном порту
+    --url    - уже запущенный API (должен синхронизировать игроков, например
+               через fake_brawl_api.py)
+
+Для asgi и uvicorn данные — временный каталог с засеянными игроками,
+синхронизация ходит в локальную заглушку Brawl Stars API.
+
+Базовая линия и сравнение:
+    python bench_load.py --duration 20 --save load-baseline.json
+    python bench_load.py --duration 20 --compare load-baseline.json --threshold 0.15
+
+При сравнении маршрут считается регрессией, если p95/p99 выросли или
+запросы в секунду упали больше чем на threshold; код выхода тогда 1.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+
+import aiohttp
+from aiohttp import web
+
+from benchutil import call_asgi, percentile, seed_player, use_temp_data_dir
+from fake_brawl_api import create_app as create_brawl_app
+from game_data import BRAWLERS, EVENTS
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except:
+        pass
+
+
+class Route(NamedTuple):
+    name: str
+    method: str
+    path: str  # {player}, {brawler}, {map}, {days} подставляются на каждый запрос
+    weight: float
+
+
+# Примерно как ходит Mini App: первый экран, графики, карты; синхронизация — редкая
+DEFAULT_MIX = [
+    Route("brawlers", "GET", "/analytics/{player}/brawlers", 25),
+    Route("dashboard", "GET", "/analytics/{player}/dashboard", 15),
+    Route("history", "GET", "/analytics/{player}/brawlers/{brawler}/winrate-history?days={days}", 20),
+    Route("map_brawlers", "GET", "/analytics/{player}/maps/{map}/brawlers", 10),
+    Route("maps_best", "GET", "/analytics/{player}/maps/best", 8),
+    Route("maps_worst", "GET", "/analytics/{player}/maps/worst", 4),
+    Route("daily", "GET", "/analytics/{player}/daily", 5),
+    Route("sync", "POST", "/admin/sync/{player}", 3),
+    Route("health", "GET", "/health", 10),
+]
+
+HISTORY_DAYS = (7, 30, 30, 30, 90, 365)
+METRICS = ("rps", "p50", "p95", "p99")
+
+
+def parse_mix(value: Optional[str]) -> List[Route]:
+    """--mix brawlers=50,health=50 — веса маршрутов (остальные выключаются)"""
+    if not value:
+        return DEFAULT_MIX
+    weights = dict(item.split("=") for item in value.split(","))
+    unknown = set(weights) - {route.name for route in DEFAULT_MIX}
+    if unknown:
+        raise SystemExit(f"Неизвестные маршруты: {', '.join(sorted(unknown))}")
+    return [route._replace(weight=float(weights[route.name])) for route in DEFAULT_MIX if route.name in weights]
+
+
+class LoadGenerator:
+    """Замкнутый цикл запросов и сбор задержек по маршрутам"""
+
+    def __init__(self, send, mix: List[Route], players: List[str], brawlers: int, seed: int):
+        self.send = send
+        self.mix = mix
+        self.weights = [route.weight for route in mix]
+        self.players = players
+        self.brawlers = BRAWLERS[:brawlers]
+        self.rng = random.Random(seed)
+        self.latencies: Dict[str, List[float]] = {route.name: [] for route in mix}
+        self.errors: Dict[str, int] = {route.name: 0 for route in mix}
+
+    def next_request(self) -> Tuple[Route, str]:
+        rng = self.rng
+        route = rng.choices(self.mix, self.weights)[0]
+        path = route.path.format(
+            player=quote(rng.choice(self.players)),
+            brawler=quote(rng.choice(self.brawlers)),
+            map=quote(rng.choice(EVENTS)[1]),
+            days=rng.choice(HISTORY_DAYS)
+        )
+        return route, path
+
+    async def worker(self, deadline: float, record: bool):
+        while time.perf_counter() < deadline:
+            route, path = self.next_request()
+            started = time.perf_counter()
+            try:
+                status = await self.send(route.method, path)
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+                status = 0
+            elapsed = time.perf_counter() - started
+            if not record:
+                continue
+            self.latencies[route.name].append(elapsed)
+            if not 200 <= status < 400:
+                self.errors[route.name] += 1
+
+    async def run(self, duration: float, concurrency: int, record: bool = True) -> float:
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(self.worker(deadline, record) for _ in range(concurrency)))
+        return time.perf_counter() - started
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for name, latencies in self.latencies.items():
+            if not latencies:
+                continue
+            endpoints[name] = {
+                "requests": len(latencies),
+                "errors": self.errors[name],
+                "rps": round(len(latencies) / elapsed, 1),
+                "p50": round(percentile(latencies, 0.50) * 1000, 3),
+                "p95": round(percentile(latencies, 0.95) * 1000, 3),
+                "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            }
+        everything = [value for latencies in self.latencies.values() for value in latencies]
+        total = {
+            "requests": len(everything),
+            "errors": sum(self.errors.values()),
+            "rps": round(len(everything) / elapsed, 1),
+            "p50": round(percentile(everything, 0.50) * 1000, 3) if everything else 0.0,
+            "p95": round(percentile(everything, 0.95) * 1000, 3) if everything else 0.0,
+            "p99": round(percentile(everything, 0.99) * 1000, 3) if everything else 0.0,
+        }
+        return {"endpoints": endpoints, "total": total}
+
+
+def print_report(result: dict):
+    print("=" * 78)
+    print(f"{'маршрут':<14}{'запросов':>10}{'ошибок':>8}{'rps':>10}{'p50, мс':>11}{'p95, мс':>11}{'p99, мс':>11}")
+    print("-" * 78)
+    rows = list(result["endpoints"].items()) + [("ВСЕГО", result["total"])]
+    for name, row in rows:
+        print(f"{name:<14}{row['requests']:>10}{row['errors']:>8}{row['rps']:>10.1f}"
+              f"{row['p50']:>11.2f}{row['p95']:>11.2f}{row['p99']:>11.2f}")
+    print("=" * 78)
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> List[str]:
+    """Регрессии относительно базовой линии: рост задержек или падение rps больше threshold"""
+    regressions = []
+    print(f"Сравнение с базовой линией ({baseline['meta'].get('created', '?')}), порог {threshold:.0%}")
+    print(f"{'маршрут':<14}" + "".join(f"{metric:>14}" for metric in METRICS))
+    rows = list(result["endpoints"].items()) + [("ВСЕГО", result["total"])]
+    for name, row in rows:
+        base = baseline["endpoints"].get(name) if name != "ВСЕГО" else baseline["total"]
+        if base is None:
+            continue
+        cells = []
+        for metric in METRICS:
+            if not base[metric]:
+                cells.append(f"{'—':>14}")
+                continue
+            change = row[metric] / base[metric] - 1
+            # Для rps хуже — меньше, для задержек — больше; p50 не флагуется, он шумит на микросекундах
+            worse = -change if metric == "rps" else change
+            flagged = metric != "p50" and worse > threshold
+            if flagged:
+                regressions.append(f"{name} {metric}: {base[metric]} -> {row[metric]} ({change:+.0%})")
+            cells.append(f"{change:>+12.0%}{' !' if flagged else '  '}")
+        print(f"{name:<14}" + "".join(cells))
+    return regressions
+
+
+async def start_fake_brawl_api() -> Tuple[web.AppRunner, str]:
+    runner = web.AppRunner(create_brawl_app())
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    return runner, f"http://127.0.0.1:{runner.addresses[0][1]}/v1"
+
+
+def seed_players(store, players: List[str], days: int, per_day: int, brawlers: int):
+    for i, player_id in enumerate(players):
+        seed_player(store, player_id, days=days, per_day=per_day, brawlers=brawlers, seed=i)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_healthy(session: aiohttp.ClientSession, url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(f"{url}/health") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.1)
+    raise TimeoutError(f"{url}/health не ответил за {timeout:.0f} с")
+
+
+def http_sender(session: aiohttp.ClientSession, url: str, headers: Dict[str, str]):
+    async def send(method: str, path: str) -> int:
+        async with session.request(method, url + path, headers=headers) as response:
+            await response.read()
+            return response.status
+    return send
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест API")
+    parser.add_argument("--target", choices=("asgi", "uvicorn"), default="asgi")
+    parser.add_argument("--url", help="адрес уже запущенного API вместо --target")
+    parser.add_argument("--duration", type=float, default=10.0, help="секунд замера")
+    parser.add_argument("--warmup", type=float, default=2.0, help="секунд прогрева без учёта")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--players", type=int, default=50)
+    parser.add_argument("--days", type=int, default=180, help="дней истории у засеянных игроков")
+    parser.add_argument("--per-day", type=int, default=20)
+    parser.add_argument("--brawlers", type=int, default=40)
+    parser.add_argument("--mix", help="веса маршрутов, например brawlers=50,history=30,health=20")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="сохранить результат как базовую линию (JSON)")
+    parser.add_argument("--compare", help="сравнить с базовой линией (JSON)")
+    parser.add_argument("--threshold", type=float, default=0.15)
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    players = [f"LOAD{i}" for i in range(args.players)]
+    target = "url" if args.url else args.target
+    cleanup = []
+
+    if target in ("asgi", "uvicorn"):
+        data_dir = use_temp_data_dir()
+        brawl_runner, brawl_url = await start_fake_brawl_api()
+        cleanup.append(brawl_runner.cleanup)
+        os.environ["BRAWL_STARS_API_URL"] = brawl_url
+        os.environ["BRAWL_STARS_RATE_LIMIT"] = "100000"
+        os.environ["BRAWL_STARS_BURST"] = "100000"
+        print(f"Засев: {args.players} игроков × {args.days * args.per_day} боёв...")
+
+    if target == "asgi":
+        import api
+
+        seed_players(api.battle_store, players, args.days, args.per_day, args.brawlers)
+
+        async def send(method: str, path: str) -> int:
+            status, _, _ = await call_asgi(api.app, method, path)
+            return status
+
+        async def close_api():
+            await api.brawl_client.close()
+            api.battle_store.close()
+            shutil.rmtree(data_dir, ignore_errors=True)
+        cleanup.append(close_api)
+    else:
+        if target == "uvicorn":
+            from storage import BattleStore
+
+            store = BattleStore(data_dir)
+            seed_players(store, players, args.days, args.per_day, args.brawlers)
+            store.close()
+
+            port = free_port()
+            url = f"http://127.0.0.1:{port}"
+            process = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1", "--port", str(port),
+                 "--log-level", "warning", "--no-access-log"],
+                env=os.environ.copy(),
+                cwd=os.path.dirname(os.path.abspath(__file__))
+            )
+
+            def stop_uvicorn():
+                process.terminate()
+                process.wait(timeout=10)
+                shutil.rmtree(data_dir, ignore_errors=True)
+            cleanup.append(stop_uvicorn)
+            headers = {}
+        else:
+            from config import settings
+
+            url = args.url.rstrip("/")
+            headers = {"X-Service-Token": settings.service_token}
+
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=args.concurrency),
+            timeout=aiohttp.ClientTimeout(total=30)
+        )
+        cleanup.append(session.close)
+        await wait_healthy(session, url)
+        if target == "url":
+            # Игроков на живом API создаёт синхронизация
+            for player_id in players:
+                async with session.post(f"{url}/admin/sync/{quote(player_id)}", headers=headers) as response:
+                    await response.read()
+        send = http_sender(session, url, headers)
+
+    try:
+        generator = LoadGenerator(send, mix, players, args.brawlers, args.seed)
+        if args.warmup:
+            await generator.run(args.warmup, args.concurrency, record=False)
+        print(f"Цель: {target}, воркеров: {args.concurrency}, {args.duration:.0f} с")
+        elapsed = await generator.run(args.duration, args.concurrency)
+        result = generator.report(elapsed)
+    finally:
+        for close in reversed(cleanup):
+            outcome = close()
+            if asyncio.iscoroutine(outcome):
+                await outcome
+
+    result["meta"] = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "target": target,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "players": args.players,
+        "mix": {route.name: route.weight for route in mix},
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+    }
+    print_report(result)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"Базовая линия сохранена: {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold)
+        if regressions:
+            print("РЕГРЕССИИ:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("Регрессий нет")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""
+Бенчмарк матриц карта × боец
+
+Тысячи игроков на ~120 картах: ленивое построение матрицы из сырых
+записей, выбор лучших/худших карт (в т.ч. для одного бойца) и рейтинг
+бойцов на карте. Результаты сверяются с материализованными агрегатами.
+
+Запуск:
+    python bench_maps.py --players 2000 --maps 120
+"""
+
+import argparse
+import shutil
+import sys
+import time
+
+from benchutil import percentile, seed_player, use_temp_data_dir
+from game_data import BRAWLERS, EVENTS
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except:
+        pass
+
+DATA_DIR = use_temp_data_dir()
+
+import api  # noqa: E402
+
+
+def timed(func, iterations: int) -> float:
+    func()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def check(player_id: str):
+    """Сверка рейтинга бойцов на картах с AggregateStore"""
+    aggregates = api.aggregate_store.get(player_id)
+    matrix = api.map_engine.get(player_id)
+    for map_name, brawlers in aggregates.maps.items():
+        ranking = matrix.map_brawlers(api.map_engine.map_id(map_name))
+        got = {api.map_engine.brawler_name(b): [m, w] for b, m, w in ranking}
+        assert got == brawlers, f"{player_id}/{map_name}: {got} != {brawlers}"
+    assert (matrix.totals == matrix.counts.sum(axis=1)).all(), player_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк MapEngine")
+    parser.add_argument("--players", type=int, default=2000)
+    parser.add_argument("--maps", type=int, default=120)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--per-day", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    events = [(mode, f"{name} {i}") for i in range(args.maps // len(EVENTS) + 1) for mode, name in EVENTS]
+    events = events[:args.maps]
+
+    started = time.perf_counter()
+    battles = 0
+    for i in range(args.players):
+        battles += seed_player(
+            api.battle_store, f"P{i}", days=args.days, per_day=args.per_day, seed=i, events=events
+        )
+    print("=" * 60)
+    print(f"Игроков: {args.players:,}, боёв: {battles:,}, карт: {len(events)}, бойцов: {len(BRAWLERS)}")
+    print(f"Запись боёв:                    {time.perf_counter() - started:8.1f} с")
+
+    builds = []
+    for i in range(args.players):
+        started = time.perf_counter()
+        api.map_engine.get(f"P{i}")
+        builds.append((time.perf_counter() - started) * 1000)
+    print(f"Построение матрицы: p50 {percentile(builds, 0.5):.2f} мс, p99 {percentile(builds, 0.99):.2f} мс")
+
+    for i in range(0, args.players, max(1, args.players // 50)):
+        check(f"P{i}")
+    print("Сверка с агрегатами:            ок")
+
+    matrix = api.map_engine.get("P0")
+    shelly = api.map_engine.brawler_id("Shelly")
+    map_id = api.map_engine.map_id(events[0][1])
+    results = {
+        "Лучшие 3 карты": lambda: matrix.top_maps(3, 5),
+        "Худшие 3 карты": lambda: matrix.top_maps(3, 5, worst=True),
+        "Лучшие карты бойца": lambda: matrix.top_maps(3, 1, shelly),
+        "Рейтинг бойцов на карте": lambda: matrix.map_brawlers(map_id),
+        "Эндпоинт /maps/best (без кэша)": lambda: api.compute_top_maps("P0", 3, 5, None, False),
+    }
+    for name, func in results.items():
+        print(f"{name + ':':<32}{timed(func, args.iterations):8.1f} мкс")
+    print("=" * 60)
+
+    api.battle_store.close()
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Бенчмарк накладных расходов метрик
+
+Меряет:
+    - observe()/inc() на готовом ряду гистограммы и счётчика;
+    - MetricsMiddleware вокруг пустого ASGI-приложения — чистая цена
+      инструментирования на запрос;
+    - запрос через приложение с MetricsMiddleware и тот же запрос
+      в обход него (слой под middleware в собранном стеке FastAPI),
+      медиана по чередующимся раундам;
+    - выдачу /metrics после прогона.
+
+Запуск:
+    python bench_metrics.py --iterations 20000
+"""
+
+import argparse
+import asyncio
+import shutil
+import statistics
+import sys
+import time
+
+from benchutil import call_asgi, seed_player, use_temp_data_dir
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except:
+        pass
+
+DATA_DIR = use_temp_data_dir()
+
+import api  # noqa: E402
+from metrics import MetricsMiddleware, Registry  # noqa: E402
+
+ROUTES = [
+    ("health", "/health"),
+    ("brawlers", "/analytics/BENCH/brawlers"),
+    ("history 30d", "/analytics/BENCH/brawlers/Shelly/winrate-history?days=30"),
+]
+
+ROUNDS = 20
+
+
+def per_call(func, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def per_request(app, path: str, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await call_asgi(app, "GET", path)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def empty_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def middleware_only(iterations: int) -> float:
+    """Разница между MetricsMiddleware(empty_app) и empty_app на один вызов"""
+    middleware = MetricsMiddleware(empty_app, Registry(), prefix="bench")
+    scope = {"type": "http", "method": "GET", "path": "/"}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    async def timed(app) -> float:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await app(scope, receive, send)
+        return (time.perf_counter() - started) / iterations * 1e6
+
+    return await timed(middleware) - await timed(empty_app)
+
+
+def find_middleware(app) -> MetricsMiddleware:
+    layer = app.middleware_stack
+    while not isinstance(layer, MetricsMiddleware):
+        layer = layer.app
+    return layer
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Накладные расходы метрик")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    registry = Registry()
+    histogram = registry.histogram("bench_seconds", "bench", ("route", "method")).labels("/x", "GET")
+    counter = registry.counter("bench", "bench", ("route",)).labels("/x")
+    print("=" * 64)
+    print(f"histogram.observe():      {per_call(lambda: histogram.observe(0.0042), args.iterations * 10):6.2f} мкс")
+    print(f"counter.inc():            {per_call(lambda: counter.inc(), args.iterations * 10):6.2f} мкс")
+    print(f"MetricsMiddleware:        {await middleware_only(args.iterations * 5):6.2f} мкс на запрос")
+
+    seed_player(api.battle_store, "BENCH", days=365, per_day=20, brawlers=80)
+    # Первый запрос собирает стек middleware и прогревает кэш ответов
+    for _, path in ROUTES:
+        status, _, _ = await call_asgi(api.app, "GET", path)
+        assert status == 200, path
+    middleware = find_middleware(api.app)
+
+    print("-" * 64)
+    print(f"{'маршрут':<14}{'без метрик, мкс':>18}{'с метриками, мкс':>18}{'разница':>12}")
+    for title, path in ROUTES:
+        # Чередуем короткие раунды и берём медианы, чтобы дрейф частоты CPU и GC не попадали в разницу
+        bare, instrumented = [], []
+        for _ in range(ROUNDS):
+            bare.append(await per_request(middleware.app, path, args.iterations // ROUNDS))
+            instrumented.append(await per_request(middleware, path, args.iterations // ROUNDS))
+        bare = statistics.median(bare)
+        instrumented = statistics.median(instrumented)
+        print(f"{title:<14}{bare:>18.1f}{instrumented:>18.1f}{instrumented - bare:>10.1f} мкс")
+
+    started = time.perf_counter()
+    body = api.metrics_registry.render()
+    render_ms = (time.perf_counter() - started) * 1000
+    print("-" * 64)
+    print(f"/metrics: {len(body):,} байт за {render_ms:.2f} мс")
+    print("=" * 64)
+
+    api.battle_store.close()
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+"""
+Бенчмарк страниц рейтинга (limit / cursor / sort / fields)
+
+Для рейтингов разного размера сравнивает полный рейтинг с первой
+страницей limit=5 (select() сортирует только кандидатов) и страницей по
+курсору из середины, затем — размер тела и время ответа /brawlers без
+кэша для первого экрана Mini App (limit=5&fields=brawler,win_rate).
+
+Запуск:
+    python bench_paging.py --iterations 2000
+"""
+
+import argparse
+import asyncio
+import random
+import shutil
+import sys
+import time
+
+from benchutil import call_asgi, seed_player, use_temp_data_dir
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except:
+        pass
+
+DATA_DIR = use_temp_data_dir()
+
+import api  # noqa: E402
+
+PATHS = [
+    ("полный", "/analytics/BENCH/brawlers"),
+    ("limit=5", "/analytics/BENCH/brawlers?limit=5"),
+    ("limit=5 + fields", "/analytics/BENCH/brawlers?limit=5&fields=brawler,win_rate"),
+]
+
+
+def timed(func, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк страниц рейтинга")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--sizes", default="80,1000,10000,100000", help="размеры рейтинга через запятую")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print("=" * 72)
+    print(f"{'элементов':>10}{'полный, мкс':>14}{'limit=5, мкс':>15}{'курсор, мкс':>14}{'x':>8}")
+    for size in map(int, args.sizes.split(",")):
+        counters = {}
+        for i in range(size):
+            matches = rng.randint(1, 500)
+            counters[f"brawler-{i}"] = [matches, rng.randint(0, matches)]
+        iterations = max(10, args.iterations * 80 // size)
+        # Столбцы строятся один раз на версию данных игрока (PlayerAggregates.columns)
+        names, counts = api.counter_columns(counters)
+        middle = api.brawler_page(names, counts, size // 2).last
+
+        full_us = timed(lambda: api.brawler_page(names, counts), iterations)
+        page_us = timed(lambda: api.brawler_page(names, counts, 5), iterations)
+        cursor_us = timed(lambda: api.brawler_page(names, counts, 5, after=middle), iterations)
+        print(f"{size:>10,}{full_us:>14.1f}{page_us:>15.1f}{cursor_us:>14.1f}{full_us / page_us:>7.1f}x")
+
+    seed_player(api.battle_store, "BENCH", days=365, per_day=20, brawlers=80)
+    print("-" * 72)
+    print(f"{'/brawlers без кэша':<22}{'байт':>8}{'мкс':>10}")
+    for title, path in PATHS:
+        status, _, body = await call_asgi(api.app, "GET", path)
+        assert status == 200
+        started = time.perf_counter()
+        for _ in range(args.iterations):
+            api.response_cache.lru.clear()
+            await call_asgi(api.app, "GET", path)
+        elapsed_us = (time.perf_counter() - started) / args.iterations * 1e6
+        print(f"{title:<22}{len(body):>8}{elapsed_us:>10.1f}")
+    print("=" * 72)
+
+    api.battle_store.close()
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
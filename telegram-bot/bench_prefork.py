@@ -0,0 +1,160 @@
+"""
+Бенчмарк масштабирования API по процессам (prefork.py)
+
+Для каждого числа воркеров из --workers запускает prefork.py на засеянном
+временном каталоге и нагружает его --clients процессами с генератором из
+bench_load.py (та же смесь маршрутов; синхронизация идёт через писателя в
+локальную заглушку Brawl Stars API). Итог по каждому варианту: запросы в
+секунду, ускорение относительно первого, p50/p99 и ошибки.
+
+Генераторы нагрузки работают на той же машине и делят ядра с воркерами,
+поэтому ускорение здесь — нижняя оценка. Для чистых цифр запускайте
+prefork.py на отдельной машине и bench_load.py --url против него.
+
+Запуск:
+    python bench_prefork.py --workers 1,2,4,8 --duration 10
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import shutil
+import signal
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+import aiohttp
+
+from bench_load import (
+    LoadGenerator, free_port, http_sender, parse_mix, seed_players, start_fake_brawl_api, wait_healthy
+)
+from benchutil import use_temp_data_dir
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except:
+        pass
+
+
+def default_workers() -> str:
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+    return ",".join(map(str, counts))
+
+
+def run_client(url: str, mix: str, players: List[str], brawlers: int, concurrency: int,
+               warmup: float, duration: float, seed: int) -> dict:
+    """Процесс-генератор: задержки и ошибки по маршрутам за duration секунд"""
+
+    async def main() -> dict:
+        async with aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=concurrency),
+            timeout=aiohttp.ClientTimeout(total=30)
+        ) as session:
+            generator = LoadGenerator(http_sender(session, url, {}), parse_mix(mix), players, brawlers, seed)
+            await generator.run(warmup, concurrency, record=False)
+            elapsed = await generator.run(duration, concurrency)
+        return {"elapsed": elapsed, "latencies": generator.latencies, "errors": generator.errors}
+
+    return asyncio.run(main())
+
+
+async def measure(args, workers: int, pool: ProcessPoolExecutor, players: List[str]) -> dict:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    process = subprocess.Popen(
+        [sys.executable, "prefork.py", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port)],
+        env=os.environ.copy(),
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL
+    )
+    try:
+        async with aiohttp.ClientSession() as session:
+            await wait_healthy(session, url, timeout=60)
+
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(
+                pool, run_client, url, args.mix, players, args.brawlers,
+                args.concurrency, args.warmup, args.duration, args.seed + i
+            )
+            for i in range(args.clients)
+        ))
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=30)
+
+    # Сводим задержки всех генераторов в один отчёт
+    merged = LoadGenerator(None, parse_mix(args.mix), players, args.brawlers, args.seed)
+    for result in results:
+        for name, latencies in result["latencies"].items():
+            merged.latencies[name].extend(latencies)
+            merged.errors[name] += result["errors"][name]
+    return merged.report(max(result["elapsed"] for result in results))["total"]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Масштабирование API по процессам")
+    parser.add_argument("--workers", default=default_workers(), help="числа воркеров через запятую")
+    parser.add_argument("--clients", type=int, default=2, help="процессов-генераторов нагрузки")
+    parser.add_argument("--concurrency", type=int, default=32, help="одновременных запросов на генератор")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--players", type=int, default=50)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--per-day", type=int, default=20)
+    parser.add_argument("--brawlers", type=int, default=40)
+    parser.add_argument("--mix", help="веса маршрутов, как в bench_load.py")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        print("prefork.py работает только на Linux/macOS")
+        sys.exit(1)
+
+    data_dir = use_temp_data_dir()
+    brawl_runner, brawl_url = await start_fake_brawl_api()
+    os.environ["BRAWL_STARS_API_URL"] = brawl_url
+    os.environ["BRAWL_STARS_RATE_LIMIT"] = "100000"
+    os.environ["BRAWL_STARS_BURST"] = "100000"
+
+    from storage import BattleStore
+
+    players = [f"LOAD{i}" for i in range(args.players)]
+    print(f"Засев: {args.players} игроков × {args.days * args.per_day} боёв...")
+    store = BattleStore(data_dir)
+    seed_players(store, players, args.days, args.per_day, args.brawlers)
+    store.close()
+
+    counts = [int(value) for value in args.workers.split(",")]
+    print(f"Ядер: {os.cpu_count()}, генераторов: {args.clients} × {args.concurrency}, {args.duration:.0f} с на вариант")
+    print("=" * 72)
+    print(f"{'воркеров':>9}{'rps':>12}{'ускорение':>12}{'p50, мс':>11}{'p99, мс':>11}{'ошибок':>9}")
+    print("-" * 72)
+
+    rows: Dict[int, dict] = {}
+    pool = ProcessPoolExecutor(args.clients, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        for workers in counts:
+            total = rows[workers] = await measure(args, workers, pool, players)
+            speedup = total["rps"] / rows[counts[0]]["rps"] if rows[counts[0]]["rps"] else 0.0
+            print(f"{workers:>9}{total['rps']:>12.1f}{speedup:>11.2f}×{total['p50']:>11.2f}"
+                  f"{total['p99']:>11.2f}{total['errors']:>9}")
+    finally:
+        pool.shutdown()
+        await brawl_runner.cleanup()
+        shutil.rmtree(data_dir, ignore_errors=True)
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""
+Бенчмарк роллапов истории винрейта
+
+Игрок с 80 бойцами и 365 днями боёв: время построения роллапа,
+запроса истории (расчёт + сериализация) по дням/неделям/месяцам
+и O(1) сумм за окно по всем бойцам.
+
+Запуск:
+    python bench_rollups.py --per-day 20
+"""
+
+import argparse
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+
+import orjson
+
+from benchutil import seed_player, use_temp_data_dir
+from game_data import BRAWLERS
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except:
+        pass
+
+DATA_DIR = use_temp_data_dir()
+
+import api  # noqa: E402
+from rollups import epoch_day  # noqa: E402
+
+
+def timed(func, iterations: int) -> float:
+    func()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк RollupStore")
+    parser.add_argument("--per-day", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args()
+
+    battles = seed_player(api.battle_store, "BENCH", days=365, per_day=args.per_day, brawlers=80)
+
+    started = time.perf_counter()
+    rollup = api.rollup_store.get("BENCH")
+    build_ms = (time.perf_counter() - started) * 1000
+
+    print("=" * 56)
+    print(f"Боёв: {battles:,}, бойцов: {len(rollup.rows)}, дней: {rollup.days}")
+    print(f"Построение роллапа:            {build_ms:8.1f} мс")
+
+    for granularity in ("day", "week", "month"):
+        compute_us = timed(lambda: api.compute_history("BENCH", "Shelly", 365, granularity), args.iterations)
+        total_us = timed(
+            lambda: orjson.dumps(api.compute_history("BENCH", "Shelly", 365, granularity)),
+            args.iterations
+        )
+        print(f"История 365д ({granularity:<5}): расчёт {compute_us:7.1f} мкс, с JSON {total_us:7.1f} мкс")
+
+    last_day = epoch_day(datetime.now(timezone.utc).date())
+    window_us = timed(
+        lambda: [rollup.window(brawler, last_day - 364, last_day) for brawler in BRAWLERS[:80]],
+        args.iterations // 10
+    )
+    window_all_us = timed(lambda: rollup.window_all(last_day - 364, last_day), args.iterations)
+    print(f"Суммы за 365д по 80 бойцам:    {window_us:8.1f} мкс поштучно, {window_all_us:.1f} мкс вектором")
+    print("=" * 56)
+
+    api.battle_store.close()
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
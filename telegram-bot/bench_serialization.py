@@ -0,0 +1,110 @@
+"""
+Бенчмарк сериализации ответов аналитики
+
+Сравнивает два пути на истории из 365 точек и полном списке бойцов:
+- pydantic: модели из расчёта, валидация и сериализация по response_model
+  силами FastAPI (serialize_response + JSONResponse), как было раньше;
+- orjson: dict по той же схеме, собранный из агрегатов, сразу в байты.
+Тела ответов сверяются.
+
+Запуск:
+    python bench_serialization.py --iterations 2000
+"""
+
+import argparse
+import asyncio
+import json
+import shutil
+import sys
+import time
+
+import orjson
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+from benchutil import seed_player, use_temp_data_dir
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except:
+        pass
+
+DATA_DIR = use_temp_data_dir()
+
+import api  # noqa: E402
+
+
+def response_field(path: str):
+    return next(route.response_field for route in api.app.routes if getattr(route, "path", None) == path)
+
+
+async def timed(func, iterations: int) -> float:
+    await func()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def compare(name: str, path: str, build_models, build_dict, iterations: int):
+    field = response_field(path)
+
+    async def pydantic_path() -> bytes:
+        content = await serialize_response(field=field, response_content=build_models())
+        return JSONResponse(content).body
+
+    async def orjson_path() -> bytes:
+        return orjson.dumps(build_dict())
+
+    assert json.loads(await pydantic_path()) == json.loads(await orjson_path()), name
+    slow = await timed(pydantic_path, iterations)
+    fast = await timed(orjson_path, iterations)
+    size = len(await orjson_path())
+    print(f"{name:<28} pydantic {slow:8.1f} мкс, orjson {fast:7.1f} мкс, x{slow / fast:4.1f} ({size:,} байт)")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк сериализации")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    seed_player(api.battle_store, "BENCH", days=365, per_day=20, brawlers=80)
+
+    def history_dict() -> dict:
+        return {
+            "player_id": "BENCH", "brawler": "Shelly", "days": 365, "granularity": "day",
+            "history": api.compute_history("BENCH", "Shelly", 365)
+        }
+
+    def history_models() -> api.BrawlerWinrateHistoryResponse:
+        data = history_dict()
+        data["history"] = [api.WinrateHistoryPoint(**point) for point in data["history"]]
+        return api.BrawlerWinrateHistoryResponse(**data)
+
+    def brawlers_dict() -> dict:
+        brawlers = api.compute_top_brawlers("BENCH").items
+        return {"player_id": "BENCH", "count": len(brawlers), "brawlers": brawlers, "next_cursor": None}
+
+    def brawlers_models() -> api.TopBrawlersResponse:
+        brawlers = [api.BrawlerStats(**item) for item in api.compute_top_brawlers("BENCH").items]
+        return api.TopBrawlersResponse(player_id="BENCH", count=len(brawlers), brawlers=brawlers)
+
+    print("=" * 78)
+    await compare(
+        "История 365 точек:", "/analytics/{player_id}/brawlers/{brawler}/winrate-history",
+        history_models, history_dict, args.iterations
+    )
+    await compare(
+        "Список бойцов (80):", "/analytics/{player_id}/brawlers",
+        brawlers_models, brawlers_dict, args.iterations
+    )
+    print("=" * 78)
+
+    api.battle_store.close()
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
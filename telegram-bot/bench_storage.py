@@ -0,0 +1,106 @@
+"""
+Бенчмарк хранилища боёв
+
+Заливает миллионы синтетических боёв в BattleStore во временном каталоге
+и измеряет скорость записи и задержку чтения боёв одного игрока.
+
+Запуск:
+    python bench_storage.py --battles 2000000 --players 20000
+"""
+
+import argparse
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from benchutil import percentile
+from storage import Battle, BattleStore
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except:
+        pass
+
+BRAWLERS = [
+    "Shelly", "Colt", "Bull", "Brock", "Rico", "Spike", "Crow", "Leon",
+    "Sandy", "Amber", "Edgar", "Mortis", "Poco", "Pam", "Frank", "Gene",
+]
+MAPS = [
+    ("gemGrab", "Hard Rock Mine"), ("gemGrab", "Crystal Arcade"),
+    ("brawlBall", "Backyard Bowl"), ("brawlBall", "Pinhole Punt"),
+    ("heist", "Safe Zone"), ("knockout", "Belle's Rock"),
+    ("soloShowdown", "Skull Creek"), ("bounty", "Shooting Star"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк BattleStore")
+    parser.add_argument("--battles", type=int, default=2_000_000)
+    parser.add_argument("--players", type=int, default=20_000)
+    parser.add_argument("--batch", type=int, default=25, help="боёв за одну синхронизацию (battlelog)")
+    parser.add_argument("--reads", type=int, default=2_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    path = tempfile.mkdtemp(prefix="bench-store-")
+    players = [f"#P{i:07d}" for i in range(args.players)]
+    clock = {player: 1_600_000_000 for player in players}
+
+    try:
+        store = BattleStore(path)
+
+        # Запись: раундами по battlelog на игрока, как при реальных синхронизациях
+        written = 0
+        started = time.perf_counter()
+        while written < args.battles:
+            for player in players:
+                batch = []
+                for _ in range(min(args.batch, args.battles - written - len(batch))):
+                    clock[player] += rng.randint(60, 900)
+                    mode, map_name = rng.choice(MAPS)
+                    batch.append(Battle(
+                        player, rng.choice(BRAWLERS), map_name, mode,
+                        "victory" if rng.random() < 0.52 else "defeat", clock[player]
+                    ))
+                written += len(store.append(player, batch))
+                if written >= args.battles:
+                    break
+        ingest_time = time.perf_counter() - started
+        store.close()
+
+        # Холодное открытие: загрузка индекса
+        started = time.perf_counter()
+        store = BattleStore(path)
+        open_time = time.perf_counter() - started
+
+        latencies = []
+        sizes = []
+        for player in rng.sample(players, min(args.reads, len(players))):
+            started = time.perf_counter()
+            battles = store.read_player(player)
+            latencies.append((time.perf_counter() - started) * 1000)
+            sizes.append(len(battles))
+        store.close()
+
+        print("=" * 50)
+        print(f"Боёв записано:     {written:,}")
+        print(f"Игроков:           {args.players:,}")
+        print(f"Запись:            {ingest_time:.2f} с ({written / ingest_time:,.0f} боёв/с)")
+        print(f"Открытие индекса:  {open_time * 1000:.1f} мс")
+        print(f"Боёв на игрока:    {statistics.mean(sizes):.0f}")
+        print(f"Чтение игрока p50: {percentile(latencies, 0.50):.3f} мс")
+        print(f"Чтение игрока p95: {percentile(latencies, 0.95):.3f} мс")
+        print(f"Чтение игрока p99: {percentile(latencies, 0.99):.3f} мс")
+        print("=" * 50)
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
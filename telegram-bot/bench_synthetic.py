@@ -0,0 +1,147 @@
+"""
+Бенчмарк генератора синтетических боёв (synthetic.py)
+
+Меряет:
+    генерация - боёв/с и МБ/с без записи на диск
+    запись    - генерация + BattleStore.append_blocks во временный каталог
+                против append() тех же боёв объектами Battle на части игроков
+    память    - пиковый RSS после записи набора и после открытия API
+    повтор    - хэш двух независимых прогонов с тем же seed (и блоков
+                в обратном порядке) должен совпасть
+    API       - догонка агрегатов при открытии хранилища и задержка
+                /analytics/{id}/brawlers на случайных игроках набора
+
+Запуск:
+    python bench_synthetic.py --players 200000 --days 90
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import shutil
+import sys
+import time
+
+from benchutil import call_asgi, percentile, use_temp_data_dir
+from storage import RECORD, Battle, BattleStore
+from synthetic import BattleGenerator, SyntheticConfig
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except:
+        pass
+
+
+def peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def dataset_hash(generator: BattleGenerator, reverse: bool = False) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    numbers = range(generator.blocks - 1, -1, -1) if reverse else range(generator.blocks)
+    parts = {}
+    for number in numbers:
+        player_ids, records, bounds = generator.block(number)
+        parts[number] = hashlib.blake2b(records.tobytes() + bounds.tobytes()).digest()
+    for number in sorted(parts):
+        digest.update(parts[number])
+    return digest.hexdigest()
+
+
+def directory_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path) for name in names
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк синтетических боёв")
+    parser.add_argument("--players", type=int, default=200_000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--append-players", type=int, default=2_000, help="игроков для сравнения с append()")
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    config = SyntheticConfig(players=args.players, days=args.days, seed=args.seed, end=1_767_225_600)
+    generator = BattleGenerator(config)
+
+    # Генерация без записи
+    battles = 0
+    started = time.perf_counter()
+    for _, records, _ in generator.iter_blocks():
+        battles += len(records)
+    generate_s = time.perf_counter() - started
+
+    # Детерминизм: два генератора, второй — блоки в обратном порядке
+    same = dataset_hash(BattleGenerator(config)) == dataset_hash(BattleGenerator(config), reverse=True)
+
+    data_dir = use_temp_data_dir()
+
+    try:
+        store = BattleStore(data_dir)
+        started = time.perf_counter()
+        written = generator.write(store)
+        write_s = time.perf_counter() - started
+        on_disk = directory_size(data_dir)
+        write_rss = peak_rss_mb()
+
+        # Те же бои через append(): объекты Battle, по вызову на игрока
+        sample = [generator.player_id(i) for i in range(min(args.append_players, args.players))]
+        sample_battles = {pid: store.read_player(pid) for pid in sample}
+        reference = BattleStore(data_dir + "-append")
+        started = time.perf_counter()
+        appended = 0
+        for pid, player_battles in sample_battles.items():
+            appended += len(reference.append(pid, [
+                Battle(b.player_id, b.brawler, b.map, b.mode, b.result, b.timestamp) for b in player_battles
+            ]))
+        append_s = time.perf_counter() - started
+        reference.close()
+        shutil.rmtree(data_dir + "-append", ignore_errors=True)
+        store.close()
+
+        # API поверх набора: догонка агрегатов при импорте и ответы по случайным игрокам
+        started = time.perf_counter()
+        import api
+        open_s = time.perf_counter() - started
+
+        rng = random.Random(args.seed)
+        latencies = []
+        for _ in range(args.requests):
+            pid = generator.player_id(rng.randrange(args.players))
+            api.response_cache.lru.clear()
+            request_started = time.perf_counter()
+            status, _, _ = await call_asgi(api.app, "GET", f"/analytics/{pid}/brawlers")
+            latencies.append((time.perf_counter() - request_started) * 1000)
+            assert status in (200, 404)
+        api.battle_store.close()
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    megabytes = battles * RECORD.size / 1e6
+    print("=" * 64)
+    print(f"Игроков: {args.players:,}, дней: {args.days}, боёв: {battles:,} ({battles / args.players:.0f} на игрока)")
+    print("-" * 64)
+    print(f"генерация:      {battles / generate_s:>12,.0f} боёв/с {megabytes / generate_s:>8.1f} МБ/с")
+    print(f"append_blocks:  {written / write_s:>12,.0f} боёв/с {megabytes / write_s:>8.1f} МБ/с"
+          f"  ({on_disk / 1e6:.0f} МБ на диске)")
+    print(f"append():       {appended / append_s:>12,.0f} боёв/с  ({len(sample)} игроков)")
+    print(f"пиковый RSS:    {write_rss:>12.0f} МБ после записи, {peak_rss_mb():.0f} МБ с API")
+    print(f"повтор:         {'совпадает' if same else 'РАСХОДИТСЯ'}")
+    print(f"открытие API:   {open_s:>12.1f} с (догонка агрегатов)")
+    print(f"/brawlers:      p50 {percentile(latencies, 0.5):.2f} мс, p99 {percentile(latencies, 0.99):.2f} мс")
+    print("=" * 64)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
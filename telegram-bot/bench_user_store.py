@@ -0,0 +1,112 @@
+"""
+Бенчмарк хранилища привязок user -> player
+
+- чтение: попадание в кэш против запроса к SQLite
+- запись: отложенная пакетная запись против коммита на каждый /player
+- перезапуск: все записи на месте, кэш прогрет
+
+Запуск:
+    python bench_user_store.py --users 20000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import aiosqlite
+
+from benchutil import percentile
+from user_store import SCHEMA, UserStore
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except:
+        pass
+
+
+async def naive_writes(path: str, writes: list) -> float:
+    """Как было бы без кэша: транзакция на каждую команду"""
+    async with aiosqlite.connect(path) as db:
+        await db.execute("PRAGMA journal_mode=WAL")
+        await db.execute("PRAGMA synchronous=NORMAL")
+        await db.execute(SCHEMA)
+        started = time.perf_counter()
+        for user_id, player_id in writes:
+            await db.execute(
+                "INSERT INTO users (user_id, player_id, updated_at) VALUES (?, ?, 0) "
+                "ON CONFLICT(user_id) DO UPDATE SET player_id = excluded.player_id",
+                (user_id, player_id)
+            )
+            await db.commit()
+        return time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк UserStore")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="bench-users-")
+    rng = random.Random(42)
+    # Часть пользователей меняет ID несколько раз подряд
+    writes = [(rng.randrange(args.users), f"#P{i}") for i in range(args.users)]
+    expected = dict(writes)
+
+    print("=" * 64)
+    naive = await naive_writes(os.path.join(directory, "naive.db"), writes)
+    print(f"Запись, коммит на команду:  {len(writes) / naive:9,.0f} записей/с")
+
+    path = os.path.join(directory, "users.db")
+    store = UserStore(path, cache_size=args.users, flush_interval=0.5)
+    await store.open()
+    started = time.perf_counter()
+    for user_id, player_id in writes:
+        store.set(user_id, player_id)
+    await store.flush()
+    elapsed = time.perf_counter() - started
+    print(f"Запись, write-behind:       {len(writes) / elapsed:9,.0f} записей/с "
+          f"({store.stats['flushes']} транзакций, {store.stats['flushed_rows']:,} строк)")
+
+    cached = []
+    for _ in range(args.lookups):
+        user_id = rng.randrange(args.users)
+        started = time.perf_counter()
+        await store.get(user_id)
+        cached.append((time.perf_counter() - started) * 1e6)
+    await store.close()
+
+    # Без прогрева: каждый первый запрос пользователя идёт в базу
+    cold = UserStore(path, cache_size=0)
+    await cold.open()
+    uncached = []
+    for _ in range(args.lookups // 10):
+        user_id = rng.randrange(args.users)
+        started = time.perf_counter()
+        await cold.get(user_id)
+        uncached.append((time.perf_counter() - started) * 1e6)
+    await cold.close()
+    print(f"Чтение из кэша:             p50 {percentile(cached, 0.5):7.1f} мкс, p99 {percentile(cached, 0.99):7.1f} мкс")
+    print(f"Чтение из SQLite:           p50 {percentile(uncached, 0.5):7.1f} мкс, p99 {percentile(uncached, 0.99):7.1f} мкс")
+
+    # Перезапуск: всё записано, кэш прогрет
+    reopened = UserStore(path, cache_size=args.users)
+    await reopened.open()
+    for user_id, player_id in expected.items():
+        assert await reopened.get(user_id) == player_id, user_id
+    print(f"После перезапуска:          {len(expected):,} привязок, промахов кэша {reopened.stats['misses']}")
+    await reopened.close()
+    print("=" * 64)
+
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,129 @@
+"""
+Бенчмарк проверки initData Mini App
+
+Меряет:
+    - прежнюю проверку (ключ из токена и разбор строки на каждый вызов)
+    - TelegramWebApp.validate без кэша и с кэшем проверенных initData
+    - запросы /analytics/{player_id}/brawlers через ASGI: с initData,
+      со служебным токеном бота и без проверки
+
+Запуск:
+    python bench_webapp_auth.py --iterations 20000
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import shutil
+import sys
+import time
+from urllib.parse import parse_qsl
+
+from benchutil import call_asgi, seed_player, use_temp_data_dir
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except:
+        pass
+
+os.environ["WEBAPP_AUTH_REQUIRED"] = "true"
+DATA_DIR = use_temp_data_dir()
+
+import api  # noqa: E402
+from telegram_webapp import TelegramWebApp, sign_init_data  # noqa: E402
+
+PATH = "/analytics/BENCH/brawlers"
+
+
+def legacy_verify(bot_token: str, init_data: str) -> bool:
+    """Проверка в прежнем виде"""
+    parsed_data = dict(parse_qsl(init_data))
+    if 'hash' not in parsed_data:
+        return False
+    received_hash = parsed_data.pop('hash')
+    data_check_string = '\n'.join(f'{k}={v}' for k, v in sorted(parsed_data.items()))
+    secret_key = hmac.new(b'WebAppData', bot_token.encode(), hashlib.sha256).digest()
+    calculated_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    return calculated_hash == received_hash
+
+
+def make_init_data(bot_token: str, user_id: int, auth_date: int) -> str:
+    return sign_init_data(bot_token, {
+        "query_id": f"AAH{user_id:010d}",
+        "user": json.dumps({"id": user_id, "first_name": "User", "username": f"user{user_id}",
+                            "language_code": "ru", "allows_write_to_pm": True}, separators=(",", ":")),
+        "auth_date": str(auth_date),
+    })
+
+
+def timed(func, iterations: int) -> float:
+    func()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def timed_requests(headers: dict, iterations: int) -> float:
+    await call_asgi(api.app, "GET", PATH, headers)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await call_asgi(api.app, "GET", PATH, headers)
+    return iterations / (time.perf_counter() - started)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк проверки initData")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    token = api.settings.BOT_TOKEN
+    now = int(time.time())
+    init_data = make_init_data(token, 123456789, now)
+    webapp = TelegramWebApp(token)
+
+    def uncached():
+        webapp._verified.clear()
+        webapp.validate(init_data)
+
+    print("=" * 60)
+    print(f"initData: {len(init_data)} байт")
+    print(f"прежняя проверка:        {timed(lambda: legacy_verify(token, init_data), args.iterations):8.2f} мкс")
+    print(f"validate без кэша:       {timed(uncached, args.iterations):8.2f} мкс")
+    print(f"validate из кэша:        {timed(lambda: webapp.validate(init_data), args.iterations):8.2f} мкс")
+
+    seed_player(api.battle_store, "BENCH", days=30, per_day=20, brawlers=40)
+    checks = [
+        ("без заголовков", {}, 401),
+        ("чужая подпись", {"Authorization": f"tma {make_init_data('1:other', 1, now)}"}, 403),
+        ("устаревший auth_date", {"Authorization": f"tma {make_init_data(token, 1, now - 2 * 86400)}"}, 403),
+        ("initData", {"Authorization": f"tma {init_data}"}, 200),
+        ("служебный токен", {"X-Service-Token": api.settings.service_token}, 200),
+    ]
+    for title, headers, expected in checks:
+        status, _, _ = await call_asgi(api.app, "GET", PATH, headers)
+        assert status == expected, f"{title}: {status} != {expected}"
+
+    requests = args.iterations // 4
+    with_init_data = await timed_requests({"Authorization": f"tma {init_data}"}, requests)
+    with_token = await timed_requests({"X-Service-Token": api.settings.service_token}, requests)
+    api.settings.WEBAPP_AUTH_REQUIRED = False
+    without_auth = await timed_requests({}, requests)
+    print(f"\n{PATH}, запросов/с (ответ из кэша):")
+    print(f"  без проверки:          {without_auth:8.0f}")
+    print(f"  служебный токен:       {with_token:8.0f}")
+    print(f"  initData:              {with_init_data:8.0f}")
+    print(f"  кэш initData: {api.telegram_webapp.stats}")
+    print("=" * 60)
+
+    api.battle_store.close()
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
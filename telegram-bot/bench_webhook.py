@@ -0,0 +1,149 @@
+"""
+Пропускная способность приёма апдейтов: webhook против polling
+
+Тысячи синтетических апдейтов (текстовые сообщения, на каждое бот
+отвечает одним sendMessage) доставляются боту через заглушку Telegram
+Bot API с задержкой ответа:
+    - polling: апдейты отдаются через getUpdates
+    - webhook: апдейты POST-ятся в WebhookReceiver, как это делает
+      Telegram (до --connections параллельных соединений, повтор на 503),
+      при разном числе воркеров
+
+Запуск:
+    python bench_webhook.py --updates 5000 --latency 0.02
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+# Без ежедневной рассылки и записи в рабочую базу
+os.environ.setdefault("BROADCAST_DAILY_AT", "")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except:
+        pass
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+
+from bot import dp  # noqa: E402
+from fake_telegram import create_app as create_telegram_app, make_update  # noqa: E402
+from webhook import SECRET_HEADER, WebhookReceiver  # noqa: E402
+
+SECRET = "bench-secret"
+
+
+async def start(app: web.Application) -> tuple:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+
+async def wait_sent(telegram: web.Application, count: int, timeout: float = 300):
+    deadline = time.perf_counter() + timeout
+    while len(telegram["sent"]) < count:
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f"отправлено {len(telegram['sent'])} из {count}")
+        await asyncio.sleep(0.01)
+
+
+async def bench_polling(bot: Bot, telegram: web.Application, updates: int) -> float:
+    telegram["sent"].clear()
+    for i in range(updates):
+        telegram["updates"].put_nowait(make_update(i + 1, 10_000 + i % 1000, "hello"))
+
+    started = time.perf_counter()
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False))
+    await wait_sent(telegram, updates)
+    elapsed = time.perf_counter() - started
+    await dp.stop_polling()
+    await polling
+    return elapsed
+
+
+async def bench_webhook(bot: Bot, telegram: web.Application, updates: int, workers: int,
+                        connections: int, queue_size: int) -> dict:
+    telegram["sent"].clear()
+    receiver = WebhookReceiver(dp, bot, SECRET, queue_size=queue_size, workers=workers)
+    runner, url = await start(receiver.create_app())
+    url += receiver.path
+
+    retries = 0
+    session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=connections))
+
+    async def deliver(i: int):
+        nonlocal retries
+        update = make_update(i + 1, 10_000 + i % 1000, "hello")
+        while True:
+            async with session.post(url, json=update, headers={SECRET_HEADER: SECRET}) as response:
+                if response.status == 200:
+                    return
+            # Telegram повторяет доставку, если webhook не ответил 200
+            retries += 1
+            await asyncio.sleep(0.2)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(deliver(i) for i in range(updates)))
+    accepted = time.perf_counter() - started
+    await wait_sent(telegram, updates)
+    processed = time.perf_counter() - started
+
+    async with session.post(url, json=make_update(0, 1, "hello"), headers={SECRET_HEADER: "wrong"}) as response:
+        assert response.status == 401
+
+    await session.close()
+    await runner.cleanup()
+    return {"accepted": accepted, "processed": processed, "retries": retries, "stats": receiver.stats}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк приёма апдейтов")
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка Bot API, с")
+    parser.add_argument("--connections", type=int, default=40, help="соединений Telegram к webhook")
+    parser.add_argument("--queue-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[8, 32, 64, 128])
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    telegram = create_telegram_app(latency=args.latency)
+    telegram_runner, telegram_url = await start(telegram)
+    bot = Bot("0:bench", session=AiohttpSession(api=TelegramAPIServer.from_base(telegram_url), limit=200))
+
+    print("=" * 72)
+    print(f"Апдейтов: {args.updates}, задержка Bot API {args.latency * 1000:.0f} мс")
+
+    elapsed = await bench_polling(bot, telegram, args.updates)
+    print(f"polling:            обработано за {elapsed:6.2f} с ({args.updates / elapsed:7.0f} апдейтов/с)")
+
+    for workers in args.workers:
+        result = await bench_webhook(bot, telegram, args.updates, workers, args.connections, args.queue_size)
+        print(
+            f"webhook x{workers:<3}:      принято за {result['accepted']:6.2f} с "
+            f"({args.updates / result['accepted']:7.0f}/с), обработано за {result['processed']:6.2f} с "
+            f"({args.updates / result['processed']:6.0f}/с), 503 -> повторов {result['retries']}"
+        )
+    print("=" * 72)
+
+    await bot.session.close()
+    await telegram_runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
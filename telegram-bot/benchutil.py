@@ -0,0 +1,96 @@
+"""
+Общие помощники для бенчмарков
+"""
+
+import asyncio
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import unquote
+
+from game_data import BRAWLERS, EVENTS
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def use_temp_data_dir() -> str:
+    """
+    Направить API в пустой временный каталог данных без Redis и проверки initData
+
+    Вызывать до импорта api.
+    """
+    path = tempfile.mkdtemp(prefix="bench-api-")
+    os.environ["DATA_DIR"] = path
+    os.environ["REDIS_ENABLED"] = "false"
+    os.environ.setdefault("WEBAPP_AUTH_REQUIRED", "false")
+    os.environ.setdefault("BOT_TOKEN", "0:bench")
+    return path
+
+
+def seed_player(store, player_id: str, days: int = 365, per_day: int = 20,
+                brawlers: int = 80, seed: int = 42,
+                events: Sequence[Tuple[str, str]] = EVENTS) -> int:
+    """Записать игроку per_day боёв в день за последние days дней"""
+    from storage import Battle
+
+    rng = random.Random(seed)
+    pool = BRAWLERS[:brawlers]
+    start = int(time.time()) - days * 86400
+    battles = []
+    for i in range(days * per_day):
+        mode, map_name = rng.choice(events)
+        battles.append(Battle(
+            player_id, rng.choice(pool), map_name, mode,
+            "victory" if rng.random() < 0.52 else "defeat",
+            start + i * 86400 // per_day
+        ))
+    return len(store.append(player_id, battles))
+
+
+async def call_asgi(app, method: str, path: str,
+                    headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], bytes]:
+    """Вызвать ASGI-приложение напрямую, без HTTP-клиента"""
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": unquote(path),
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 3000),
+    }
+    status = 0
+    response_headers: Dict[str, str] = {}
+    chunks: List[bytes] = []
+
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Клиент не отключается: как у сервера, receive() ждёт (StreamingResponse слушает disconnect)
+        await asyncio.Future()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers.update((k.decode(), v.decode()) for k, v in message.get("headers", []))
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, response_headers, b"".join(chunks)
@@ -1,13 +1,32 @@
 import asyncio
+import json
 import logging
-import aiohttp
-from aiogram import Bot, Dispatcher, F
+import math
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from aiogram import BaseMiddleware, Bot, Dispatcher, F
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.filters import Command, CommandStart
-from aiogram.types import Message, WebAppInfo, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import (
+    BufferedInputFile, Message, TelegramObject, WebAppInfo, InlineKeyboardMarkup, InlineKeyboardButton
+)
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
+from aiohttp import web
 
+from backend_client import BackendClient, BackendError, CircuitBreaker, CircuitOpenError
+from brawl_api import canonical_player_id
+from broadcast import Broadcaster, run_daily
+from charts import ChartCache, ChartRenderer
 from config import settings
+from metrics import CONTENT_TYPE, Registry
+from ratelimit import Cooldown
+from singleflight import SingleFlight
+from user_store import UserStore
+from webhook import run_webhook
 
 # Настройка логирования
 logging.basicConfig(
@@ -17,12 +36,166 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Инициализация бота и диспетчера
+telegram_session = None
+if settings.TELEGRAM_API_URL:
+    telegram_session = AiohttpSession(api=TelegramAPIServer.from_base(settings.TELEGRAM_API_URL))
+
 bot = Bot(
     token=settings.BOT_TOKEN,
+    session=telegram_session,
     default=DefaultBotProperties(parse_mode=ParseMode.HTML)
 )
 dp = Dispatcher()
 
+# Метрики бота для /metrics
+metrics_registry = Registry()
+handler_duration = metrics_registry.histogram(
+    "bot_handler_duration_seconds", "Время обработки апдейта хендлером", ("event", "handler", "result")
+)
+handlers_in_progress = metrics_registry.gauge(
+    "bot_handlers_in_progress", "Хендлеры, выполняющиеся сейчас", ("event",)
+)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Время работы хендлера по типу апдейта и имени хендлера
+
+    Регистрируется как внутренний middleware: вызывается только когда
+    фильтры выбрали хендлер, и data["handler"] уже известен.
+    """
+
+    def __init__(self, event_type: str):
+        self.event_type = event_type
+        self.in_progress = handlers_in_progress.labels(event_type)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        started = time.perf_counter()
+        result = "error"
+        self.in_progress.value += 1
+        try:
+            response = await handler(event, data)
+            result = "ok"
+            return response
+        finally:
+            self.in_progress.value -= 1
+            name = data["handler"].callback.__name__
+            handler_duration.labels(self.event_type, name, result).observe(time.perf_counter() - started)
+
+
+dp.message.middleware(HandlerMetricsMiddleware("message"))
+dp.callback_query.middleware(HandlerMetricsMiddleware("callback_query"))
+
+# Клиент API аналитики: одна сессия на всё время работы бота
+backend = BackendClient(
+    settings.API_BASE_URL,
+    timeout=settings.BACKEND_TIMEOUT,
+    max_connections=settings.BACKEND_MAX_CONNECTIONS,
+    max_retries=settings.BACKEND_MAX_RETRIES,
+    failure_threshold=settings.BACKEND_FAILURE_THRESHOLD,
+    reset_timeout=settings.BACKEND_RESET_TIMEOUT,
+    service_token=settings.service_token
+)
+metrics_registry.callback(
+    "bot_backend_events", "Запросы бота к API: requests, retries, errors, rejected", "counter",
+    lambda: [((event,), value) for event, value in backend.stats.items()],
+    ("event",)
+)
+metrics_registry.callback(
+    "bot_backend_circuit_open", "Circuit breaker клиента API разомкнут (1) или нет (0)", "gauge",
+    lambda: [((), int(backend.breaker.state == CircuitBreaker.OPEN))]
+)
+
+# Player ID пользователей: SQLite + кэш в памяти
+user_store = UserStore(
+    settings.DATABASE_URL,
+    cache_size=settings.USER_CACHE_SIZE,
+    flush_interval=settings.USER_FLUSH_INTERVAL,
+    flush_batch=settings.USER_FLUSH_BATCH
+)
+
+# Не чаще одной синхронизации в SYNC_COOLDOWN секунд на пользователя
+sync_cooldown = Cooldown(settings.SYNC_COOLDOWN)
+
+# Графики: рендер в отдельных процессах, готовые PNG и file_id — в кэше
+chart_renderer = ChartRenderer(settings.CHART_PROCESSES)
+chart_cache = ChartCache(settings.CHART_CACHE_DIR)
+chart_flight = SingleFlight()
+
+
+async def render_daily_summary(chat_id: int, player_id: str) -> Optional[str]:
+    """Текст ежедневной сводки: винрейт по бойцам за вчера (None — боёв не было)"""
+    try:
+        data = await backend.get_daily_summary(player_id)
+    except BackendError as e:
+        if e.status == 404:
+            return None
+        raise
+    if not data["matches"]:
+        return None
+
+    lines = [
+        f"• {item['brawler']} — {item['wins']}/{item['matches']} ({item['win_rate'] * 100:.0f}%)"
+        for item in data["brawlers"][:10]
+    ]
+    return (
+        f"📊 <b>Итоги за {data['date']}</b>\n\n"
+        f"Боёв: {data['matches']}, побед: {data['wins']} ({data['win_rate'] * 100:.1f}%)\n\n"
+        + "\n".join(lines)
+    )
+
+
+# Рассылки: очередь в SQLite, лимиты Telegram
+broadcaster = Broadcaster(
+    bot,
+    settings.DATABASE_URL,
+    render_daily_summary,
+    rate=settings.BROADCAST_RATE,
+    chat_interval=settings.BROADCAST_CHAT_INTERVAL,
+    workers=settings.BROADCAST_WORKERS,
+    batch=settings.BROADCAST_BATCH
+)
+daily_task: Optional[asyncio.Task] = None
+
+# Команды рассылки доступны только ADMIN_IDS
+admin_only = F.from_user.id.in_(settings.admin_ids_list)
+
+
+@dp.startup()
+async def on_startup():
+    global daily_task
+    await user_store.open()
+    await broadcaster.open()
+    if settings.BROADCAST_DAILY_AT:
+        daily_task = asyncio.create_task(run_daily(
+            settings.BROADCAST_DAILY_AT, lambda day: start_daily_summary(f"daily-{day}")
+        ))
+
+
+@dp.shutdown()
+async def on_shutdown():
+    if daily_task is not None:
+        daily_task.cancel()
+    await broadcaster.close()
+    await user_store.close()
+
+
+async def start_daily_summary(name: str, created_by: Optional[int] = None) -> Optional[int]:
+    """Рассылка сводки всем пользователям с Player ID; None — рассылка name уже есть"""
+    # Привязки пишутся в базу с задержкой — сбросить, чтобы попали все
+    await user_store.flush()
+    return await broadcaster.create(name, created_by)
+
+
+async def resolve_player_id(user_id: int) -> str:
+    """Player ID пользователя, а если он его не задал — ID по умолчанию"""
+    return await user_store.get(user_id) or settings.DEFAULT_PLAYER_ID
+
 
 # Клавиатура с мини-приложением
 def get_webapp_keyboard() -> InlineKeyboardMarkup:
@@ -96,6 +269,7 @@ async def cmd_help(message: Message):
 /start - Главное меню
 /analytics - Открыть аналитику
 /sync - Синхронизировать данные
+/chart - График винрейта бойца
 /player - Установить ID игрока
 /help - Эта справка
 
@@ -118,30 +292,42 @@ async def cmd_help(message: Message):
 @dp.message(Command("sync"))
 async def cmd_sync(message: Message):
     """Синхронизация данных"""
-    player_id = settings.DEFAULT_PLAYER_ID
+    remaining = sync_cooldown.hit(message.from_user.id)
+    if remaining:
+        await message.answer(f"⏳ Данные уже обновлялись, повторите через {math.ceil(remaining)} сек.")
+        return
+    await sync_player_data(message, message.from_user.id)
+
+
+async def sync_player_data(message: Message, user_id: int):
+    """Синхронизировать игрока пользователя user_id и ответить в чат message"""
+    player_id = await resolve_player_id(user_id)
     
     await message.answer("🔄 Синхронизация данных...")
     
     try:
         # Вызов API для синхронизации
-        async with aiohttp.ClientSession() as session:
-            url = f"{settings.API_BASE_URL}/admin/sync/{player_id}"
-            async with session.post(url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    await message.answer(
-                        f"✅ <b>Данные обновлены!</b>\n\n"
-                        f"Player ID: <code>{data.get('player_id', player_id)}</code>\n"
-                        f"Последний матч: {data.get('last_match_time', 'Неизвестно')}\n\n"
-                        f"Откройте аналитику, чтобы увидеть последние результаты.",
-                        reply_markup=get_webapp_keyboard()
-                    )
-                else:
-                    await message.answer(
-                        "⚠️ <b>Ошибка синхронизации</b>\n\n"
-                        "Попробуйте позже или проверьте настройки.",
-                        reply_markup=get_webapp_keyboard()
-                    )
+        data = await backend.sync_player(player_id)
+        await message.answer(
+            f"✅ <b>Данные обновлены!</b>\n\n"
+            f"Player ID: <code>{data.get('player_id', player_id)}</code>\n"
+            f"Последний матч: {data.get('last_match_time', 'Неизвестно')}\n\n"
+            f"Откройте аналитику, чтобы увидеть последние результаты.",
+            reply_markup=get_webapp_keyboard()
+        )
+    except CircuitOpenError as e:
+        await message.answer(
+            "⏳ <b>Сервис аналитики временно недоступен</b>\n\n"
+            f"Попробуйте через {max(1, round(e.retry_after))} сек.",
+            reply_markup=get_webapp_keyboard()
+        )
+    except BackendError as e:
+        logger.warning(f"Ошибка синхронизации: {e}")
+        await message.answer(
+            "⚠️ <b>Ошибка синхронизации</b>\n\n"
+            "Попробуйте позже или проверьте настройки.",
+            reply_markup=get_webapp_keyboard()
+        )
     except Exception as e:
         logger.error(f"Ошибка синхронизации: {e}")
         await message.answer(
@@ -167,11 +353,10 @@ async def cmd_player(message: Message):
         )
         return
     
-    player_id = args[1].strip()
+    player_id = canonical_player_id(args[1])
     user_id = message.from_user.id
     
-    # TODO: Сохранить player_id в базу данных
-    # await db.save_player_id(user_id, player_id)
+    user_store.set(user_id, player_id)
     
     await message.answer(
         f"✅ <b>Player ID сохранен!</b>\n\n"
@@ -181,11 +366,182 @@ async def cmd_player(message: Message):
     )
 
 
+async def load_chart(
+    player_id: str,
+    brawler: str,
+    days: int,
+    conditional: bool = True
+) -> Tuple[Optional[str], Optional[List[dict]]]:
+    """
+    Ключ картинки и история бойца; история None, если картинка уже есть
+
+    Известный ETag уходит в If-None-Match: при 304 история не передаётся
+    и не разбирается. Ключ None — боёв за период нет.
+    """
+    query = (player_id, brawler, days)
+    known = chart_cache.etag(query) if conditional else None
+    body = None
+    if known is not None:
+        body, etag = await backend.get_history(player_id, brawler, days, known[0])
+        key = known[1]
+        if body is None and (chart_cache.file_id(key) or chart_cache.has_png(key)):
+            chart_cache.stats["not_modified"] += 1
+            return key, None
+    if body is None:
+        body, etag = await backend.get_history(player_id, brawler, days)
+
+    history = json.loads(body)["history"]
+    if not any(point["matches"] for point in history):
+        return None, None
+    key = ChartCache.key(brawler, days, body)
+    if etag:
+        chart_cache.set_etag(query, etag, key)
+    return key, history
+
+
+async def upload_chart(message: Message, key: str, brawler: str, days: int,
+                       history: Optional[List[dict]], caption: str):
+    """
+    Отрендерить (или взять PNG с диска) и загрузить картинку в чат
+
+    Одновременные запросы одного графика ждут первую загрузку и
+    отправляют полученный file_id, а не рендерят и грузят картинку сами.
+    """
+    uploaded_here = False
+
+    async def upload() -> str:
+        nonlocal uploaded_here
+        png = chart_cache.png(key)
+        if png is None:
+            png = await chart_renderer.render(brawler, days, history)
+            chart_cache.put_png(key, png)
+            chart_cache.stats["renders"] += 1
+        else:
+            chart_cache.stats["png_hits"] += 1
+        sent = await message.answer_photo(BufferedInputFile(png, f"{key}.png"), caption=caption)
+        uploaded_here = True
+        file_id = sent.photo[-1].file_id
+        chart_cache.set_file_id(key, file_id)
+        return file_id
+
+    file_id = await chart_flight.do(key, upload)
+    if not uploaded_here:
+        await message.answer_photo(file_id, caption=caption)
+        chart_cache.stats["file_id_hits"] += 1
+
+
+@dp.message(Command("chart"))
+async def cmd_chart(message: Message):
+    """График винрейта бойца: /chart <боец> [дней]"""
+    args = message.text.split()[1:]
+    days = 30
+    if len(args) > 1 and args[-1].isdigit():
+        days = min(max(int(args.pop()), 1), 365)
+    if not args:
+        await message.answer(
+            "❌ <b>Укажите бойца</b>\n\n"
+            "Пример: <code>/chart Shelly</code> или <code>/chart El Primo 14</code>"
+        )
+        return
+
+    brawler = " ".join(args).title()
+    player_id = await resolve_player_id(message.from_user.id)
+    caption = f"📈 <b>{brawler}</b>: винрейт за {days} дн."
+
+    try:
+        key, history = await load_chart(player_id, brawler, days)
+        if key is None:
+            await message.answer(f"📭 Нет боёв на <b>{brawler}</b> за последние {days} дн.")
+            return
+
+        # Картинка уже загружалась — Telegram отдаёт её по file_id
+        file_id = chart_cache.file_id(key)
+        if file_id is not None:
+            try:
+                await message.answer_photo(file_id, caption=caption)
+                chart_cache.stats["file_id_hits"] += 1
+                return
+            except TelegramBadRequest as e:
+                logger.warning(f"file_id графика недействителен, загружаем заново: {e}")
+                if history is None and not chart_cache.has_png(key):
+                    key, history = await load_chart(player_id, brawler, days, conditional=False)
+
+        await upload_chart(message, key, brawler, days, history, caption)
+    except CircuitOpenError as e:
+        await message.answer(
+            "⏳ <b>Сервис аналитики временно недоступен</b>\n\n"
+            f"Попробуйте через {max(1, round(e.retry_after))} сек."
+        )
+    except BackendError as e:
+        if e.status == 404:
+            await message.answer(
+                f"❌ Игрок <code>{player_id}</code> не найден. Сначала выполните /sync"
+            )
+            return
+        logger.warning(f"Ошибка получения истории: {e}")
+        await message.answer("⚠️ <b>Не удалось получить историю</b>\n\nПопробуйте позже.")
+    except Exception as e:
+        logger.error(f"Ошибка построения графика: {e}")
+        await message.answer("❌ <b>Не удалось построить график</b>\n\nПопробуйте снова.")
+
+
+def format_progress(progress: dict) -> str:
+    counts = progress["counts"]
+    queued = counts.get("pending", 0) + counts.get("sending", 0)
+    return (
+        f"📣 <b>Рассылка #{progress['id']}</b> ({progress['name']})\n\n"
+        f"Статус: {progress['status']}\n"
+        f"Отправлено: {counts.get('sent', 0)} из {progress['total']}\n"
+        f"В очереди: {queued}\n"
+        f"Пропущено (нет боёв): {counts.get('skipped', 0)}\n"
+        f"Ошибок: {counts.get('failed', 0)}, неизвестно: {counts.get('unknown', 0)}"
+    )
+
+
+def broadcast_id_arg(message: Message) -> Optional[int]:
+    args = message.text.split()[1:]
+    return int(args[0]) if args and args[0].isdigit() else None
+
+
+@dp.message(Command("broadcast"), admin_only)
+async def cmd_broadcast(message: Message):
+    """Запустить рассылку сводки за вчера"""
+    name = f"manual-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}"
+    broadcast_id = await start_daily_summary(name, message.from_user.id)
+    if broadcast_id is None:
+        await message.answer("⏳ Рассылка уже запущена, проверьте /broadcast_status")
+        return
+    await message.answer(format_progress(await broadcaster.progress(broadcast_id)))
+
+
+@dp.message(Command("broadcast_status"), admin_only)
+async def cmd_broadcast_status(message: Message):
+    """Прогресс рассылки: /broadcast_status [id], по умолчанию последней"""
+    progress = await broadcaster.progress(broadcast_id_arg(message))
+    await message.answer(format_progress(progress) if progress else "📭 Рассылок ещё не было")
+
+
+@dp.message(Command("broadcast_cancel"), admin_only)
+async def cmd_broadcast_cancel(message: Message):
+    """Остановить рассылку: /broadcast_cancel [id], по умолчанию последнюю"""
+    progress = await broadcaster.progress(broadcast_id_arg(message))
+    if progress is None or not await broadcaster.cancel(progress["id"]):
+        await message.answer("❌ Нет активной рассылки с таким номером")
+        return
+    await message.answer(format_progress(await broadcaster.progress(progress["id"])))
+
+
 @dp.callback_query(F.data == "sync_data")
 async def callback_sync(callback):
     """Обработчик кнопки синхронизации"""
+    remaining = sync_cooldown.hit(callback.from_user.id)
+    if remaining:
+        # Повторные нажатия гасим всплывающим уведомлением, без сообщений в чат
+        await callback.answer(f"⏳ Повторите через {math.ceil(remaining)} сек.")
+        return
     await callback.answer("🔄 Синхронизация...")
-    await cmd_sync(callback.message)
+    # callback.message отправлено ботом, пользователь — callback.from_user
+    await sync_player_data(callback.message, callback.from_user.id)
 
 
 @dp.callback_query(F.data == "help")
@@ -205,19 +561,68 @@ async def echo_message(message: Message):
     )
 
 
+async def start_metrics_server() -> Optional[web.AppRunner]:
+    """Отдельный HTTP-сервер с /metrics на BOT_METRICS_HOST:BOT_METRICS_PORT"""
+    if not settings.BOT_METRICS_PORT:
+        return None
+
+    async def handle(_: web.Request) -> web.Response:
+        return web.Response(body=metrics_registry.render(), headers={"Content-Type": CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, settings.BOT_METRICS_HOST, settings.BOT_METRICS_PORT).start()
+    logger.info(f"Метрики: http://{settings.BOT_METRICS_HOST}:{settings.BOT_METRICS_PORT}/metrics")
+    return runner
+
+
+async def run_polling():
+    # Удаляем webhook на случай если он был установлен
+    await bot.delete_webhook(drop_pending_updates=True)
+
+    # Запускаем polling
+    await dp.start_polling(bot, close_bot_session=False)
+
+
 async def main():
     """Запуск бота"""
-    logger.info("Запуск бота...")
+    logger.info(f"Запуск бота ({settings.BOT_MODE})...")
+    metrics_runner = await start_metrics_server()
     
     try:
-        # Удаляем webhook на случай если он был установлен
-        await bot.delete_webhook(drop_pending_updates=True)
-        
-        # Запускаем polling
-        await dp.start_polling(bot)
+        if settings.BOT_MODE == "webhook":
+            try:
+                await run_webhook(
+                    dp,
+                    bot,
+                    url=settings.WEBHOOK_URL,
+                    host=settings.WEBHOOK_HOST,
+                    port=settings.WEBHOOK_PORT,
+                    secret_token=settings.WEBHOOK_SECRET,
+                    path=settings.WEBHOOK_PATH,
+                    queue_size=settings.WEBHOOK_QUEUE_SIZE,
+                    workers=settings.WEBHOOK_WORKERS,
+                    max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+                    metrics=metrics_registry
+                )
+            except Exception as e:
+                # Без явного WEBHOOK_FALLBACK_POLLING бот не работает в другом режиме, чем настроен
+                if not settings.WEBHOOK_FALLBACK_POLLING:
+                    raise
+                logger.error(f"Webhook недоступен, переключаемся на polling (WEBHOOK_FALLBACK_POLLING): {e}")
+                await run_polling()
+        else:
+            await run_polling()
     except Exception as e:
-        logger.error(f"Ошибка при запуске бота: {e}")
+        logger.exception(f"Ошибка при запуске бота: {e}")
+        raise
     finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await backend.close()
+        chart_renderer.close()
         await bot.session.close()
 
 
@@ -0,0 +1,239 @@
+"""
+Клиент официального Brawl Stars API
+
+Одна aiohttp-сессия с пулом keep-alive соединений на всё приложение,
+token bucket по бюджету ключа, повторы с экспоненциальной задержкой
+на 429 и временных ошибках, ограничение параллельных соединений на хост.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+
+import aiohttp
+
+from ratelimit import TokenBucket
+from storage import Battle
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Места в шоудауне, которые считаются победой
+SHOWDOWN_WIN_RANK = {"soloShowdown": 4, "duoShowdown": 2, "trioShowdown": 2}
+
+
+class BrawlStarsAPIError(Exception):
+    """Ошибка ответа Brawl Stars API"""
+
+    def __init__(self, status: int, reason: str = "", message: str = ""):
+        self.status = status
+        self.reason = reason
+        super().__init__(f"{status} {reason}: {message}".strip(": "))
+
+
+def canonical_player_id(player_id: str) -> str:
+    """
+    Player ID в хранилище, ключах кэша и single-flight: ABC123
+
+    "#abc123", "ABC123" и " abc123" — один игрок; приводится на границах
+    (путь API, /player в боте, ответ battlelog), дальше id не меняется.
+    """
+    return player_id.strip().lstrip("#").upper()
+
+
+def normalize_tag(player_id: str) -> str:
+    """Тег игрока в формате API: #ABC123"""
+    return "#" + canonical_player_id(player_id)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After в секундах: число секунд или HTTP-дата; None, если не разобрать"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_battle_time(value: str) -> int:
+    """20240115T183512.000Z -> unix timestamp"""
+    return int(
+        datetime.strptime(value, "%Y%m%dT%H%M%S.%fZ")
+        .replace(tzinfo=timezone.utc)
+        .timestamp()
+    )
+
+
+def _find_brawler(battle: Dict[str, Any], tag: str) -> Optional[str]:
+    participants = []
+    for team in battle.get("teams") or []:
+        participants.extend(team)
+    participants.extend(battle.get("players") or [])
+
+    for participant in participants:
+        if participant.get("tag", "").upper() != tag:
+            continue
+        brawler = participant.get("brawler") or (participant.get("brawlers") or [None])[0]
+        if brawler and brawler.get("name"):
+            return brawler["name"].title()
+    return None
+
+
+def _battle_result(mode: str, battle: Dict[str, Any]) -> Optional[str]:
+    result = battle.get("result")
+    if result in ("victory", "defeat", "draw"):
+        return result
+
+    rank = battle.get("rank")
+    if rank is not None:
+        return "victory" if rank <= SHOWDOWN_WIN_RANK.get(mode, 4) else "defeat"
+    return None
+
+
+def parse_battlelog(player_id: str, items: List[Dict[str, Any]]) -> List[Battle]:
+    """
+    Преобразовать ответ /players/{tag}/battlelog в записи хранилища
+
+    Бои, где не удалось определить бойца игрока или результат, пропускаются.
+    """
+    player_id = canonical_player_id(player_id)
+    tag = normalize_tag(player_id)
+    battles = []
+
+    for item in items:
+        event = item.get("event") or {}
+        battle = item.get("battle") or {}
+        mode = event.get("mode") or battle.get("mode") or "unknown"
+
+        brawler = _find_brawler(battle, tag)
+        result = _battle_result(mode, battle)
+        if brawler is None or result is None:
+            continue
+
+        battles.append(Battle(
+            player_id=player_id,
+            brawler=brawler,
+            map=event.get("map") or "Unknown",
+            mode=mode,
+            result=result,
+            timestamp=parse_battle_time(item["battleTime"])
+        ))
+
+    return battles
+
+
+class BrawlStarsClient:
+    """Асинхронный клиент Brawl Stars API"""
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = "https://api.brawlstars.com/v1",
+        rate: float = 5.0,
+        burst: int = 10,
+        max_connections: int = 10,
+        timeout: float = 10.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 10.0
+    ):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.max_connections = max_connections
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.bucket = TokenBucket(rate, burst)
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "errors": 0}
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections,
+                keepalive_timeout=60,
+                ttl_dns_cache=300
+            )
+            headers = {"Accept": "application/json"}
+            if self.api_key:
+                headers["Authorization"] = f"Bearer {self.api_key}"
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers=headers
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        # Full jitter: параллельные повторы не бьют в API одновременно
+        return random.uniform(0, delay)
+
+    async def request(self, path: str) -> Any:
+        url = f"{self.base_url}{path}"
+
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            self.stats["requests"] += 1
+
+            try:
+                async with self.session.get(url) as response:
+                    if response.status == 200:
+                        return await response.json()
+
+                    try:
+                        body = await response.json(content_type=None)
+                    except ValueError:
+                        body = None
+                    body = body if isinstance(body, dict) else {}
+                    error = BrawlStarsAPIError(response.status, body.get("reason", ""), body.get("message", ""))
+
+                    if response.status not in RETRY_STATUSES:
+                        raise error
+
+                    if response.status == 429:
+                        self.stats["throttled"] += 1
+                        retry_after = parse_retry_after(response.headers.get("Retry-After")) or self._backoff(attempt)
+                        # Притормаживаем всех, кто ждёт токен, а не только этот запрос
+                        self.bucket.pause(retry_after)
+                        delay = 0.0
+                    else:
+                        delay = self._backoff(attempt)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+                delay = self._backoff(attempt)
+
+            if attempt == self.max_retries:
+                self.stats["errors"] += 1
+                raise error
+
+            self.stats["retries"] += 1
+            logger.warning(f"Brawl Stars API {path}: {error}, повтор #{attempt + 1}")
+            if delay:
+                await asyncio.sleep(delay)
+
+    async def get_player(self, player_id: str) -> Dict[str, Any]:
+        return await self.request(f"/players/{quote(normalize_tag(player_id))}")
+
+    async def get_battlelog(self, player_id: str) -> List[Battle]:
+        data = await self.request(f"/players/{quote(normalize_tag(player_id))}/battlelog")
+        return parse_battlelog(player_id, data.get("items", []))
@@ -0,0 +1,345 @@
+"""
+Рассылки пользователям бота
+
+Очередь рассылки хранится в SQLite (та же база, что и привязки игроков):
+строка на получателя, статус pending -> sending -> sent / failed / skipped.
+Отправитель забирает получателей пачками и помечает пачку sending одной
+транзакцией до отправки, а результаты записывает после.
+
+Лимиты Telegram:
+- общий — token bucket на rate сообщений в секунду; 429 с retry_after
+  приостанавливает его целиком, и сообщение отправляется повторно
+- на чат — не чаще одного сообщения в chat_interval секунд
+
+Повторной отправки не бывает: если процесс упал посреди пачки, её строки
+в статусе sending после перезапуска становятся unknown и не отправляются
+снова (сообщение могло уйти). Так же — при сетевой ошибке во время
+отправки. Потерять можно не больше одной пачки, продублировать — ничего.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import aiosqlite
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+from ratelimit import Cooldown, TokenBucket
+from user_store import sqlite_path
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+SKIPPED = "skipped"
+UNKNOWN = "unknown"
+
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS broadcasts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        created_by INTEGER,
+        created_at INTEGER NOT NULL,
+        finished_at INTEGER,
+        status TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS broadcast_messages (
+        broadcast_id INTEGER NOT NULL,
+        chat_id INTEGER NOT NULL,
+        player_id TEXT NOT NULL,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        PRIMARY KEY (broadcast_id, chat_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS broadcast_messages_status ON broadcast_messages (broadcast_id, status)",
+)
+
+# Пауза, если ни одно сообщение пачки не удалось подготовить (например, API недоступно)
+RETRY_DELAY = 5.0
+
+# (chat_id, player_id) -> текст сообщения или None, если отправлять нечего
+Render = Callable[[int, str], Awaitable[Optional[str]]]
+
+
+class Broadcaster:
+    """Постоянная очередь рассылок с лимитами Telegram"""
+
+    def __init__(
+        self,
+        bot: Bot,
+        database_url: str,
+        render: Render,
+        rate: float = 25.0,
+        chat_interval: float = 1.0,
+        workers: int = 16,
+        batch: int = 100,
+        max_attempts: int = 3
+    ):
+        self.bot = bot
+        self.path = sqlite_path(database_url)
+        self.render = render
+        self.workers = workers
+        self.batch = batch
+        self.max_attempts = max_attempts
+        self.bucket = TokenBucket(rate, max(1.0, rate / 10))
+        self._chats = Cooldown(chat_interval)
+        self._db: Optional[aiosqlite.Connection] = None
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._runner: Optional[asyncio.Task] = None
+        self.stats = {"sent": 0, "failed": 0, "skipped": 0, "retry_after": 0, "unknown": 0, "batches": 0}
+
+    async def open(self):
+        self._db = await aiosqlite.connect(self.path)
+        await self._db.execute("PRAGMA journal_mode=WAL")
+        await self._db.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            await self._db.execute(statement)
+
+        # Пачка, которую отправляли при падении: не повторяем
+        cursor = await self._db.execute(
+            "UPDATE broadcast_messages SET status = ? WHERE status = ?", (UNKNOWN, SENDING)
+        )
+        if cursor.rowcount:
+            logger.warning(f"Рассылка: {cursor.rowcount} сообщений с неизвестным статусом после перезапуска")
+        await self._db.commit()
+
+        self._stopping = False
+        self._runner = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Дождаться текущей пачки и остановиться; остаток отправится после запуска"""
+        if self._runner is not None:
+            self._stopping = True
+            self._wake.set()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    async def create(
+        self,
+        name: str,
+        created_by: Optional[int] = None,
+        recipients: Optional[Iterable[Tuple[int, str]]] = None
+    ) -> Optional[int]:
+        """
+        Поставить рассылку в очередь
+
+        recipients — пары (chat_id, player_id); по умолчанию все пользователи
+        с привязанным Player ID (таблица users). Имя уникально: для уже
+        существующей рассылки возвращается None, поэтому ежедневная сводка
+        не создаётся дважды за день.
+        """
+        async with self._lock:
+            try:
+                cursor = await self._db.execute(
+                    "INSERT INTO broadcasts (name, created_by, created_at, status) VALUES (?, ?, ?, ?)",
+                    (name, created_by, int(time.time()), RUNNING)
+                )
+            except aiosqlite.IntegrityError:
+                return None
+            broadcast_id = cursor.lastrowid
+            try:
+                if recipients is None:
+                    await self._db.execute(
+                        "INSERT INTO broadcast_messages (broadcast_id, chat_id, player_id, status) "
+                        "SELECT ?, user_id, player_id, ? FROM users",
+                        (broadcast_id, PENDING)
+                    )
+                else:
+                    await self._db.executemany(
+                        "INSERT OR IGNORE INTO broadcast_messages (broadcast_id, chat_id, player_id, status) "
+                        "VALUES (?, ?, ?, ?)",
+                        ((broadcast_id, chat_id, player_id, PENDING) for chat_id, player_id in recipients)
+                    )
+                await self._db.commit()
+            except Exception:
+                await self._db.rollback()
+                raise
+        self._wake.set()
+        return broadcast_id
+
+    async def cancel(self, broadcast_id: int) -> bool:
+        """Остановить рассылку: текущая пачка дойдёт, остальные останутся pending"""
+        async with self._lock:
+            cursor = await self._db.execute(
+                "UPDATE broadcasts SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, int(time.time()), broadcast_id, RUNNING)
+            )
+            await self._db.commit()
+        return cursor.rowcount > 0
+
+    async def progress(self, broadcast_id: Optional[int] = None) -> Optional[dict]:
+        """Состояние рассылки (по умолчанию — последней): статус и счётчики получателей"""
+        query = "SELECT id, name, status, created_at, finished_at FROM broadcasts "
+        if broadcast_id is None:
+            cursor = await self._db.execute(query + "ORDER BY id DESC LIMIT 1")
+        else:
+            cursor = await self._db.execute(query + "WHERE id = ?", (broadcast_id,))
+        row = await cursor.fetchone()
+        if row is None:
+            return None
+
+        counts: Dict[str, int] = {}
+        async with self._db.execute(
+            "SELECT status, COUNT(*) FROM broadcast_messages WHERE broadcast_id = ? GROUP BY status", (row[0],)
+        ) as cursor:
+            async for status, count in cursor:
+                counts[status] = count
+        return {
+            "id": row[0],
+            "name": row[1],
+            "status": row[2],
+            "created_at": row[3],
+            "finished_at": row[4],
+            "total": sum(counts.values()),
+            "counts": counts,
+        }
+
+    async def _claim(self) -> Tuple[Optional[int], List[Tuple[int, str, int]]]:
+        """Следующая пачка самой старой активной рассылки, помеченная sending"""
+        async with self._lock:
+            cursor = await self._db.execute(
+                "SELECT id FROM broadcasts WHERE status = ? ORDER BY id LIMIT 1", (RUNNING,)
+            )
+            row = await cursor.fetchone()
+            if row is None:
+                return None, []
+            broadcast_id = row[0]
+            cursor = await self._db.execute(
+                "SELECT chat_id, player_id, attempts FROM broadcast_messages "
+                "WHERE broadcast_id = ? AND status = ? LIMIT ?",
+                (broadcast_id, PENDING, self.batch)
+            )
+            rows = await cursor.fetchall()
+            if not rows:
+                await self._db.execute(
+                    "UPDATE broadcasts SET status = ?, finished_at = ? WHERE id = ?",
+                    (DONE, int(time.time()), broadcast_id)
+                )
+            else:
+                await self._db.executemany(
+                    "UPDATE broadcast_messages SET status = ? WHERE broadcast_id = ? AND chat_id = ?",
+                    [(SENDING, broadcast_id, chat_id) for chat_id, _, _ in rows]
+                )
+            await self._db.commit()
+        if not rows:
+            logger.info(f"Рассылка #{broadcast_id} завершена")
+        return broadcast_id, rows
+
+    async def _wait_chat(self, chat_id: int):
+        while True:
+            remaining = self._chats.hit(chat_id)
+            if not remaining:
+                return
+            await asyncio.sleep(remaining)
+
+    async def _deliver(self, chat_id: int, player_id: str, attempts: int) -> Tuple[str, int, Optional[str]]:
+        """Отправить одно сообщение: (статус, попыток, ошибка)"""
+        try:
+            text = await self.render(chat_id, player_id)
+        except Exception as e:
+            # Ничего не отправлено — можно повторить в следующей пачке
+            attempts += 1
+            return (PENDING if attempts < self.max_attempts else FAILED), attempts, f"render: {e}"
+        if text is None:
+            return SKIPPED, attempts, None
+
+        while True:
+            await self._wait_chat(chat_id)
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id, text)
+                return SENT, attempts + 1, None
+            except TelegramRetryAfter as e:
+                # Telegram не принял сообщение: пауза для всех и повтор
+                self.stats["retry_after"] += 1
+                self.bucket.pause(e.retry_after)
+            except TelegramServerError as e:
+                attempts += 1
+                if attempts >= self.max_attempts:
+                    return FAILED, attempts, str(e)
+                await asyncio.sleep(min(2 ** attempts, 30))
+            except TelegramNetworkError as e:
+                # Запрос мог дойти до Telegram — повтор рискует дублем
+                return UNKNOWN, attempts + 1, str(e)
+            except TelegramAPIError as e:
+                # Бот заблокирован, чат удалён и т. п.
+                return FAILED, attempts + 1, str(e)
+
+    async def _send_batch(self, broadcast_id: int, rows: List[Tuple[int, str, int]]) -> List[tuple]:
+        slots = asyncio.Semaphore(self.workers)
+
+        async def one(chat_id: int, player_id: str, attempts: int) -> tuple:
+            async with slots:
+                status, attempts, error = await self._deliver(chat_id, player_id, attempts)
+            self.stats[status] = self.stats.get(status, 0) + 1
+            return status, attempts, error, broadcast_id, chat_id
+
+        results = await asyncio.gather(*(one(*row) for row in rows))
+        async with self._lock:
+            await self._db.executemany(
+                "UPDATE broadcast_messages SET status = ?, attempts = ?, error = ? "
+                "WHERE broadcast_id = ? AND chat_id = ?",
+                results
+            )
+            await self._db.commit()
+        self.stats["batches"] += 1
+        return results
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                broadcast_id, rows = await self._claim()
+                if broadcast_id is None:
+                    self._wake.clear()
+                    await self._wake.wait()
+                elif rows:
+                    results = await self._send_batch(broadcast_id, rows)
+                    if all(status == PENDING for status, *_ in results):
+                        await asyncio.sleep(RETRY_DELAY)
+            except Exception as e:
+                logger.exception(f"Ошибка рассылки: {e}")
+                await asyncio.sleep(1)
+
+
+async def run_daily(at: str, job: Callable[[str], Awaitable]):
+    """
+    Вызывать job(дата UTC) ежедневно в at (HH:MM, UTC)
+
+    Если к запуску время уже прошло, job вызывается сразу: задача должна
+    быть идемпотентной по дате (рассылка с уникальным именем).
+    """
+    hour, minute = (int(part) for part in at.split(":"))
+    while True:
+        now = datetime.now(timezone.utc)
+        run_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if now >= run_at:
+            try:
+                await job(now.date().isoformat())
+            except Exception as e:
+                logger.error(f"Ежедневная задача не выполнена: {e}")
+            run_at += timedelta(days=1)
+        await asyncio.sleep((run_at - datetime.now(timezone.utc)).total_seconds())
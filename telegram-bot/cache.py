@@ -0,0 +1,176 @@
+"""
+Двухуровневый кэш ответов аналитики
+
+1. LRU в процессе с ограничением по числу записей и TTL
+2. Redis (REDIS_HOST/REDIS_PORT/REDIS_DB), общий для всех процессов API
+
+Ключ включает версию данных игрока, поэтому после синхронизации старые
+записи просто перестают запрашиваться; invalidate_player() дополнительно
+освобождает их сразу. Сжатые варианты ответа (compression.py) хранятся
+под тем же ключом с суффиксом кодировки и удаляются вместе с ним.
+
+Если Redis недоступен, кэш работает только на LRU и периодически пробует
+переподключиться.
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """LRU с TTL: вытесняет самые давние записи и протухшие по времени"""
+
+    def __init__(self, max_entries: int = 10_000, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: bytes):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def delete_prefix(self, prefix: str) -> int:
+        keys = [key for key in self._data if key.startswith(prefix)]
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class ResponseCache:
+    """LRU в процессе перед Redis-уровнем"""
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        ttl: float = 300,
+        redis_host: Optional[str] = None,
+        redis_port: int = 6379,
+        redis_db: int = 0,
+        redis_timeout: float = 0.25,
+        redis_retry_interval: float = 30
+    ):
+        self.ttl = ttl
+        self.lru = LRUCache(max_entries, ttl)
+        self.redis: Optional[redis.Redis] = None
+        if redis_host:
+            self.redis = redis.Redis(
+                host=redis_host,
+                port=redis_port,
+                db=redis_db,
+                socket_timeout=redis_timeout,
+                socket_connect_timeout=redis_timeout
+            )
+        self.redis_retry_interval = redis_retry_interval
+        self._redis_down_until = 0.0
+        self.stats: Dict[str, int] = {
+            "lru_hits": 0, "redis_hits": 0, "misses": 0, "sets": 0,
+            "invalidations": 0, "redis_errors": 0,
+        }
+
+    @staticmethod
+    def key(player_id: str, version: int, route: str, params: str = "", encoding: Optional[str] = None) -> str:
+        """Ключ ответа; сжатое тело (encoding: gzip, br) лежит рядом с несжатым под своим ключом"""
+        key = f"cache:{player_id}:{version}:{route}:{params}"
+        return f"{key}#{encoding}" if encoding else key
+
+    @staticmethod
+    def _player_prefix(player_id: str) -> str:
+        return f"cache:{player_id}:"
+
+    def _redis_available(self) -> bool:
+        return self.redis is not None and time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self, e: Exception):
+        self.stats["redis_errors"] += 1
+        self._redis_down_until = time.monotonic() + self.redis_retry_interval
+        logger.warning(f"Redis недоступен, кэш работает только в процессе: {e}")
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value = self.lru.get(key)
+        if value is not None:
+            self.stats["lru_hits"] += 1
+            return value
+
+        if self._redis_available():
+            try:
+                value = await self.redis.get(key)
+            except (RedisError, OSError) as e:
+                self._redis_failed(e)
+            if value is not None:
+                self.stats["redis_hits"] += 1
+                self.lru.set(key, value)
+                return value
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: bytes, player_id: str):
+        self.stats["sets"] += 1
+        self.lru.set(key, value)
+
+        if self._redis_available():
+            # Ключи игрока собираются в множество, чтобы их можно было удалить разом
+            keys_set = self._player_prefix(player_id) + "keys"
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.set(key, value, ex=int(self.ttl))
+                    pipe.sadd(keys_set, key)
+                    pipe.expire(keys_set, int(self.ttl))
+                    await pipe.execute()
+            except (RedisError, OSError) as e:
+                self._redis_failed(e)
+
+    async def invalidate_player(self, player_id: str):
+        """Удалить все закэшированные ответы игрока"""
+        self.stats["invalidations"] += 1
+        prefix = self._player_prefix(player_id)
+        self.lru.delete_prefix(prefix)
+
+        if self._redis_available():
+            keys_set = prefix + "keys"
+            try:
+                keys = await self.redis.smembers(keys_set)
+                await self.redis.delete(keys_set, *keys)
+            except (RedisError, OSError) as e:
+                self._redis_failed(e)
+
+    def snapshot(self) -> dict:
+        hits = self.stats["lru_hits"] + self.stats["redis_hits"]
+        total = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(hits / total, 3) if total else 0.0,
+            "lru_entries": len(self.lru),
+            "redis_enabled": self.redis is not None,
+            "redis_available": self._redis_available(),
+        }
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.aclose()
@@ -0,0 +1,155 @@
+"""
+PNG-графики истории винрейта для отправки в чат
+
+Рендер (matplotlib) идёт в пуле процессов и не блокирует event loop бота.
+Картинки адресуются содержимым: ключ — хэш JSON-истории и версии стиля,
+поэтому одинаковые данные дают один файл. После первой отправки Telegram
+возвращает file_id, и повторные запросы отправляют его — без рендера и
+повторной загрузки. ETag ответа API запоминается по запросу, так что при
+неизменных данных API отвечает 304 и даже история не передаётся заново.
+"""
+
+import asyncio
+import hashlib
+import io
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+# Меняется при изменении оформления, чтобы не отдавать старые картинки
+STYLE_VERSION = "1"
+
+
+def render_winrate_chart(brawler: str, days: int, history: List[dict]) -> bytes:
+    """PNG с винрейтом по дням (линия) и числом боёв (столбцы)"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    labels = [point["date"][5:] for point in history]
+    matches = [point["matches"] for point in history]
+    rates = [point["win_rate"] * 100 if point["matches"] else None for point in history]
+    total_matches = sum(matches)
+    total_wins = sum(point["wins"] for point in history)
+
+    fig, ax = plt.subplots(figsize=(8, 4), dpi=100)
+    try:
+        bars = ax.twinx()
+        bars.bar(range(len(history)), matches, color="#4a90d9", alpha=0.25, width=0.8)
+        bars.set_ylabel("Боёв")
+        ax.set_zorder(bars.get_zorder() + 1)
+        ax.patch.set_visible(False)
+
+        ax.plot(range(len(history)), [r if r is not None else float("nan") for r in rates],
+                color="#f5a623", marker="o", markersize=3, linewidth=2)
+        ax.axhline(50, color="#999999", linewidth=0.8, linestyle="--")
+        ax.set_ylim(0, 100)
+        ax.set_ylabel("Винрейт, %")
+
+        step = max(1, len(labels) // 10)
+        ax.set_xticks(range(0, len(labels), step))
+        ax.set_xticklabels(labels[::step], rotation=45, ha="right", fontsize=8)
+
+        overall = total_wins / total_matches * 100 if total_matches else 0
+        ax.set_title(f"{brawler}: {overall:.1f}% за {days} дн. ({total_matches} боёв)")
+        fig.tight_layout()
+
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png")
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+
+
+class ChartRenderer:
+    """Пул процессов для рендера; создаётся при первом графике"""
+
+    def __init__(self, processes: int = 2):
+        self.processes = processes
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    async def render(self, brawler: str, days: int, history: List[dict]) -> bytes:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.processes)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, render_winrate_chart, brawler, days, history)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+class ChartCache:
+    """
+    Картинки по ключу содержимого: {key}.png и {key}.id (file_id в Telegram)
+
+    В памяти — file_id и последний ETag/ключ по запросу (игрок, боец, дни).
+    """
+
+    def __init__(self, directory: str, max_entries: int = 10_000):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+        self._file_ids: "OrderedDict[str, str]" = OrderedDict()
+        self._etags: "OrderedDict[Tuple, Tuple[str, str]]" = OrderedDict()
+        self.stats = {"file_id_hits": 0, "png_hits": 0, "renders": 0, "not_modified": 0}
+
+    @staticmethod
+    def key(brawler: str, days: int, history_body: bytes) -> str:
+        digest = hashlib.sha256(f"{STYLE_VERSION}:{brawler}:{days}:".encode())
+        digest.update(history_body)
+        return digest.hexdigest()[:32]
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{key}.{suffix}")
+
+    @staticmethod
+    def _remember(cache: OrderedDict, key, value, limit: int):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > limit:
+            cache.popitem(last=False)
+
+    def etag(self, query: Tuple) -> Optional[Tuple[str, str]]:
+        """(ETag, ключ картинки) последнего ответа API на запрос"""
+        return self._etags.get(query)
+
+    def set_etag(self, query: Tuple, etag: str, key: str):
+        self._remember(self._etags, query, (etag, key), self.max_entries)
+
+    def file_id(self, key: str) -> Optional[str]:
+        file_id = self._file_ids.get(key)
+        if file_id is None:
+            try:
+                with open(self._path(key, "id"), encoding="utf-8") as f:
+                    file_id = f.read().strip() or None
+            except FileNotFoundError:
+                return None
+            if file_id:
+                self._remember(self._file_ids, key, file_id, self.max_entries)
+        return file_id
+
+    def set_file_id(self, key: str, file_id: str):
+        self._remember(self._file_ids, key, file_id, self.max_entries)
+        with open(self._path(key, "id"), "w", encoding="utf-8") as f:
+            f.write(file_id)
+
+    def has_png(self, key: str) -> bool:
+        return os.path.exists(self._path(key, "png"))
+
+    def png(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key, "png"), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put_png(self, key: str, png: bytes):
+        # Через временный файл: параллельный читатель не увидит недописанную картинку
+        path = self._path(key, "png")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(png)
+        os.replace(tmp, path)
@@ -0,0 +1,84 @@
+"""
+Сжатие JSON-ответов: выбор кодировки по Accept-Encoding и gzip/brotli
+
+Ответы аналитики кэшируются (cache.py), поэтому сжатое тело тоже
+кэшируется рядом с несжатым под тем же ключом с суффиксом кодировки:
+популярный ответ сжимается один раз на версию данных игрока, а не на
+каждый запрос. Тела меньше min_bytes не сжимаются: выигрыш в байтах
+меньше заголовков и времени на распаковку.
+"""
+
+import gzip
+from functools import lru_cache
+from typing import Dict, Optional
+
+import brotli
+
+# В порядке предпочтения при равном q
+ENCODINGS = ("br", "gzip")
+
+
+@lru_cache(maxsize=256)
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Кодировка ответа по заголовку Accept-Encoding или None (без сжатия)
+
+    Учитываются q-значения, "*" и identity;
+    заголовков у клиентов немного, поэтому разбор кэшируется.
+    """
+    if not accept_encoding:
+        return None
+
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in ENCODINGS:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    if best is not None and weights.get("identity", 0.0) > best_weight:
+        return None
+    return best
+
+
+class Compressor:
+    """Сжатие тел ответов со счётчиками для /metrics"""
+
+    def __init__(self, min_bytes: int = 1024, gzip_level: int = 6, brotli_quality: int = 5):
+        self.min_bytes = min_bytes
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.stats: Dict[str, int] = {
+            # Ответы по отданной кодировке
+            "identity": 0, "gzip": 0, "br": 0,
+            # Сжатия (промахи кэша сжатых тел) и байты до/после по всем ответам
+            "compressions": 0, "raw_bytes": 0, "sent_bytes": 0,
+        }
+
+    def choose(self, accept_encoding: Optional[str], size: int) -> Optional[str]:
+        """Кодировка для тела размером size: None, если клиент не принимает сжатие или тело мало"""
+        if size < self.min_bytes:
+            return None
+        return negotiate(accept_encoding)
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        self.stats["compressions"] += 1
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality, mode=brotli.MODE_TEXT)
+        # mtime=0: одинаковое тело даёт одинаковые байты во всех процессах
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    def record(self, encoding: Optional[str], raw_size: int, sent_size: int):
+        self.stats[encoding or "identity"] += 1
+        self.stats["raw_bytes"] += raw_size
+        self.stats["sent_bytes"] += sent_size
@@ -1,3 +1,7 @@
+import hashlib
+import hmac
+import os
+
 from pydantic_settings import BaseSettings
 from typing import List
 
@@ -11,6 +15,41 @@ class Settings(BaseSettings):
     API_HOST: str = "0.0.0.0"
     API_PORT: int = 3000
     API_BASE_URL: str = "http://91.229.11.191:8080/api/v1"
+    API_RELOAD: bool = False  # python api.py: автоперезагрузка при изменении кода, только для разработки
+
+    # Многопроцессный API (python prefork.py): воркеры читают снимок агрегатов, бои пишет один процесс
+    API_WORKERS: int = 0  # воркеров; 0 — по числу ядер
+    API_ROLE: str = "single"  # single | writer | worker, роль процесса выставляет prefork.py
+    API_WRITER_SOCKET: str = ""  # unix-сокет писателя; пусто — DATA_DIR/writer.sock
+    SNAPSHOT_POLL_INTERVAL: float = 0.5  # секунд между проверками нового снимка для SSE в воркерах
+    SNAPSHOT_BATCH_PLAYERS: int = 100  # игроков в пачке при публикации снимка на запуске писателя (~1 мс на игрока)
+
+    # Клиент API в боте
+    BACKEND_TIMEOUT: float = 10.0
+    BACKEND_MAX_CONNECTIONS: int = 20
+    BACKEND_MAX_RETRIES: int = 1
+    BACKEND_FAILURE_THRESHOLD: int = 5  # отказов подряд до размыкания
+    BACKEND_RESET_TIMEOUT: float = 30.0  # секунд до пробного запроса
+    SYNC_COOLDOWN: float = 30.0  # секунд между синхронизациями одного пользователя
+    
+    # Приём апдейтов: polling или webhook
+    BOT_MODE: str = "polling"
+    WEBHOOK_URL: str = ""  # публичный https-адрес, куда Telegram шлёт апдейты
+    WEBHOOK_PATH: str = "/telegram/webhook"
+    WEBHOOK_SECRET: str = ""  # X-Telegram-Bot-Api-Secret-Token; пусто — случайный при каждом запуске
+    WEBHOOK_HOST: str = "0.0.0.0"
+    WEBHOOK_PORT: int = 8443
+    WEBHOOK_QUEUE_SIZE: int = 1000
+    WEBHOOK_WORKERS: int = 64
+    WEBHOOK_MAX_CONNECTIONS: int = 40  # параллельных соединений со стороны Telegram
+    WEBHOOK_FALLBACK_POLLING: bool = False  # при ошибке запуска webhook перейти на polling вместо остановки
+    
+    # Метрики бота (/metrics в формате Prometheus); порт 0 — не поднимать
+    BOT_METRICS_HOST: str = "127.0.0.1"
+    BOT_METRICS_PORT: int = 0
+    
+    # Адрес Bot API (пусто — api.telegram.org), например локальный сервер или заглушка
+    TELEGRAM_API_URL: str = ""
     
     # Web App
     WEB_APP_URL: str = "https://kgghoul.github.io/brawlstars"
@@ -20,15 +59,74 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str = "sqlite+aiosqlite:///./brawlstars.db"
+    USER_CACHE_SIZE: int = 100000  # привязок user -> player в памяти
+    USER_FLUSH_INTERVAL: float = 1.0  # секунд между пакетными записями
+    USER_FLUSH_BATCH: int = 500  # изменений, после которых запись не ждёт интервала
+
+    # Графики /chart
+    CHART_CACHE_DIR: str = "./data/charts"
+    CHART_PROCESSES: int = 2  # процессов для рендера PNG
+
+    # Рассылки
+    BROADCAST_RATE: float = 25.0  # сообщений в секунду на все чаты (лимит Telegram ~30)
+    BROADCAST_CHAT_INTERVAL: float = 1.0  # секунд между сообщениями в один чат
+    BROADCAST_WORKERS: int = 16  # одновременных отправок
+    BROADCAST_BATCH: int = 100  # получателей в пачке (столько могут стать unknown при падении)
+    BROADCAST_DAILY_AT: str = "09:00"  # время ежедневной сводки (UTC), пусто — не рассылать
+    
+    # Хранилище боёв
+    DATA_DIR: str = "./data"
+    SEGMENT_MAX_BYTES: int = 64 * 1024 * 1024
+    ROLLUP_MAX_PLAYERS: int = 2000  # игроков с дневными роллапами в памяти
+    MAP_ENGINE_MAX_BYTES: int = 256 * 1024 * 1024  # байт матриц карта × боец в памяти на процесс
+    EXPORT_CHUNK_RECORDS: int = 16384  # боёв в одном куске потоковой выгрузки
     
     # Redis
+    REDIS_ENABLED: bool = True
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
     
+    # Кэш ответов аналитики
+    CACHE_MAX_ENTRIES: int = 10000
+    CACHE_TTL: int = 300
+
+    # Сжатие ответов аналитики (gzip/brotli по Accept-Encoding), сжатые тела кэшируются рядом с несжатыми
+    COMPRESSION_MIN_BYTES: int = 1024  # тела меньше не сжимаются
+    GZIP_LEVEL: int = 6
+    BROTLI_QUALITY: int = 5
+    
+    # Server-Sent Events
+    SSE_BUFFER_SIZE: int = 64
+    SSE_HEARTBEAT: float = 15.0
+
+    # Доступ к /analytics: initData Mini App или служебный токен бота
+    WEBAPP_AUTH_REQUIRED: bool = True
+    WEBAPP_AUTH_MAX_AGE: int = 86400  # секунд после auth_date, пока initData действителен
+    WEBAPP_AUTH_CACHE_SIZE: int = 10000  # проверенных initData в памяти
+    API_SERVICE_TOKEN: str = ""  # заголовок X-Service-Token бота; пусто — выводится из BOT_TOKEN
+    
     # Brawl Stars API
     BRAWL_STARS_API_KEY: str = ""
+    BRAWL_STARS_API_URL: str = "https://api.brawlstars.com/v1"
+    BRAWL_STARS_RATE_LIMIT: float = 5.0  # запросов в секунду по бюджету ключа
+    BRAWL_STARS_BURST: int = 10
+    BRAWL_STARS_MAX_CONNECTIONS: int = 10
+    BRAWL_STARS_TIMEOUT: float = 10.0
+    BRAWL_STARS_MAX_RETRIES: int = 3
     
+    @property
+    def service_token(self) -> str:
+        """Токен запросов бота к API: общий для обоих процессов, так как оба знают BOT_TOKEN"""
+        if self.API_SERVICE_TOKEN:
+            return self.API_SERVICE_TOKEN
+        return hmac.new(b"ServiceToken", self.BOT_TOKEN.encode(), hashlib.sha256).hexdigest()
+
+    @property
+    def writer_socket(self) -> str:
+        """Unix-сокет процесса-писателя prefork.py"""
+        return self.API_WRITER_SOCKET or os.path.join(self.DATA_DIR, "writer.sock")
+
     @property
     def admin_ids_list(self) -> List[int]:
         if not self.ADMIN_IDS:
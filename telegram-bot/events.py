@@ -0,0 +1,100 @@
+"""
+Рассылка событий игроков по Server-Sent Events
+
+У каждого подписчика своя очередь ограниченного размера. Событие
+сериализуется один раз и раскладывается по очередям без ожидания;
+если очередь клиента переполнена, клиент отключается, а не копит
+события в памяти. Ожидающие подписчики — это просто корутины на одном
+event loop, поэтому тысячи простаивающих соединений почти ничего не стоят.
+"""
+
+import asyncio
+import json
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+
+class Subscriber:
+    """Одно SSE-соединение"""
+
+    __slots__ = ("player_id", "queue", "dropped")
+
+    def __init__(self, player_id: str, buffer_size: int):
+        self.player_id = player_id
+        self.queue: asyncio.Queue = asyncio.Queue(buffer_size)
+        self.dropped = False
+
+
+class EventBroker:
+    """Подписки на события по player_id"""
+
+    def __init__(self, buffer_size: int = 64, heartbeat: float = 15.0):
+        self.buffer_size = buffer_size
+        self.heartbeat = heartbeat
+        self._subscribers: Dict[str, Set[Subscriber]] = {}
+        self.stats = {"subscribers": 0, "published": 0, "delivered": 0, "dropped": 0}
+
+    def has_subscribers(self, player_id: str) -> bool:
+        return player_id in self._subscribers
+
+    def players(self) -> List[str]:
+        """Игроки, у которых есть подписчики"""
+        return list(self._subscribers)
+
+    def subscribe(self, player_id: str) -> Subscriber:
+        subscriber = Subscriber(player_id, self.buffer_size)
+        self._subscribers.setdefault(player_id, set()).add(subscriber)
+        self.stats["subscribers"] += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self._subscribers.get(subscriber.player_id)
+        if not subscribers or subscriber not in subscribers:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._subscribers[subscriber.player_id]
+        self.stats["subscribers"] -= 1
+
+    def _drop(self, subscriber: Subscriber):
+        """Отключить медленного клиента: буфер очищается, поток завершается"""
+        subscriber.dropped = True
+        self.unsubscribe(subscriber)
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+        self.stats["dropped"] += 1
+
+    def publish(self, player_id: str, event: str, data: dict, event_id: Optional[int] = None):
+        subscribers = self._subscribers.get(player_id)
+        if not subscribers:
+            return
+
+        payload = f"event: {event}\n"
+        if event_id is not None:
+            payload += f"id: {event_id}\n"
+        payload += f"data: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+        message = payload.encode()
+
+        self.stats["published"] += 1
+        for subscriber in list(subscribers):
+            try:
+                subscriber.queue.put_nowait(message)
+                self.stats["delivered"] += 1
+            except asyncio.QueueFull:
+                self._drop(subscriber)
+
+    async def stream(self, subscriber: Subscriber) -> AsyncIterator[bytes]:
+        """Тело SSE-ответа: события подписчика и периодические heartbeat-комментарии"""
+        try:
+            yield b"retry: 5000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            self.unsubscribe(subscriber)
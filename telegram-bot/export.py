@@ -0,0 +1,95 @@
+"""
+Потоковая выгрузка сырых боёв игрока в NDJSON и CSV
+
+Бои читаются из BattleStore кусками (iter_chunks) и форматируются
+кусок за куском, поэтому память не зависит от длины истории: в работе
+один кусок записей и его текст. Строки собираются без объектов Battle
+и без json.dumps на каждый бой: фрагменты имён бойцов, карт, режимов и
+результатов готовятся один раз из словаря хранилища, а кусок — это
+массив фрагментов NumPy (object), склеенный одним b"".join.
+"""
+
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import orjson
+
+from map_engine import RECORD_DTYPE
+from storage import RESULTS, BattleStore
+
+# Формат выгрузки -> Content-Type
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+CSV_COLUMNS = ("player_id", "timestamp", "brawler", "map", "mode", "result")
+
+
+def csv_field(value: str) -> bytes:
+    """Поле CSV по RFC 4180: в кавычках, только если нужно"""
+    if any(char in value for char in ',"\r\n'):
+        value = '"' + value.replace('"', '""') + '"'
+    return value.encode()
+
+
+def fragments(values: List[bytes]) -> np.ndarray:
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+class BattleFormatter:
+    """Кусок записей RECORD_DTYPE -> строки NDJSON или CSV одного игрока"""
+
+    def __init__(self, player_id: str, names: Dict[str, List[str]], fmt: str):
+        if fmt == "ndjson":
+            self.head = b'{"player_id":' + orjson.dumps(player_id) + b',"timestamp":'
+            self.brawlers = fragments([b',"brawler":' + orjson.dumps(name) for name in names["brawler"]])
+            self.maps = fragments([b',"map":' + orjson.dumps(name) for name in names["map"]])
+            self.modes = fragments([b',"mode":' + orjson.dumps(name) for name in names["mode"]])
+            self.results = fragments([b',"result":' + orjson.dumps(name) + b'}\n' for name in RESULTS])
+            self.header = b""
+        else:
+            self.head = csv_field(player_id) + b","
+            self.brawlers = fragments([b"," + csv_field(name) for name in names["brawler"]])
+            self.maps = fragments([b"," + csv_field(name) for name in names["map"]])
+            self.modes = fragments([b"," + csv_field(name) for name in names["mode"]])
+            self.results = fragments([b"," + name.encode() + b"\n" for name in RESULTS])
+            self.header = ",".join(CSV_COLUMNS).encode() + b"\n"
+
+    def format(self, records: np.ndarray) -> bytes:
+        parts = np.empty((len(records), 6), dtype=object)
+        parts[:, 0] = self.head
+        parts[:, 1] = records["timestamp"].astype("S20")
+        parts[:, 2] = self.brawlers[records["brawler"]]
+        parts[:, 3] = self.maps[records["map"]]
+        parts[:, 4] = self.modes[records["mode"]]
+        parts[:, 5] = self.results[records["result"]]
+        return b"".join(parts.ravel().tolist())
+
+
+def export_battles(store: BattleStore, player_id: str, fmt: str,
+                   since: Optional[int] = None, chunk_records: int = 16384) -> Iterator[bytes]:
+    """
+    Бои игрока в формате fmt (ndjson | csv) кусками по chunk_records боёв
+
+    since — unix-время: бои раньше него пропускаются. Бои игрока лежат в
+    хранилище по возрастанию времени, поэтому граница ищется бинарным
+    поиском внутри куска, а куски целиком раньше since не форматируются.
+    """
+    # Сначала снимок блоков, потом словарь: синхронизация дописывает имена
+    # раньше блоков, поэтому в снятых блоках нет id новее прочитанного словаря
+    chunks = store.iter_chunks(player_id, chunk_records)
+    formatter = BattleFormatter(player_id, store.symbols.names, fmt)
+    if formatter.header:
+        yield formatter.header
+
+    for chunk in chunks:
+        records = np.frombuffer(chunk, dtype=RECORD_DTYPE)
+        if since is not None:
+            if records["timestamp"][-1] < since:
+                continue
+            records = records[np.searchsorted(records["timestamp"], since):]
+            since = None
+        yield formatter.format(records)
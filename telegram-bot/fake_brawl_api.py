@@ -0,0 +1,134 @@
+"""
+Локальная заглушка Brawl Stars API
+
+Отдаёт детерминированный battlelog для любого тега (новый бой каждые
+10 минут), умеет ограничивать частоту запросов ответом 429, добавлять
+задержку и случайные 503. Нужна, чтобы гонять клиент и лимитер без сети.
+
+Запуск:
+    python fake_brawl_api.py --port 8081 --rate 20 --error-rate 0.05
+
+и в .env:
+    BRAWL_STARS_API_URL=http://localhost:8081/v1
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+from ratelimit import TokenBucket
+
+BRAWLERS = [
+    "SHELLY", "COLT", "BULL", "BROCK", "RICO", "SPIKE", "CROW", "LEON",
+    "SANDY", "AMBER", "EDGAR", "MORTIS", "POCO", "PAM", "FRANK", "GENE",
+]
+EVENTS = [
+    ("gemGrab", "Hard Rock Mine"), ("gemGrab", "Crystal Arcade"),
+    ("brawlBall", "Backyard Bowl"), ("brawlBall", "Pinhole Punt"),
+    ("heist", "Safe Zone"), ("knockout", "Belle's Rock"),
+    ("bounty", "Shooting Star"), ("soloShowdown", "Skull Creek"),
+]
+BATTLE_INTERVAL = 600
+BATTLELOG_SIZE = 25
+
+
+def make_battle(tag: str, ts: int) -> dict:
+    rng = random.Random(f"{tag}:{ts}")
+    mode, map_name = rng.choice(EVENTS)
+    me = {
+        "tag": tag,
+        "name": "Player",
+        "brawler": {"id": 16000000, "name": rng.choice(BRAWLERS), "power": 11, "trophies": 500},
+    }
+    battle = {"mode": mode, "type": "ranked", "duration": rng.randint(60, 180)}
+
+    if mode == "soloShowdown":
+        battle["rank"] = rng.randint(1, 10)
+        battle["players"] = [me]
+    else:
+        battle["result"] = "victory" if rng.random() < 0.52 else "defeat"
+        battle["teams"] = [[me], []]
+
+    return {
+        "battleTime": datetime.fromtimestamp(ts, timezone.utc).strftime("%Y%m%dT%H%M%S.000Z"),
+        "event": {"id": 15000000 + EVENTS.index((mode, map_name)), "mode": mode, "map": map_name},
+        "battle": battle,
+    }
+
+
+def make_battlelog(tag: str, now: float) -> dict:
+    last = int(now) // BATTLE_INTERVAL * BATTLE_INTERVAL
+    return {
+        "items": [make_battle(tag, last - i * BATTLE_INTERVAL) for i in range(BATTLELOG_SIZE)]
+    }
+
+
+def create_app(rate: float = 0, error_rate: float = 0, latency: float = 0) -> web.Application:
+    """
+    Args:
+        rate: лимит запросов в секунду (0 — без лимита), сверх лимита 429
+        error_rate: доля ответов 503
+        latency: задержка ответа в секундах
+    """
+    app = web.Application()
+    bucket = TokenBucket(rate, max(rate, 1)) if rate else None
+    stats = {
+        "requests": 0, "ok": 0, "throttled": 0, "errors": 0,
+        "in_flight": 0, "max_in_flight": 0, "peers": set(),
+    }
+    app["stats"] = stats
+
+    async def battlelog(request: web.Request) -> web.Response:
+        stats["requests"] += 1
+        stats["peers"].add(request.transport.get_extra_info("peername"))
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            if latency:
+                await asyncio.sleep(latency)
+
+            if bucket is not None:
+                if bucket.tokens < 1:
+                    stats["throttled"] += 1
+                    return web.json_response(
+                        {"reason": "tooManyRequests", "message": "Request was throttled"},
+                        status=429,
+                        headers={"Retry-After": "1"}
+                    )
+                await bucket.acquire()
+
+            if error_rate and random.random() < error_rate:
+                stats["errors"] += 1
+                return web.json_response({"reason": "unavailable", "message": "Service unavailable"}, status=503)
+
+            tag = request.match_info["tag"].upper()
+            if not tag.startswith("#"):
+                return web.json_response({"reason": "notFound", "message": "Not found"}, status=404)
+
+            stats["ok"] += 1
+            return web.json_response(make_battlelog(tag, time.time()))
+        finally:
+            stats["in_flight"] -= 1
+
+    app.router.add_get("/v1/players/{tag}/battlelog", battlelog)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка Brawl Stars API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--rate", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--latency", type=float, default=0)
+    args = parser.parse_args()
+
+    web.run_app(create_app(args.rate, args.error_rate, args.latency), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Локальная Redis-совместимая заглушка
+
+Понимает RESP2 и подмножество команд, которое использует кэш ответов:
+PING, SELECT, GET, SET (EX/PX), DEL, EXPIRE, SADD, SMEMBERS, FLUSHDB, DBSIZE.
+Нужна, чтобы проверять кэш без настоящего Redis.
+
+Запуск:
+    python fake_redis.py --port 6380
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class FakeRedis:
+    """In-memory хранилище с протоколом RESP2"""
+
+    def __init__(self):
+        self.data: Dict[bytes, Tuple[object, Optional[float]]] = {}
+        self.commands = 0
+
+    def _get(self, key: bytes):
+        item = self.data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def execute(self, args: List[bytes]):
+        self.commands += 1
+        command = args[0].upper()
+
+        if command == b"PING":
+            return "+PONG"
+        if command in (b"SELECT", b"CLIENT"):
+            return "+OK"
+        if command == b"GET":
+            value = self._get(args[1])
+            return value if isinstance(value, bytes) or value is None else "-WRONGTYPE"
+        if command == b"SET":
+            expires = None
+            options = [a.upper() for a in args[3:]]
+            if b"EX" in options:
+                expires = time.monotonic() + int(args[3 + options.index(b"EX") + 1])
+            elif b"PX" in options:
+                expires = time.monotonic() + int(args[3 + options.index(b"PX") + 1]) / 1000
+            self.data[args[1]] = (args[2], expires)
+            return "+OK"
+        if command == b"DEL":
+            removed = 0
+            for key in args[1:]:
+                if self._get(key) is not None:
+                    del self.data[key]
+                    removed += 1
+            return removed
+        if command == b"EXPIRE":
+            value = self._get(args[1])
+            if value is None:
+                return 0
+            self.data[args[1]] = (value, time.monotonic() + int(args[2]))
+            return 1
+        if command == b"SADD":
+            members = self._get(args[1])
+            if members is None:
+                members = set()
+                self.data[args[1]] = (members, None)
+            before = len(members)
+            members.update(args[2:])
+            return len(members) - before
+        if command == b"SMEMBERS":
+            return list(self._get(args[1]) or ())
+        if command == b"FLUSHDB":
+            self.data.clear()
+            return "+OK"
+        if command == b"DBSIZE":
+            return len(self.data)
+        return f"-ERR unknown command '{command.decode()}'"
+
+
+def encode(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, str):
+        return value.encode() + b"\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    return b"*%d\r\n" % len(value) + b"".join(encode(item) for item in value)
+
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline-команда (например, из telnet)
+        return line.split()
+    args = []
+    for _ in range(int(line[1:])):
+        size = int((await reader.readline())[1:])
+        args.append((await reader.readexactly(size + 2))[:-2])
+    return args
+
+
+async def start_server(host: str = "127.0.0.1", port: int = 0) -> Tuple[asyncio.AbstractServer, FakeRedis]:
+    storage = FakeRedis()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                args = await read_command(reader)
+                if not args:
+                    break
+                writer.write(encode(storage.execute(args)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    return server, storage
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Redis-совместимая заглушка")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    args = parser.parse_args()
+
+    server, _ = await start_server(args.host, args.port)
+    print(f"Fake Redis на {args.host}:{args.port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
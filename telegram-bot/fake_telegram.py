@@ -0,0 +1,160 @@
+"""
+Локальная заглушка Telegram Bot API
+
+Отвечает на методы, которые вызывает бот (getMe, sendMessage,
+answerCallbackQuery, deleteWebhook, setWebhook, getUpdates ...),
+запоминает отправленные сообщения и умеет добавлять задержку и
+ограничивать частоту ответом 429 с retry_after, как настоящий API.
+Нужна, чтобы гонять бота под нагрузкой без сети и без токена.
+
+Запуск:
+    python fake_telegram.py --port 8082 --latency 0.05
+
+и в .env:
+    TELEGRAM_API_URL=http://localhost:8082
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from typing import Dict, List
+
+from aiohttp import web
+
+from ratelimit import TokenBucket
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bench Bot", "username": "bench_bot"}
+
+
+def make_update(update_id: int, chat_id: int, text: str) -> dict:
+    """Update с текстовым сообщением пользователя chat_id"""
+    user = {"id": chat_id, "is_bot": False, "first_name": "User"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": "User"},
+            "from": user,
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+            if text.startswith("/") else [],
+        },
+    }
+
+
+def create_app(latency: float = 0, rate: float = 0) -> web.Application:
+    """
+    Args:
+        latency: задержка ответа в секундах
+        rate: лимит вызовов в секунду (0 — без лимита), сверх лимита 429
+    """
+    app = web.Application()
+    bucket = TokenBucket(rate, max(rate, 1)) if rate else None
+    message_ids = itertools.count(1)
+    stats: Dict[str, int] = {"requests": 0, "throttled": 0}
+    sent: List[dict] = []
+    updates: asyncio.Queue = asyncio.Queue()
+    app["stats"] = stats
+    app["sent"] = sent
+    # Очередь для getUpdates: тесты кладут сюда Update-словари
+    app["updates"] = updates
+
+    def ok(result) -> web.Response:
+        return web.json_response({"ok": True, "result": result})
+
+    async def get_updates(params: dict) -> web.Response:
+        timeout = float(params.get("timeout", 0) or 0)
+        result = []
+        try:
+            result.append(await asyncio.wait_for(updates.get(), timeout) if timeout else updates.get_nowait())
+        except (asyncio.TimeoutError, asyncio.QueueEmpty):
+            return ok([])
+        limit = int(params.get("limit", 100) or 100)
+        while len(result) < limit and not updates.empty():
+            result.append(updates.get_nowait())
+        return ok(result)
+
+    async def method(request: web.Request) -> web.Response:
+        name = request.match_info["method"]
+        stats["requests"] += 1
+        stats[name] = stats.get(name, 0) + 1
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+
+        if latency:
+            await asyncio.sleep(latency)
+
+        if name == "getUpdates":
+            return await get_updates(params)
+
+        if bucket is not None:
+            if bucket.tokens < 1:
+                stats["throttled"] += 1
+                return web.json_response({
+                    "ok": False,
+                    "error_code": 429,
+                    "description": "Too Many Requests: retry after 1",
+                    "parameters": {"retry_after": 1},
+                }, status=429)
+            await bucket.acquire()
+
+        if name == "getMe":
+            return ok(BOT_USER)
+        if name in ("sendMessage", "sendPhoto", "editMessageText"):
+            chat_id = int(params.get("chat_id", 0))
+            message = {
+                "message_id": next(message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT_USER,
+                "text": params.get("text") or params.get("caption") or "",
+            }
+            if name == "sendPhoto":
+                message["photo"] = [{
+                    "file_id": f"photo-{message['message_id']}",
+                    "file_unique_id": f"u{message['message_id']}",
+                    "width": 1, "height": 1,
+                }]
+            if "reply_markup" in params:
+                markup = params["reply_markup"]
+                message["reply_markup"] = json.loads(markup) if isinstance(markup, str) else markup
+            record = {"method": name, "chat_id": chat_id, "text": message["text"], "time": time.time()}
+            if name == "sendPhoto":
+                # attach://... — загруженный файл, иначе повторная отправка по file_id
+                photo = params.get("photo")
+                record["photo"] = "upload" if not isinstance(photo, str) or photo.startswith("attach://") else photo
+            sent.append(record)
+            return ok(message)
+        if name in ("answerCallbackQuery", "deleteWebhook", "setWebhook", "setMyCommands", "sendChatAction"):
+            return ok(True)
+        if name == "getWebhookInfo":
+            return ok({"url": "", "has_custom_certificate": False, "pending_update_count": 0})
+
+        return web.json_response(
+            {"ok": False, "error_code": 404, "description": f"Not Found: method {name} not found"},
+            status=404
+        )
+
+    app.router.add_post("/bot{token}/{method}", method)
+    app.router.add_get("/bot{token}/{method}", method)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--rate", type=float, default=0)
+    args = parser.parse_args()
+
+    web.run_app(create_app(args.latency, args.rate), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
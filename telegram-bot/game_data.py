@@ -0,0 +1,30 @@
+"""
+Бойцы и режимы с картами Brawl Stars для синтетических данных
+
+Общие для генератора synthetic.py и бенчмарков: порядок списков задаёт
+словари хранилища, поэтому менять его — значит менять синтетический
+датасет при том же seed.
+"""
+
+BRAWLERS = [
+    "Shelly", "Colt", "Bull", "Brock", "Rico", "Spike", "Barley", "Jessie",
+    "Nita", "Dynamike", "El Primo", "Mortis", "Tara", "Pam", "Frank", "Bibi",
+    "Bea", "Emz", "Gale", "Nani", "Sprout", "Surge", "Colette", "Amber",
+    "Lou", "Byron", "Edgar", "Ruffs", "Stu", "Belle", "Squeak", "Grom",
+    "Buzz", "Griff", "Ash", "Meg", "Lola", "Fang", "Eve", "Janet",
+    "Bonnie", "Otis", "Sam", "Gus", "Buster", "Chester", "Gray", "Mandy",
+    "R-T", "Willow", "Maisie", "Hank", "Cordelius", "Doug", "Pearl", "Chuck",
+    "Charlie", "Mico", "Kit", "Larry & Lawrie", "Melodie", "Angelo", "Draco", "Lily",
+    "Berry", "Clancy", "Moe", "Kenji", "Shade", "Juju", "Meeple", "Ollie",
+    "Lumi", "Finx", "Jae-Yong", "Kaze", "Alli", "Trunk", "Mina", "Ziggy",
+]
+
+EVENTS = [
+    ("gemGrab", "Hard Rock Mine"), ("gemGrab", "Crystal Arcade"), ("gemGrab", "Undermine"),
+    ("brawlBall", "Backyard Bowl"), ("brawlBall", "Pinhole Punt"), ("brawlBall", "Center Stage"),
+    ("heist", "Safe Zone"), ("heist", "Kaboom Canyon"), ("heist", "Hot Potato"),
+    ("knockout", "Belle's Rock"), ("knockout", "Goldarm Gulch"), ("knockout", "Out in the Open"),
+    ("bounty", "Shooting Star"), ("bounty", "Hideout"), ("bounty", "Layer Cake"),
+    ("hotZone", "Ring of Fire"), ("hotZone", "Dueling Beetles"), ("hotZone", "Open Business"),
+    ("soloShowdown", "Skull Creek"), ("soloShowdown", "Cavern Churn"), ("duoShowdown", "Double Trouble"),
+]
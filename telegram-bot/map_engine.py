@@ -0,0 +1,249 @@
+"""
+Агрегация карта × боец на плотных матрицах NumPy
+
+Для игрока хранится матрица counts формы (карты × бойцы × 2), где
+[..., 0] — matches, [..., 1] — wins. Оси — глобальные id из словаря
+хранилища, поэтому матрицу можно строить прямо из сырых записей без
+декодирования имён. Топ/антитоп карт и рейтинг бойцов на карте выбираются
+через np.partition с порогом минимального числа матчей (select): сортируются
+только k отобранных элементов, в том числе для страниц по курсору.
+"""
+
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from storage import RECORD, RESULT_CODES, Battle, BattleStore
+
+VICTORY = RESULT_CODES["victory"]
+
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<i8"), ("brawler", "<u2"), ("map", "<u2"), ("mode", "u1"), ("result", "u1"),
+])
+assert RECORD_DTYPE.itemsize == RECORD.size
+
+
+def mode_title(mode: str) -> str:
+    """gemGrab -> Gem Grab"""
+    return re.sub(r"(?<=[a-z])(?=[A-Z])", " ", mode).title() if mode else mode
+
+
+SORTS = ("win_rate", "matches", "wins")
+
+# Позиция в рейтинге для продолжения со следующей страницы: (matches, wins, id) последнего элемента
+After = Tuple[int, int, Union[int, str]]
+
+
+def sort_keys(sort: str, matches: np.ndarray, wins: np.ndarray,
+              worst: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Первичный и вторичный ключ порядка sort, оба по возрастанию
+
+    win_rate: винрейт, при равном — больше матчей; matches и wins: число,
+    при равном — выше винрейт. Всё по убыванию, worst переворачивает
+    только первичный ключ.
+    """
+    matches = np.asarray(matches, dtype=np.int64)
+    wins = np.asarray(wins, dtype=np.int64)
+    rates = np.divide(wins, matches, out=np.zeros(len(matches)), where=matches > 0)
+    primary, secondary = {
+        "win_rate": (rates, -matches),
+        "matches": (matches, -rates),
+        "wins": (wins, -rates),
+    }[sort]
+    return (primary if worst else -primary), secondary
+
+
+def select(ids: np.ndarray, matches: np.ndarray, wins: np.ndarray, k: Optional[int],
+           sort: str = "win_rate", worst: bool = False, after: Optional[After] = None) -> np.ndarray:
+    """
+    Индексы k первых элементов рейтинга после after, упорядоченные
+
+    Порядок полный: ключи sort_keys, затем id по возрастанию, поэтому
+    позиция after однозначна и страницы не пересекаются, даже если между
+    запросами добавились бои. Отбор — np.partition по первичному ключу:
+    сортируются только k кандидатов и равные k-му, а не весь набор.
+    k=None — весь рейтинг.
+    """
+    primary, secondary = sort_keys(sort, matches, wins, worst)
+    candidates = np.arange(len(ids))
+    if after is not None:
+        after_matches, after_wins, after_id = after
+        after_primary, after_secondary = sort_keys(sort, [after_matches], [after_wins], worst)
+        later = (primary > after_primary[0]) | (primary == after_primary[0]) & (
+            (secondary > after_secondary[0]) | (secondary == after_secondary[0]) & (ids > after_id)
+        )
+        candidates = np.flatnonzero(later)
+
+    if k is not None:
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        if k < len(candidates):
+            keys = primary[candidates]
+            kth = np.partition(keys, k - 1)[k - 1]
+            candidates = candidates[keys <= kth]
+    order = np.lexsort((ids[candidates], secondary[candidates], primary[candidates]))
+    return candidates[order][:k]
+
+
+class PlayerMapMatrix:
+    """Матрица карта × боец одного игрока"""
+
+    def __init__(self):
+        self.counts = np.zeros((0, 0, 2), dtype=np.int32)
+        # Суммы по всем бойцам: (карты × 2), обновляются вместе с counts
+        self.totals = np.zeros((0, 2), dtype=np.int32)
+        # map_id -> mode_id последнего боя на карте
+        self.map_modes: Dict[int, int] = {}
+
+    def _reserve(self, maps: int, brawlers: int):
+        old_maps, old_brawlers, _ = self.counts.shape
+        if maps <= old_maps and brawlers <= old_brawlers:
+            return
+        counts = np.zeros((max(maps, old_maps), max(brawlers, old_brawlers), 2), dtype=np.int32)
+        counts[:old_maps, :old_brawlers] = self.counts
+        self.counts = counts
+        totals = np.zeros((counts.shape[0], 2), dtype=np.int32)
+        totals[:old_maps] = self.totals
+        self.totals = totals
+
+    @property
+    def nbytes(self) -> int:
+        return self.counts.nbytes + self.totals.nbytes
+
+    def add_records(self, records: np.ndarray):
+        """Учесть записи хранилища (структурный массив RECORD_DTYPE)"""
+        if len(records) == 0:
+            return
+        maps = records["map"].astype(np.intp)
+        brawlers = records["brawler"].astype(np.intp)
+        self._reserve(int(maps.max()) + 1, int(brawlers.max()) + 1)
+
+        wins = (records["result"] == VICTORY).astype(np.int32)
+        np.add.at(self.counts[:, :, 0], (maps, brawlers), 1)
+        np.add.at(self.counts[:, :, 1], (maps, brawlers), wins)
+        self.totals[:, 0] += np.bincount(maps, minlength=len(self.totals)).astype(np.int32)
+        self.totals[:, 1] += np.bincount(maps, weights=wins, minlength=len(self.totals)).astype(np.int32)
+        self.map_modes.update(zip(maps.tolist(), records["mode"].tolist()))
+
+    def copy(self) -> "PlayerMapMatrix":
+        matrix = PlayerMapMatrix()
+        matrix.counts = self.counts.copy()
+        matrix.totals = self.totals.copy()
+        matrix.map_modes = dict(self.map_modes)
+        return matrix
+
+    def map_totals(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self.totals[:, 0], self.totals[:, 1]
+
+    def top_maps(self, k: Optional[int], min_matches: int = 1, brawler_id: Optional[int] = None,
+                 worst: bool = False, sort: str = "win_rate",
+                 after: Optional[After] = None) -> List[Tuple[int, int, int]]:
+        """
+        Лучшие или худшие карты: [(map_id, matches, wins)]
+
+        brawler_id ограничивает статистику одним бойцом; sort и after — как в select().
+        """
+        if brawler_id is None:
+            matches, wins = self.map_totals()
+        elif brawler_id < self.counts.shape[1]:
+            matches, wins = self.counts[:, brawler_id, 0], self.counts[:, brawler_id, 1]
+        else:
+            return []
+        return self._ranking(matches, wins, k, min_matches, sort, worst, after)
+
+    def map_brawlers(self, map_id: int, k: Optional[int] = None, min_matches: int = 1,
+                     sort: str = "win_rate", after: Optional[After] = None) -> List[Tuple[int, int, int]]:
+        """Рейтинг бойцов на карте: [(brawler_id, matches, wins)]"""
+        if map_id >= self.counts.shape[0]:
+            return []
+        matches, wins = self.counts[map_id, :, 0], self.counts[map_id, :, 1]
+        return self._ranking(matches, wins, k, min_matches, sort, False, after)
+
+    @staticmethod
+    def _ranking(matches: np.ndarray, wins: np.ndarray, k: Optional[int], min_matches: int,
+                 sort: str, worst: bool, after: Optional[After]) -> List[Tuple[int, int, int]]:
+        eligible = np.flatnonzero(matches >= max(min_matches, 1))
+        chosen = eligible[select(eligible, matches[eligible], wins[eligible], k, sort, worst, after)]
+        return list(zip(chosen.tolist(), matches[chosen].tolist(), wins[chosen].tolist()))
+
+
+class MapEngine:
+    """
+    Матрицы карта × боец игроков поверх BattleStore с LRU по игрокам
+
+    Матрица плотная, и её размер зависит от того, на скольких картах и
+    какими бойцами играл игрок, поэтому LRU ограничен суммарным объёмом
+    матриц (max_bytes), а не числом игроков.
+    """
+
+    def __init__(self, store: BattleStore, max_bytes: int = 256 * 1024 * 1024):
+        self.store = store
+        self.max_bytes = max_bytes
+        self._players: "OrderedDict[str, PlayerMapMatrix]" = OrderedDict()
+        self._bytes = 0
+        store.add_listener(self._on_ingest)
+
+    def _evict(self):
+        # Последнюю (только что запрошенную) матрицу не вытесняем, даже если она одна больше лимита
+        while self._bytes > self.max_bytes and len(self._players) > 1:
+            _, matrix = self._players.popitem(last=False)
+            self._bytes -= matrix.nbytes
+
+    def _records(self, player_id: str) -> np.ndarray:
+        return np.fromiter(
+            self.store.iter_records(player_id),
+            dtype=RECORD_DTYPE,
+            count=self.store.battle_count(player_id)
+        )
+
+    def _on_ingest(self, player_id: str, battles: List[Battle]):
+        matrix = self._players.get(player_id)
+        if matrix is None:
+            return
+        # Новые бои — хвост записей игрока
+        records = np.fromiter(
+            self.store.iter_records(player_id, skip=self.store.battle_count(player_id) - len(battles)),
+            dtype=RECORD_DTYPE,
+            count=len(battles)
+        )
+        size = matrix.nbytes
+        matrix.add_records(records)
+        self._bytes += matrix.nbytes - size
+        self._evict()
+
+    def get(self, player_id: str) -> PlayerMapMatrix:
+        matrix = self._players.get(player_id)
+        if matrix is None:
+            matrix = PlayerMapMatrix()
+            matrix.add_records(self._records(player_id))
+            self._players[player_id] = matrix
+            self._bytes += matrix.nbytes
+            self._evict()
+        else:
+            self._players.move_to_end(player_id)
+        return matrix
+
+    # ----- Имена -----
+
+    def map_id(self, name: str) -> Optional[int]:
+        return self.store.symbols.ids["map"].get(name)
+
+    def brawler_id(self, name: str) -> Optional[int]:
+        return self.store.symbols.ids["brawler"].get(name)
+
+    def map_name(self, map_id: int) -> str:
+        return self.store.symbols.decode("map", map_id)
+
+    def brawler_name(self, brawler_id: int) -> str:
+        return self.store.symbols.decode("brawler", brawler_id)
+
+    def map_title(self, matrix: PlayerMapMatrix, map_id: int) -> str:
+        """«Gem Grab - Hard Rock Mine» по режиму последнего боя игрока на карте"""
+        name = self.map_name(map_id)
+        mode_id = matrix.map_modes.get(map_id)
+        if mode_id is None:
+            return name
+        return f"{mode_title(self.store.symbols.decode('mode', mode_id))} - {name}"
@@ -0,0 +1,294 @@
+"""
+Метрики в текстовом формате Prometheus
+
+Счётчики, гистограммы и gauge без внешних зависимостей. Горячий путь —
+observe()/inc() на уже созданном наборе меток: поиск бакета через bisect
+и пара сложений, без блокировок (всё выполняется в одном event loop).
+Кумулятивные бакеты считаются только при выдаче /metrics.
+
+MetricsMiddleware — ASGI-обёртка для API: время ответа и размер тела
+по шаблону маршрута (/analytics/{player_id}/brawlers), а не по пути,
+чтобы число рядов не росло с числом игроков.
+"""
+
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Metric:
+    """Семейство рядов одной метрики с набором меток labelnames"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Labels, object] = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Ряд с значениями меток values (создаётся при первом обращении)"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name}: ожидались метки {self.labelnames}, получено {values}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        """(суффикс имени, метки в формате Prometheus, значение)"""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(
+            f"{self.name}{suffix}{labels} {_format_value(value)}"
+            for suffix, labels, value in self.samples()
+        )
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Counter(Metric):
+    kind = "counter"
+    _new_child = _CounterChild
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield "_total", _format_labels(self.labelnames, values), child.value
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+    _new_child = _GaugeChild
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield "", _format_labels(self.labelnames, values), child.value
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # Последний элемент — значения больше верхней границы (+Inf)
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                yield "_bucket", _format_labels(self.labelnames, values, le), cumulative
+            yield "_sum", _format_labels(self.labelnames, values), child.sum
+            yield "_count", _format_labels(self.labelnames, values), cumulative
+
+
+class CallbackMetric(Metric):
+    """
+    Значения, которые снимаются в момент выдачи /metrics
+
+    func() возвращает пары (значения меток, число) — так экспортируются
+    счётчики, которые модули уже ведут сами (stats кэша, клиента API),
+    без лишней работы на горячем пути.
+    """
+
+    def __init__(self, name: str, documentation: str, kind: str,
+                 func: Callable[[], Iterable[Tuple[Labels, float]]], labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.func = func
+
+    def samples(self):
+        suffix = "_total" if self.kind == "counter" else ""
+        for values, value in self.func():
+            yield suffix, _format_labels(self.labelnames, values), float(value)
+
+
+class Registry:
+    """Набор метрик процесса; повторная регистрация имени заменяет метрику"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, kind: str,
+                 func: Callable[[], Iterable[Tuple[Labels, float]]],
+                 labelnames: Sequence[str] = ()) -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, kind, func, labelnames))
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> bytes:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return ("\n".join(lines) + "\n").encode()
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: длительность, размер тела и статусы HTTP-ответов
+
+    Маршрут берётся из scope["route"], который FastAPI заполняет при
+    сопоставлении; запросы мимо маршрутов попадают в route="unmatched".
+    Для потоковых ответов (SSE) длительность — время жизни потока.
+    """
+
+    def __init__(self, app, registry: Registry, prefix: str = "http"):
+        self.app = app
+        self.duration = registry.histogram(
+            f"{prefix}_request_duration_seconds", "Время обработки запроса", ("route", "method")
+        )
+        self.size = registry.histogram(
+            f"{prefix}_response_size_bytes", "Размер тела ответа", ("route", "method"), SIZE_BUCKETS
+        )
+        self.requests = registry.counter(
+            f"{prefix}_requests", "Ответы по статусам", ("route", "method", "status")
+        )
+        self.in_progress = registry.gauge(f"{prefix}_requests_in_progress", "Запросы в обработке")
+        # Ряды по (маршрут, метод, статус) одним поиском в словаре
+        self._series: Dict[Tuple[str, str, int], tuple] = {}
+
+    def _series_for(self, route: str, method: str, status: int) -> tuple:
+        series = self._series[(route, method, status)] = (
+            self.duration.labels(route, method),
+            self.size.labels(route, method),
+            self.requests.labels(route, method, str(status))
+        )
+        return series
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            elif message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = self.in_progress.labels()
+        in_progress.value += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_progress.value -= 1
+            route = scope.get("route")
+            key = (route.path if route is not None else "unmatched", scope["method"], status)
+            series = self._series.get(key) or self._series_for(*key)
+            series[0].observe(time.perf_counter() - started)
+            series[1].observe(size)
+            series[2].value += 1
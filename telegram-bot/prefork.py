@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Многопроцессный запуск API (pre-fork)
+
+Мастер открывает слушающий сокет API_HOST:API_PORT и порождает через fork:
+- процесс-писатель (API_ROLE=writer): хранилище боёв, агрегаты,
+  синхронизации с Brawl Stars API; слушает только unix-сокет
+  settings.writer_socket и после каждой записи публикует снимок агрегатов
+  (snapshot.py);
+- N воркеров (API_ROLE=worker) на общем сокете: отвечают на запросы
+  аналитики по снимку в общей памяти, /admin/sync передают писателю.
+
+Ядро распределяет соединения между воркерами, которые принимают их с
+одного сокета. Мастер сам ничего не обслуживает и не импортирует api:
+он перезапускает упавшие процессы и по SIGTERM/SIGINT останавливает
+сначала воркеров, затем писателя.
+
+Только Linux/macOS (fork, unix-сокеты). Для разработки — python api.py.
+
+Запуск:
+    python prefork.py --workers 4
+"""
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Optional
+
+from config import settings
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except:
+        pass
+
+RESPAWN_DELAY = 1.0  # секунд перед перезапуском упавшего процесса
+POLL_INTERVAL = 0.2
+
+
+def run_child(role: str, sock: Optional[socket.socket]):
+    """Тело дочернего процесса: uvicorn с api.app в роли role"""
+    for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGCHLD):
+        signal.signal(sig, signal.SIG_DFL)
+    settings.API_ROLE = role
+
+    import uvicorn
+
+    import api
+
+    if role == "writer":
+        config = uvicorn.Config(api.app, uds=settings.writer_socket, log_level="warning", access_log=False)
+        uvicorn.Server(config).run()
+    else:
+        config = uvicorn.Config(api.app, log_level="warning", access_log=False)
+        uvicorn.Server(config).run(sockets=[sock])
+
+
+class Master:
+    """Порождение, перезапуск и остановка писателя и воркеров"""
+
+    def __init__(self, workers: int, host: str, port: int, shutdown_timeout: float):
+        self.workers = workers
+        self.shutdown_timeout = shutdown_timeout
+        self.sock = socket.create_server((host, port), backlog=2048)
+        self.sock.set_inheritable(True)
+        self.writer_pid: Optional[int] = None
+        self.worker_pids: Dict[int, int] = {}  # pid -> номер воркера
+        self.stopping = False
+
+    def _fork(self, role: str) -> int:
+        pid = os.fork()
+        if pid:
+            return pid
+
+        code = 0
+        try:
+            if role == "writer":
+                self.sock.close()
+                run_child(role, None)
+            else:
+                run_child(role, self.sock)
+        except BaseException as e:
+            print(f"[{role} {os.getpid()}] {e!r}", flush=True)
+            code = 1
+        finally:
+            sys.stdout.flush()
+            os._exit(code)
+
+    def spawn_writer(self):
+        # Сокет от прошлого запуска мешает bind
+        if os.path.exists(settings.writer_socket):
+            os.unlink(settings.writer_socket)
+        self.writer_pid = self._fork("writer")
+        print(f"Писатель запущен (pid {self.writer_pid})", flush=True)
+
+    def spawn_worker(self, number: int):
+        pid = self._fork("worker")
+        self.worker_pids[pid] = number
+        print(f"Воркер #{number} запущен (pid {pid})", flush=True)
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+
+    def _reap(self):
+        """Подобрать завершившиеся процессы и перезапустить их"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+
+            code = os.waitstatus_to_exitcode(status)
+            if self.stopping:
+                continue
+            time.sleep(RESPAWN_DELAY)
+            if pid == self.writer_pid:
+                print(f"Писатель завершился с кодом {code}, перезапуск", flush=True)
+                self.spawn_writer()
+            elif pid in self.worker_pids:
+                number = self.worker_pids.pop(pid)
+                print(f"Воркер #{number} завершился с кодом {code}, перезапуск", flush=True)
+                self.spawn_worker(number)
+
+    def _terminate(self, pids, timeout: float):
+        """SIGTERM процессам pids, по истечении timeout — SIGKILL"""
+        pending = set(pids)
+        for pid in pending:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        deadline = time.monotonic() + timeout
+        while pending:
+            for pid in list(pending):
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    done = pid
+                if done:
+                    pending.discard(pid)
+            if not pending:
+                return
+            if time.monotonic() >= deadline:
+                for pid in pending:
+                    print(f"Процесс {pid} не завершился за {timeout:.0f} с, SIGKILL", flush=True)
+                    os.kill(pid, signal.SIGKILL)
+                    os.waitpid(pid, 0)
+                return
+            time.sleep(0.05)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        self.spawn_writer()
+        for number in range(1, self.workers + 1):
+            self.spawn_worker(number)
+
+        try:
+            while not self.stopping:
+                self._reap()
+                time.sleep(POLL_INTERVAL)
+        finally:
+            print("Остановка...", flush=True)
+            # Воркеры первыми: они передают синхронизации писателю
+            self._terminate(list(self.worker_pids), self.shutdown_timeout)
+            if self.writer_pid is not None:
+                self._terminate([self.writer_pid], self.shutdown_timeout)
+            self.sock.close()
+            print("Все процессы остановлены", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Многопроцессный запуск API")
+    parser.add_argument("--workers", type=int, default=settings.API_WORKERS or os.cpu_count() or 1)
+    parser.add_argument("--host", default=settings.API_HOST)
+    parser.add_argument("--port", type=int, default=settings.API_PORT)
+    parser.add_argument("--shutdown-timeout", type=float, default=10.0, help="секунд на завершение после SIGTERM")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        print("prefork.py работает только на Linux/macOS, используйте python api.py")
+        sys.exit(1)
+
+    master = Master(args.workers, args.host, args.port, args.shutdown_timeout)
+    print(f"API: http://{args.host}:{args.port}, воркеров: {args.workers}, писатель: {settings.writer_socket}",
+          flush=True)
+    master.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Ограничители частоты запросов
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+
+class TokenBucket:
+    """
+    Асинхронный token bucket
+
+    rate токенов в секунду, не больше capacity накопленных. Ожидающие
+    acquire() обслуживаются по очереди, так что бюджет не превышается
+    даже при сотнях конкурентных корутин.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    async def acquire(self, tokens: float = 1):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Не выдавать токены ближайшие seconds секунд (например, после 429)"""
+        self._refill()
+        # Повторные 429 не складываются: пауза отсчитывается от последнего
+        self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+class Cooldown:
+    """
+    Не чаще одного раза в interval секунд на ключ (например, на пользователя)
+
+    Ключи хранятся в порядке последнего срабатывания, поэтому истёкшие
+    удаляются с начала, и память не растёт от разовых пользователей.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._last: "OrderedDict[Hashable, float]" = OrderedDict()
+
+    def _expire(self, now: float):
+        while self._last:
+            key, last = next(iter(self._last.items()))
+            if now - last < self.interval:
+                break
+            del self._last[key]
+
+    def hit(self, key: Hashable) -> float:
+        """0, если действие разрешено (и засчитано), иначе сколько секунд ждать"""
+        now = time.monotonic()
+        self._expire(now)
+        last = self._last.get(key)
+        if last is not None:
+            return self.interval - (now - last)
+        self._last[key] = now
+        return 0.0
+
+    def __len__(self) -> int:
+        return len(self._last)
@@ -0,0 +1,213 @@
+"""
+Дневные роллапы боёв на префиксных суммах (NumPy)
+
+Для каждого игрока хранятся накопленные суммы matches/wins по дням:
+матрицы (бойцы × (дни + 1)), где cum[b, i] — сумма за дни [0, i).
+Тогда сумма за любое окно — это разность двух элементов, а ряд по дням,
+неделям или месяцам — np.diff по границам корзин, без циклов по дням.
+
+Роллап игрока строится лениво при первом запросе одним чтением его боёв
+и затем обновляется при записи новых боёв. Число игроков в памяти
+ограничено LRU.
+"""
+
+from collections import OrderedDict
+from datetime import date
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from storage import Battle, BattleStore
+
+DAY = 86400
+GRANULARITIES = ("day", "week", "month")
+
+
+def epoch_day(value: date) -> int:
+    return (value - date(1970, 1, 1)).days
+
+
+def bucket_bounds(first_day: int, last_day: int, granularity: str) -> np.ndarray:
+    """
+    Границы корзин для окна [first_day, last_day] (эпохальные дни)
+
+    Первая корзина начинается с first_day, даже если неделя или месяц
+    начались раньше; последняя граница — last_day + 1.
+    """
+    if granularity == "day":
+        return np.arange(first_day, last_day + 2, dtype=np.int64)
+
+    if granularity == "week":
+        # 1970-01-05 (день 4) — понедельник
+        first_monday = first_day - (first_day - 4) % 7 + 7
+        starts = np.arange(first_monday, last_day + 1, 7, dtype=np.int64)
+    elif granularity == "month":
+        first_month = np.datetime64(first_day, "D").astype("datetime64[M]") + 1
+        last_month = np.datetime64(last_day, "D").astype("datetime64[M]") + 1
+        starts = np.arange(first_month, last_month).astype("datetime64[D]").astype(np.int64)
+    else:
+        raise ValueError(f"Unknown granularity: {granularity}")
+
+    return np.concatenate(([first_day], starts, [last_day + 1])).astype(np.int64)
+
+
+def bucket_labels(bounds: np.ndarray) -> List[str]:
+    """Дата начала каждой корзины в формате YYYY-MM-DD"""
+    return np.datetime_as_string(bounds[:-1].astype("datetime64[D]")).tolist()
+
+
+@lru_cache(maxsize=1024)
+def window_buckets(first_day: int, last_day: int, granularity: str) -> Tuple[np.ndarray, Tuple[str, ...]]:
+    """
+    Границы и подписи корзин окна
+
+    Окна повторяются весь день (days=7/30/365 от сегодняшней даты), поэтому
+    результат кэшируется; массив границ только для чтения.
+    """
+    bounds = bucket_bounds(first_day, last_day, granularity)
+    bounds.flags.writeable = False
+    return bounds, tuple(bucket_labels(bounds))
+
+
+class PlayerRollup:
+    """Префиксные суммы одного игрока"""
+
+    def __init__(self):
+        self.first_day: Optional[int] = None
+        self.days = 0
+        self.rows: Dict[str, int] = {}
+        self.cum_matches = np.zeros((0, 1), dtype=np.int32)
+        self.cum_wins = np.zeros((0, 1), dtype=np.int32)
+
+    def _reserve(self, rows: int, days: int):
+        """Расширить матрицы: новые столбцы продолжают последнюю сумму"""
+        old_rows, old_width = self.cum_matches.shape
+        if rows <= old_rows and days + 1 <= old_width:
+            return
+
+        width = max(old_width, days + 1)
+        if days + 1 > old_width:
+            # Запас, чтобы не копировать матрицы на каждый новый день
+            width = max(days + 1, int(old_width * 1.25) + 7)
+        height = max(rows, old_rows)
+
+        for name in ("cum_matches", "cum_wins"):
+            old = getattr(self, name)
+            new = np.zeros((height, width), dtype=np.int32)
+            new[:old_rows, :old_width] = old
+            if old_rows:
+                new[:old_rows, old_width:] = old[:, old_width - 1:old_width]
+            setattr(self, name, new)
+
+    def add(self, battles: List[Battle]):
+        if not battles:
+            return
+
+        rows = np.fromiter(
+            (self.rows.setdefault(b.brawler, len(self.rows)) for b in battles),
+            dtype=np.int64, count=len(battles)
+        )
+        days = np.fromiter((b.timestamp // DAY for b in battles), dtype=np.int64, count=len(battles))
+        wins = np.fromiter((b.is_win for b in battles), dtype=np.int32, count=len(battles))
+
+        if self.first_day is None:
+            self.first_day = int(days.min())
+        columns = days - self.first_day
+        first_column = int(columns.min())
+        last_column = int(columns.max())
+
+        previous_days = self.days
+        self.days = max(self.days, last_column + 1)
+        self._reserve(len(self.rows), self.days)
+
+        # Новые столбцы продолжают сумму последнего заполненного дня
+        if self.days > previous_days:
+            for cum in (self.cum_matches, self.cum_wins):
+                cum[:, previous_days + 1:self.days + 1] = cum[:, previous_days:previous_days + 1]
+
+        span = last_column - first_column + 1
+        for cum, values in ((self.cum_matches, None), (self.cum_wins, wins)):
+            delta = np.zeros((len(self.rows), span), dtype=np.int32)
+            np.add.at(delta, (rows, columns - first_column), 1 if values is None else values)
+            running = np.cumsum(delta, axis=1)
+            cum[:len(self.rows), first_column + 1:last_column + 2] += running
+            cum[:len(self.rows), last_column + 2:] += running[:, -1:]
+
+    def copy(self, brawlers: Optional[List[str]] = None) -> "PlayerRollup":
+        """Независимая копия (только строки brawlers, если заданы)"""
+        rollup = PlayerRollup()
+        rollup.first_day = self.first_day
+        rollup.days = self.days
+        names = [b for b in (self.rows if brawlers is None else brawlers) if b in self.rows]
+        rollup.rows = {name: i for i, name in enumerate(names)}
+        index = [self.rows[name] for name in names]
+        rollup.cum_matches = self.cum_matches[index, :self.days + 1]
+        rollup.cum_wins = self.cum_wins[index, :self.days + 1]
+        return rollup
+
+    def buckets(self, brawler: str, bounds: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """matches и wins бойца в корзинах [bounds[i], bounds[i + 1])"""
+        row = self.rows.get(brawler)
+        if row is None or self.first_day is None:
+            zeros = np.zeros(len(bounds) - 1, dtype=np.int32)
+            return zeros, zeros
+
+        index = np.clip(bounds - self.first_day, 0, self.days)
+        return np.diff(self.cum_matches[row, index]), np.diff(self.cum_wins[row, index])
+
+    def _column(self, day: int) -> int:
+        return min(max(day - self.first_day, 0), self.days)
+
+    def window(self, brawler: str, first_day: int, last_day: int) -> Tuple[int, int]:
+        """Сумма matches и wins бойца за окно за O(1)"""
+        row = self.rows.get(brawler)
+        if row is None or self.first_day is None:
+            return 0, 0
+        start, end = self._column(first_day), self._column(last_day + 1)
+        return (
+            int(self.cum_matches[row, end] - self.cum_matches[row, start]),
+            int(self.cum_wins[row, end] - self.cum_wins[row, start])
+        )
+
+    def window_all(self, first_day: int, last_day: int) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """Суммы за окно сразу по всем бойцам: (бойцы, matches, wins)"""
+        brawlers = list(self.rows)
+        if self.first_day is None:
+            zeros = np.zeros(0, dtype=np.int32)
+            return brawlers, zeros, zeros
+        start, end = self._column(first_day), self._column(last_day + 1)
+        rows = len(brawlers)
+        return (
+            brawlers,
+            self.cum_matches[:rows, end] - self.cum_matches[:rows, start],
+            self.cum_wins[:rows, end] - self.cum_wins[:rows, start]
+        )
+
+
+class RollupStore:
+    """Роллапы игроков поверх BattleStore с LRU по игрокам"""
+
+    def __init__(self, store: BattleStore, max_players: int = 2000):
+        self.store = store
+        self.max_players = max_players
+        self._players: "OrderedDict[str, PlayerRollup]" = OrderedDict()
+        store.add_listener(self._on_ingest)
+
+    def _on_ingest(self, player_id: str, battles: List[Battle]):
+        # Игроки не в памяти будут построены целиком при первом запросе
+        rollup = self._players.get(player_id)
+        if rollup is not None:
+            rollup.add(battles)
+
+    def get(self, player_id: str) -> PlayerRollup:
+        rollup = self._players.get(player_id)
+        if rollup is None:
+            rollup = PlayerRollup()
+            rollup.add(self.store.read_player(player_id))
+            self._players[player_id] = rollup
+            while len(self._players) > self.max_players:
+                self._players.popitem(last=False)
+        else:
+            self._players.move_to_end(player_id)
+        return rollup
@@ -1,15 +1,26 @@
 #!/usr/bin/env python3
 """
 Скрипт для одновременного запуска API и бота
+
+Супервизор на asyncio:
+- вывод каждого процесса читается построчно и печатается с префиксом
+  [API] / [Bot], поэтому pipe не переполняется и дочерние процессы не
+  блокируются на логировании;
+- бот запускается только после того, как API ответил на /health;
+- упавший процесс перезапускается с экспоненциальной задержкой (сбрасывается,
+  если процесс проработал дольше STABLE_AFTER секунд);
+- Ctrl+C / SIGTERM: процессам отправляется SIGTERM (бот первым), через
+  --shutdown-timeout секунд оставшиеся завершаются принудительно.
 """
 
+import argparse
 import asyncio
-import subprocess
+import os
+import signal
 import sys
 import time
-import signal
-import os
 from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
 
 # Fix Windows encoding
 if sys.platform == 'win32':
@@ -32,16 +43,17 @@ class Colors:
 
 def print_colored(text: str, color: str):
     try:
-        print(f"{color}{text}{Colors.ENDC}")
+        print(f"{color}{text}{Colors.ENDC}", flush=True)
     except UnicodeEncodeError:
         # Fallback без эмоджи
-        print(text.encode('ascii', 'ignore').decode())
+        print(text.encode('ascii', 'ignore').decode(), flush=True)
 
 
 def check_requirements():
     """Проверить установлены ли зависимости"""
     try:
         import aiogram
+        import aiohttp
         import fastapi
         import uvicorn
         return True
@@ -49,113 +61,263 @@ def check_requirements():
         return False
 
 
+LINE_LIMIT = 1024 * 1024  # байт на строку вывода
+STABLE_AFTER = 30.0  # секунд работы, после которых счётчик падений сбрасывается
+
+
+class Child:
+    """Дочерний процесс под присмотром супервизора"""
+
+    def __init__(
+        self,
+        name: str,
+        args: List[str],
+        color: str,
+        probe: Optional[Callable[[], Awaitable[bool]]] = None,
+        depends_on: Optional["Child"] = None
+    ):
+        self.name = name
+        self.args = args
+        self.color = color
+        self.probe = probe
+        self.depends_on = depends_on
+        self.process: Optional[asyncio.subprocess.Process] = None
+        # Установлен, пока процесс жив и прошёл проверку готовности
+        self.ready = asyncio.Event()
+        self.restarts = 0
+
+    def log(self, text: str, color: Optional[str] = None):
+        print_colored(f"[{self.name}] {text}", color or self.color)
+
+    async def drain(self):
+        """Печатать вывод процесса построчно, пока он не закроет pipe"""
+        stream = self.process.stdout
+        while True:
+            try:
+                line = await stream.readline()
+            except ValueError:
+                # asyncio отбрасывает строку длиннее LINE_LIMIT, чтение продолжается со следующей
+                self.log(f"<строка длиннее {LINE_LIMIT} байт пропущена>", Colors.WARNING)
+                continue
+            if not line:
+                return
+            self.log(line.decode(errors="replace").rstrip())
+
+
+class Supervisor:
+    """Запуск, перезапуск и остановка дочерних процессов"""
+
+    def __init__(self, children: List[Child], ready_timeout: float, shutdown_timeout: float,
+                 backoff_base: float, backoff_max: float):
+        self.children = children
+        self.ready_timeout = ready_timeout
+        self.shutdown_timeout = shutdown_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stopping = asyncio.Event()
+
+    async def _sleep_or_stop(self, delay: float) -> bool:
+        """Подождать delay секунд; True — за это время началась остановка"""
+        try:
+            await asyncio.wait_for(self.stopping.wait(), delay)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _wait_ready(self, child: Child) -> bool:
+        """Опрашивать probe, пока он не ответит, процесс не упадёт или не истечёт ready_timeout"""
+        deadline = time.monotonic() + self.ready_timeout
+        while time.monotonic() < deadline:
+            if child.process.returncode is not None:
+                return False
+            if await child.probe():
+                return True
+            if await self._sleep_or_stop(0.2):
+                return False
+        child.log(f"не ответил на проверку готовности за {self.ready_timeout:.0f} с", Colors.WARNING)
+        return False
+
+    async def _run_once(self, child: Child) -> float:
+        """Запустить процесс и дождаться его завершения; возвращает время работы"""
+        env = dict(os.environ, PYTHONUNBUFFERED="1")
+        child.process = await asyncio.create_subprocess_exec(
+            *child.args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            env=env,
+            limit=LINE_LIMIT
+        )
+        started = time.monotonic()
+        child.log(f"запущен (pid {child.process.pid})", Colors.OKGREEN)
+        drain = asyncio.create_task(child.drain())
+
+        try:
+            if child.probe is not None:
+                if await self._wait_ready(child):
+                    child.ready.set()
+                    child.log("готов", Colors.OKGREEN)
+                elif child.process.returncode is None and not self.stopping.is_set():
+                    # Завис на старте — перезапуск
+                    child.process.kill()
+            else:
+                child.ready.set()
+
+            await child.process.wait()
+            await drain
+        finally:
+            child.ready.clear()
+        return time.monotonic() - started
+
+    async def supervise(self, child: Child):
+        """Держать процесс запущенным до остановки супервизора"""
+        failures = 0
+        while not self.stopping.is_set():
+            if child.depends_on is not None and not child.depends_on.ready.is_set():
+                child.log(f"ждёт готовности {child.depends_on.name}...", Colors.OKCYAN)
+                waiter = asyncio.create_task(child.depends_on.ready.wait())
+                stopper = asyncio.create_task(self.stopping.wait())
+                await asyncio.wait({waiter, stopper}, return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                stopper.cancel()
+                if self.stopping.is_set():
+                    return
+
+            uptime = await self._run_once(child)
+            if self.stopping.is_set():
+                return
+
+            failures = 1 if uptime >= STABLE_AFTER else failures + 1
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (failures - 1))
+            child.restarts += 1
+            child.log(
+                f"завершился с кодом {child.process.returncode} после {uptime:.1f} с, "
+                f"перезапуск через {delay:.1f} с",
+                Colors.FAIL
+            )
+            if await self._sleep_or_stop(delay):
+                return
+
+    async def shutdown(self):
+        """SIGTERM всем процессам в обратном порядке запуска, по истечении срока — SIGKILL"""
+        self.stopping.set()
+        running = [
+            child for child in reversed(self.children)
+            if child.process is not None and child.process.returncode is None
+        ]
+        for child in running:
+            child.log("остановка...", Colors.OKCYAN)
+            try:
+                child.process.terminate()
+            except ProcessLookupError:
+                pass
+
+        deadline = time.monotonic() + self.shutdown_timeout
+        for child in running:
+            try:
+                await asyncio.wait_for(child.process.wait(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                child.log(f"не завершился за {self.shutdown_timeout:.0f} с, SIGKILL", Colors.FAIL)
+                child.process.kill()
+                await child.process.wait()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stopping.set)
+            except (NotImplementedError, RuntimeError):
+                # Windows: Ctrl+C придёт как KeyboardInterrupt/отмена задачи
+                pass
+
+        tasks = [asyncio.create_task(self.supervise(child)) for child in self.children]
+        try:
+            await self.stopping.wait()
+        finally:
+            await self.shutdown()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def http_probe(url: str) -> Callable[[], Awaitable[bool]]:
+    import aiohttp
+
+    timeout = aiohttp.ClientTimeout(total=1)
+
+    async def probe() -> bool:
+        try:
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                async with session.get(url) as response:
+                    return response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+            return False
+
+    return probe
+
+
+async def supervise(args):
+    from config import settings
+
+    host = "127.0.0.1" if settings.API_HOST in ("0.0.0.0", "::") else settings.API_HOST
+    api = Child(
+        "API", [sys.executable, "api.py"], Colors.OKBLUE,
+        probe=http_probe(f"http://{host}:{settings.API_PORT}/health")
+    )
+    bot = Child("Bot", [sys.executable, "bot.py"], Colors.OKCYAN, depends_on=api)
+
+    print_colored(f"📊 API: http://localhost:{settings.API_PORT}", Colors.OKBLUE)
+    print_colored(f"📚 API Docs: http://localhost:{settings.API_PORT}/docs", Colors.OKBLUE)
+    print_colored("Нажмите Ctrl+C для остановки", Colors.WARNING)
+    print()
+
+    supervisor = Supervisor(
+        [api, bot],
+        ready_timeout=args.ready_timeout,
+        shutdown_timeout=args.shutdown_timeout,
+        backoff_base=args.backoff_base,
+        backoff_max=args.backoff_max
+    )
+    await supervisor.run()
+    print_colored("✅ Все сервисы остановлены", Colors.OKGREEN)
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Запуск API и бота под супервизором")
+    parser.add_argument("--ready-timeout", type=float, default=30.0, help="секунд на ответ /health после старта API")
+    parser.add_argument("--shutdown-timeout", type=float, default=10.0, help="секунд на завершение после SIGTERM")
+    parser.add_argument("--backoff-base", type=float, default=1.0, help="первая задержка перезапуска, с")
+    parser.add_argument("--backoff-max", type=float, default=60.0, help="максимальная задержка перезапуска, с")
+    args = parser.parse_args()
+
     print_colored("=" * 60, Colors.HEADER)
     print_colored("🎮 Brawl Stars Analytics Bot", Colors.HEADER + Colors.BOLD)
     print_colored("=" * 60, Colors.HEADER)
     print()
-    
+
     # Проверка зависимостей
     if not check_requirements():
         print_colored("❌ Не установлены зависимости!", Colors.FAIL)
         print_colored("Запустите: pip install -r requirements.txt", Colors.WARNING)
         sys.exit(1)
-    
+
     print_colored("✅ Зависимости установлены", Colors.OKGREEN)
     print()
-    
+
+    # Процессы запускаются из каталога скрипта, там же ищется .env
+    os.chdir(Path(__file__).parent)
+
     # Проверка .env файла
     if not Path(".env").exists():
         print_colored("⚠️  Файл .env не найден!", Colors.WARNING)
         print_colored("Скопируйте .env.example в .env и настройте", Colors.WARNING)
         sys.exit(1)
-    
+
     print_colored("✅ Файл .env найден", Colors.OKGREEN)
     print()
-    
-    processes = []
-    
+
     try:
-        # Проверяем что мы в правильной директории
-        script_dir = Path(__file__).parent
-        os.chdir(script_dir)
-        
-        # Запуск API сервера
-        print_colored("Запуск API сервера...", Colors.OKCYAN)
-        api_process = subprocess.Popen(
-            [sys.executable, "api.py"],
-            cwd=script_dir,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1
-        )
-        processes.append(("API", api_process))
-        time.sleep(3)  # Даем время API серверу запуститься
-        
-        if api_process.poll() is not None:
-            print_colored("API сервер не запустился", Colors.FAIL)
-            print_colored("Попробуйте запустить вручную: python telegram-bot/api.py", Colors.WARNING)
-            sys.exit(1)
-        
-        print_colored("✅ API сервер запущен на http://localhost:3000", Colors.OKGREEN)
-        print()
-        
-        # Запуск Telegram бота
-        print_colored("🤖 Запуск Telegram бота...", Colors.OKCYAN)
-        bot_process = subprocess.Popen(
-            [sys.executable, "bot.py"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1
-        )
-        processes.append(("Bot", bot_process))
-        time.sleep(2)
-        
-        if bot_process.poll() is not None:
-            print_colored("❌ Бот не запустился", Colors.FAIL)
-            sys.exit(1)
-        
-        print_colored("✅ Telegram бот запущен", Colors.OKGREEN)
-        print()
-        
-        print_colored("=" * 60, Colors.HEADER)
-        print_colored("✅ Все сервисы запущены!", Colors.OKGREEN + Colors.BOLD)
-        print_colored("=" * 60, Colors.HEADER)
-        print()
-        
-        print_colored("📊 API: http://localhost:3000", Colors.OKBLUE)
-        print_colored("📚 API Docs: http://localhost:3000/docs", Colors.OKBLUE)
-        print_colored("🤖 Telegram бот: @YourBotName", Colors.OKBLUE)
-        print()
-        
-        print_colored("Нажмите Ctrl+C для остановки", Colors.WARNING)
-        print()
-        
-        # Ожидание
-        while True:
-            time.sleep(1)
-            
-            # Проверка что процессы живы
-            for name, process in processes:
-                if process.poll() is not None:
-                    print_colored(f"❌ {name} завершился!", Colors.FAIL)
-                    raise KeyboardInterrupt
-    
+        asyncio.run(supervise(args))
     except KeyboardInterrupt:
-        print()
-        print_colored("🛑 Остановка сервисов...", Colors.WARNING)
-        
-        for name, process in processes:
-            print_colored(f"Остановка {name}...", Colors.OKCYAN)
-            process.terminate()
-            try:
-                process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                process.kill()
-        
-        print_colored("✅ Все сервисы остановлены", Colors.OKGREEN)
+        # Windows без обработчиков сигналов: shutdown() уже выполнен в finally
+        pass
 
 
 if __name__ == "__main__":
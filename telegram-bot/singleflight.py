@@ -0,0 +1,42 @@
+"""
+Схлопывание одинаковых параллельных вызовов (single flight)
+
+Пока вызов по ключу выполняется, остальные вызовы с тем же ключом не
+запускают свой, а ждут и получают тот же результат (или то же
+исключение). Вызов идёт в отдельной задаче: отмена одного из ожидающих
+не отменяет его для остальных.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Не больше одного выполняющегося вызова на ключ"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.stats = {"calls": 0, "shared": 0}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            self.stats["calls"] += 1
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+        else:
+            self.stats["shared"] += 1
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Результат мог остаться без ожидающих (все отменены) — не ругаться в лог
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,677 @@
+"""
+Снимки агрегатов в общей памяти для многопроцессного API
+
+В режиме pre-fork (prefork.py) бои пишет один процесс-писатель, а запросы
+обслуживают N воркеров. Писатель публикует для каждого игрока блоб со
+счётчиками бойцов, префиксными суммами роллапа и счётчиками карта × боец;
+воркеры отображают файлы снимка в память (mmap) только для чтения. Данные
+лежат в page cache один раз на машину, а массивы NumPy в воркере — это
+представления поверх mmap, без копирования и разбора JSON.
+
+Структура каталога DATA_DIR/snapshot:
+    CURRENT                 - номер текущего поколения (u64)
+    heap-NNNNNN.dat         - блобы игроков, только дописываются
+    index-NNNNNNNNNNNN.idx  - индекс поколения: словари, хеши игроков → блоб
+
+Публикация: новые блобы дописываются в heap, индекс поколения пишется во
+временный файл и переименовывается, и только после этого в CURRENT
+записывается новый номер. Воркер сверяет номер при каждом обращении и
+переоткрывает индекс, поэтому видит либо старое поколение, либо новое
+целиком. Когда старых версий блобов в heap становится больше, чем живых,
+heap переписывается заново. На запуске писатель публикует устаревших
+игроков пачками (SnapshotPublisher.backfill): блобы сразу уходят в heap,
+и в памяти не бывает больше одной пачки, но в индекс они попадают только
+общим поколением в конце. Синхронизации во время заполнения публикуют
+только своих игроков, а первое поколение — это всегда заполнение целиком.
+
+Работает только на POSIX: удалённые файлы остаются доступны процессам,
+которые их уже отобразили.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from aggregates import AggregateStore, PlayerAggregates
+from map_engine import MapEngine, PlayerMapMatrix
+from rollups import PlayerRollup, RollupStore
+from storage import SYMBOL_KINDS, BattleStore
+
+logger = logging.getLogger(__name__)
+
+CONTROL = struct.Struct("<Q")
+# magic, поколение, id heap, байт heap в поколении, игроков, длина словарей (JSON)
+INDEX_HEADER = struct.Struct("<8sQQQQQ")
+INDEX_MAGIC = b"BSSNAP01"
+# длина id, бойцов, версия, первый день роллапа (-1 — нет), дней, строк роллапа, пар карта × боец, карт с режимом
+BLOB_HEADER = struct.Struct("<IiqqiiII")
+
+# Heap переписывается, когда мусор превышает живые данные и этот запас
+COMPACT_SLACK = 64 * 1024 * 1024
+OPEN_RETRIES = 5
+
+Location = Tuple[int, int, int]  # id heap, смещение, длина
+
+
+def _pad(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def player_hash(player_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(player_id.encode(), digest_size=8).digest(), "little")
+
+
+def _index_name(generation: int) -> str:
+    return f"index-{generation:012d}.idx"
+
+
+def _heap_name(heap_id: int) -> str:
+    return f"heap-{heap_id:06d}.dat"
+
+
+def pack_player(player_id: str, version: int, brawlers: np.ndarray, rollup_ids: np.ndarray,
+                rollup: PlayerRollup, maps: np.ndarray, modes: np.ndarray) -> bytes:
+    """
+    Блоб игрока: заголовок, id и массивы int32, каждый выровнен на 8 байт
+
+    brawlers   (n × 3) - brawler_id, matches, wins
+    rollup_ids (rows)  - brawler_id строк роллапа
+    cum_matches, cum_wins (rows × (days + 1)) - префиксные суммы роллапа
+    maps       (n × 4) - map_id, brawler_id, matches, wins (ненулевые ячейки)
+    modes      (n × 2) - map_id, mode_id последнего боя на карте
+    """
+    rows = len(rollup_ids)
+    raw_id = player_id.encode()
+    parts = [
+        BLOB_HEADER.pack(
+            len(raw_id), len(brawlers), version,
+            -1 if rollup.first_day is None else rollup.first_day, rollup.days, rows, len(maps), len(modes)
+        ),
+        raw_id.ljust(_pad(len(raw_id)), b"\0"),
+    ]
+    for array in (brawlers, rollup_ids, rollup.cum_matches[:rows, :rollup.days + 1],
+                  rollup.cum_wins[:rows, :rollup.days + 1], maps, modes):
+        data = np.ascontiguousarray(array, dtype="<i4").tobytes()
+        parts.append(data.ljust(_pad(len(data)), b"\0"))
+    return b"".join(parts)
+
+
+def blob_identity(buffer, offset: int) -> Tuple[str, int]:
+    """(player_id, версия) блоба по смещению offset"""
+    id_len, _, version = BLOB_HEADER.unpack_from(buffer, offset)[:3]
+    start = offset + BLOB_HEADER.size
+    return bytes(buffer[start:start + id_len]).decode(), version
+
+
+class SnapshotSymbols:
+    """Словари имён поколения с интерфейсом SymbolTable (names, ids, decode)"""
+
+    def __init__(self, names: Dict[str, List[str]]):
+        self.names = {kind: list(names.get(kind, ())) for kind in SYMBOL_KINDS}
+        self.ids = {kind: {name: i for i, name in enumerate(self.names[kind])} for kind in SYMBOL_KINDS}
+
+    def decode(self, kind: str, symbol_id: int) -> str:
+        return self.names[kind][symbol_id]
+
+
+class SnapshotPlayer:
+    """Блоб игрока в отображённом heap; структуры API строятся лениво и запоминаются"""
+
+    __slots__ = ("location", "version", "symbols", "brawlers", "rollup_ids", "cum_matches", "cum_wins",
+                 "first_day", "days", "maps", "modes", "_aggregates", "_rollup", "_matrix")
+
+    def __init__(self, buffer, location: Location, symbols: SnapshotSymbols):
+        _, offset, _ = location
+        id_len, brawlers, version, first_day, days, rows, maps, modes = BLOB_HEADER.unpack_from(buffer, offset)
+        self.location = location
+        self.version = version
+        self.symbols = symbols
+        self.first_day = None if first_day < 0 else first_day
+        self.days = days
+        position = offset + BLOB_HEADER.size + _pad(id_len)
+
+        def take(*shape: int) -> np.ndarray:
+            nonlocal position
+            count = int(np.prod(shape))
+            array = np.frombuffer(buffer, dtype="<i4", count=count, offset=position).reshape(shape)
+            position += _pad(count * 4)
+            return array
+
+        self.brawlers = take(brawlers, 3)
+        self.rollup_ids = take(rows)
+        self.cum_matches = take(rows, days + 1)
+        self.cum_wins = take(rows, days + 1)
+        self.maps = take(maps, 4)
+        self.modes = take(modes, 2)
+        self._aggregates = self._rollup = self._matrix = None
+
+    def aggregates(self) -> PlayerAggregates:
+        if self._aggregates is None:
+            names = self.symbols.names["brawler"]
+            self._aggregates = PlayerAggregates(self.version, {
+                names[brawler]: [matches, wins] for brawler, matches, wins in self.brawlers.tolist()
+            })
+        return self._aggregates
+
+    def rollup(self) -> PlayerRollup:
+        """Роллап поверх mmap: матрицы только для чтения, без копирования"""
+        if self._rollup is None:
+            names = self.symbols.names["brawler"]
+            rollup = PlayerRollup()
+            rollup.first_day = self.first_day
+            rollup.days = self.days
+            rollup.rows = {names[brawler]: i for i, brawler in enumerate(self.rollup_ids.tolist())}
+            rollup.cum_matches = self.cum_matches
+            rollup.cum_wins = self.cum_wins
+            self._rollup = rollup
+        return self._rollup
+
+    def matrix(self) -> PlayerMapMatrix:
+        """Плотная матрица карта × боец из ненулевых ячеек блоба"""
+        if self._matrix is None:
+            matrix = PlayerMapMatrix()
+            if len(self.maps):
+                map_ids, brawler_ids = self.maps[:, 0], self.maps[:, 1]
+                matrix._reserve(int(map_ids.max()) + 1, int(brawler_ids.max()) + 1)
+                matrix.counts[map_ids, brawler_ids] = self.maps[:, 2:]
+                matrix.totals = matrix.counts.sum(axis=1, dtype=np.int32)
+            matrix.map_modes = dict(self.modes.tolist())
+            self._matrix = matrix
+        return self._matrix
+
+
+class SnapshotReader:
+    """
+    Чтение опубликованных поколений в воркере
+
+    Каждое обращение сверяет номер в CURRENT (чтение 8 байт из mmap) и при
+    смене поколения переоткрывает индекс. Разобранные блобы кэшируются по
+    игрокам (LRU на max_players) и переиспользуются, пока блоб не сменился.
+    """
+
+    def __init__(self, data_dir: str, max_players: int = 2000):
+        self.path = Path(data_dir) / "snapshot"
+        self.max_players = max_players
+        self.generation = 0
+        self.symbols = SnapshotSymbols({})
+        self._control: Optional[mmap.mmap] = None
+        self._heap_id = -1
+        self._heap = b""
+        self._hashes: Iterable[int] = ()
+        self._offsets: Iterable[int] = ()
+        self._lengths: Iterable[int] = ()
+        self._count = 0
+        self._symbols_raw = b""
+        self._players: "OrderedDict[str, SnapshotPlayer]" = OrderedDict()
+        self.stats = {"generations": 0, "hits": 0, "misses": 0}
+
+    def _current(self) -> int:
+        if self._control is None:
+            try:
+                with open(self.path / "CURRENT", "rb") as f:
+                    self._control = mmap.mmap(f.fileno(), CONTROL.size, access=mmap.ACCESS_READ)
+            except (FileNotFoundError, ValueError):
+                return 0
+        return CONTROL.unpack_from(self._control)[0]
+
+    def refresh(self) -> int:
+        """Перейти на текущее поколение, если писатель опубликовал новое"""
+        generation = self._current()
+        if generation == self.generation:
+            return generation
+
+        for _ in range(OPEN_RETRIES):
+            try:
+                self._open(generation)
+                return generation
+            except (FileNotFoundError, ValueError):
+                # Поколение успели сменить и удалить, пока мы его открывали
+                generation = self._current()
+        logger.warning(f"Снимок: не удалось открыть поколение {generation}, остаёмся на {self.generation}")
+        return self.generation
+
+    def _open(self, generation: int):
+        with open(self.path / _index_name(generation), "rb") as f:
+            index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_generation, heap_id, heap_size, count, symbols_len = INDEX_HEADER.unpack_from(index)
+        if magic != INDEX_MAGIC or index_generation != generation:
+            raise ValueError(f"повреждённый индекс поколения {generation}")
+
+        heap = self._heap
+        if heap_id != self._heap_id or len(heap) < heap_size:
+            # Пустой файл не отображается в память; пустой heap бывает у поколения без игроков
+            heap = b""
+            if heap_size:
+                with open(self.path / _heap_name(heap_id), "rb") as f:
+                    heap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(heap) < heap_size:
+                raise ValueError(f"heap {heap_id} короче {heap_size} байт")
+
+        position = INDEX_HEADER.size
+        symbols_raw = index[position:position + symbols_len]
+        if symbols_raw != self._symbols_raw:
+            self.symbols = SnapshotSymbols(json.loads(symbols_raw))
+            self._symbols_raw = symbols_raw
+        position += _pad(symbols_len)
+
+        view = memoryview(index)
+        arrays = []
+        for _ in range(3):
+            arrays.append(view[position:position + count * 8].cast("Q"))
+            position += count * 8
+
+        # Старые mmap закроются сами, когда на них не останется ссылок
+        self._hashes, self._offsets, self._lengths = arrays
+        self._count = count
+        self._heap, self._heap_id = heap, heap_id
+        self.generation = generation
+        self.stats["generations"] += 1
+
+    def _locate(self, player_id: str) -> Optional[Location]:
+        target = player_hash(player_id)
+        hashes = self._hashes
+        i = bisect_left(hashes, target)
+        # Игроки с одинаковым хешем лежат рядом; сверяем id в блобе
+        while i < self._count and hashes[i] == target:
+            offset = self._offsets[i]
+            if blob_identity(self._heap, offset)[0] == player_id:
+                return self._heap_id, offset, self._lengths[i]
+            i += 1
+        return None
+
+    def player(self, player_id: str) -> Optional[SnapshotPlayer]:
+        self.refresh()
+        location = self._locate(player_id)
+        if location is None:
+            return None
+
+        player = self._players.get(player_id)
+        if player is not None and player.location == location:
+            self._players.move_to_end(player_id)
+            self.stats["hits"] += 1
+            return player
+
+        self.stats["misses"] += 1
+        player = self._players[player_id] = SnapshotPlayer(self._heap, location, self.symbols)
+        self._players.move_to_end(player_id)
+        while len(self._players) > self.max_players:
+            self._players.popitem(last=False)
+        return player
+
+    def close(self):
+        self._players.clear()
+        self._hashes = self._offsets = self._lengths = ()
+        self._count = 0
+        self._heap = b""
+        self._control = None
+
+
+# ============= Замены хранилищ для воркера =============
+
+class SnapshotBattles:
+    """Вместо BattleStore в воркере: наличие игрока и словари имён"""
+
+    def __init__(self, reader: SnapshotReader):
+        self.reader = reader
+
+    @property
+    def symbols(self) -> SnapshotSymbols:
+        return self.reader.symbols
+
+    def has_player(self, player_id: str) -> bool:
+        return self.reader.player(player_id) is not None
+
+    def close(self):
+        self.reader.close()
+
+
+class SnapshotAggregates:
+    """Вместо AggregateStore в воркере"""
+
+    def __init__(self, reader: SnapshotReader):
+        self.reader = reader
+
+    def get(self, player_id: str) -> Optional[PlayerAggregates]:
+        player = self.reader.player(player_id)
+        return player.aggregates() if player is not None else None
+
+    def version(self, player_id: str) -> int:
+        player = self.reader.player(player_id)
+        return player.version if player is not None else 0
+
+    def checkpoint(self):
+        """Агрегаты сохраняет писатель"""
+
+
+class SnapshotRollups:
+    """Вместо RollupStore в воркере"""
+
+    def __init__(self, reader: SnapshotReader):
+        self.reader = reader
+
+    def get(self, player_id: str) -> PlayerRollup:
+        player = self.reader.player(player_id)
+        return player.rollup() if player is not None else PlayerRollup()
+
+
+class SnapshotMaps(MapEngine):
+    """Вместо MapEngine в воркере: имена карт и бойцов — из словарей поколения"""
+
+    def __init__(self, battles: SnapshotBattles):
+        self.store = battles
+
+    def get(self, player_id: str) -> PlayerMapMatrix:
+        player = self.store.reader.player(player_id)
+        return player.matrix() if player is not None else PlayerMapMatrix()
+
+
+# ============= Публикация =============
+
+class SnapshotWriter:
+    """
+    Публикация поколений в процессе-писателе
+
+    При открытии подхватывает последнее поколение: блобы игроков, чья
+    версия не изменилась, переиспользуются, stale() возвращает остальных.
+    """
+
+    def __init__(self, store: BattleStore, aggregates: AggregateStore,
+                 rollups: RollupStore, maps: MapEngine):
+        self.store = store
+        self.aggregates = aggregates
+        self.rollups = rollups
+        self.maps = maps
+        self.path = store.path / "snapshot"
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        # player_id -> [хеш, смещение, длина, версия]
+        self._entries: Dict[str, List[int]] = {}
+        # Блобы заполнения, дописанные в heap, но ещё не попавшие в индекс
+        self._staged: Dict[str, List[int]] = {}
+        self.generation = 0
+        self._heap_id = 1
+        self._live = 0
+        # id старого heap -> поколение, начиная с которого он не нужен
+        self._retired: Dict[int, int] = {}
+        self.stats = {"generations": 0, "players": 0, "compactions": 0}
+
+        control_path = self.path / "CURRENT"
+        if not control_path.exists():
+            control_path.write_bytes(CONTROL.pack(0))
+        self._control_file = open(control_path, "r+b")
+        self._control = mmap.mmap(self._control_file.fileno(), CONTROL.size)
+        self._load()
+
+        self._heap = open(self.path / _heap_name(self._heap_id), "ab")
+        self._heap_size = self._heap.seek(0, os.SEEK_END)
+
+    def _load(self):
+        self.generation = CONTROL.unpack_from(self._control)[0]
+        heap_size = 0
+        if self.generation:
+            try:
+                heap_size = self._load_generation()
+            except (FileNotFoundError, struct.error, ValueError):
+                logger.warning(f"Снимок: поколение {self.generation} не читается, публикуем заново")
+                self._entries.clear()
+                self._live = 0
+
+        # Хвост после heap_size и остальные heap не попали ни в одно поколение
+        for path in self.path.glob("heap-*.dat"):
+            if path.name != _heap_name(self._heap_id):
+                path.unlink(missing_ok=True)
+        heap_path = self.path / _heap_name(self._heap_id)
+        if heap_path.exists():
+            os.truncate(heap_path, heap_size)
+
+    def _load_generation(self) -> int:
+        with open(self.path / _index_name(self.generation), "rb") as f:
+            index = f.read()
+        _, _, heap_id, heap_size, count, symbols_len = INDEX_HEADER.unpack_from(index)
+        position = INDEX_HEADER.size + _pad(symbols_len)
+        hashes, offsets, lengths = (
+            np.frombuffer(index, dtype="<u8", count=count, offset=position + i * count * 8).tolist()
+            for i in range(3)
+        )
+
+        self._heap_id = heap_id
+        if not count:
+            return heap_size
+        with open(self.path / _heap_name(heap_id), "rb") as f:
+            heap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        for hash_value, offset, length in zip(hashes, offsets, lengths):
+            player_id, version = blob_identity(heap, offset)
+            if self.store.has_player(player_id):
+                self._entries[player_id] = [hash_value, offset, length, version]
+                self._live += length
+        heap.close()
+        return heap_size
+
+    def stale(self) -> List[str]:
+        """Игроки, чьи данные в снимке отсутствуют или устарели"""
+        return [
+            player_id for player_id in self.store.players()
+            if self._entries.get(player_id, (0, 0, 0, -1))[3] != self.aggregates.version(player_id)
+        ]
+
+    def prepare(self, player_ids: Iterable[str]) -> Dict[str, Tuple[int, bytes]]:
+        """
+        Блобы игроков из текущих агрегатов, роллапов и матриц карт
+
+        Вызывается в event loop без await: все структуры соответствуют
+        одной версии игрока.
+        """
+        ids = self.store.symbols.ids["brawler"]
+        blobs = {}
+        for player_id in player_ids:
+            aggregates = self.aggregates.get(player_id)
+            if aggregates is None:
+                continue
+            brawlers = np.array(
+                [(ids[name], matches, wins) for name, (matches, wins) in aggregates.brawlers.items()],
+                dtype=np.int32
+            ).reshape(-1, 3)
+            rollup = self.rollups.get(player_id)
+            rollup_ids = np.array([ids[name] for name in rollup.rows], dtype=np.int32)
+            matrix = self.maps.get(player_id)
+            map_ids, brawler_ids = np.nonzero(matrix.counts[:, :, 0])
+            maps = np.column_stack((map_ids, brawler_ids, matrix.counts[map_ids, brawler_ids])).reshape(-1, 4)
+            modes = np.array(list(matrix.map_modes.items()), dtype=np.int32).reshape(-1, 2)
+            blobs[player_id] = (
+                aggregates.version,
+                pack_player(player_id, aggregates.version, brawlers, rollup_ids, rollup, maps, modes)
+            )
+        return blobs
+
+    def _write(self, blobs: Dict[str, Tuple[int, bytes]], entries: Dict[str, List[int]]):
+        for player_id, (version, blob) in blobs.items():
+            entry = entries.get(player_id)
+            if entry is None:
+                entry = entries[player_id] = [player_hash(player_id), 0, 0, -1]
+            self._live += len(blob) - entry[2]
+            entry[1:] = [self._heap_size, len(blob), version]
+            self._heap.write(blob)
+            self._heap_size += len(blob)
+        self._heap.flush()
+
+    def stage(self, blobs: Dict[str, Tuple[int, bytes]]):
+        """
+        Дописать блобы в heap, не включая их в индекс; можно вызывать в потоке
+
+        Отложенные блобы попадают в индекс при commit(staged=True). Блоб не
+        новее уже опубликованного пропускается: пачка заполнения
+        (SnapshotPublisher.backfill) могла быть собрана до синхронизации.
+        """
+        self._write({
+            player_id: (version, blob) for player_id, (version, blob) in blobs.items()
+            if self._entries.get(player_id, (0, 0, 0, -1))[3] < version
+        }, self._staged)
+
+    def commit(self, blobs: Dict[str, Tuple[int, bytes]], staged: bool = False) -> int:
+        """
+        Дописать блобы, записать индекс и переключить поколение; можно вызывать в потоке
+
+        В индекс попадают опубликованные ранее игроки и blobs, а с staged=True
+        ещё и все отложенные блобы stage().
+        """
+        self._write({
+            player_id: (version, blob) for player_id, (version, blob) in blobs.items()
+            if self._entries.get(player_id, (0, 0, 0, -1))[3] <= version
+        }, self._entries)
+        for player_id in blobs:
+            entry = self._staged.get(player_id)
+            if entry is not None and entry[3] <= self._entries[player_id][3]:
+                self._live -= entry[2]
+                del self._staged[player_id]
+        if staged:
+            for player_id, entry in self._staged.items():
+                current = self._entries.get(player_id)
+                if current is None or current[3] < entry[3]:
+                    self._live -= current[2] if current else 0
+                    self._entries[player_id] = entry
+                else:
+                    self._live -= entry[2]
+            self._staged.clear()
+
+        generation = self.generation + 1
+        if self._heap_size - self._live > self._live + COMPACT_SLACK:
+            self._compact(generation)
+
+        self._write_index(generation)
+        self._control[:CONTROL.size] = CONTROL.pack(generation)
+        self.generation = generation
+        self.stats["generations"] += 1
+        self.stats["players"] += len(blobs)
+        self._remove_old(generation)
+        return generation
+
+    def publish(self, player_ids: Iterable[str]) -> int:
+        return self.commit(self.prepare(player_ids))
+
+    def _compact(self, generation: int):
+        """Переписать живые блобы в новый heap"""
+        old_id, old_path = self._heap_id, self.path / _heap_name(self._heap_id)
+        self._heap.close()
+        self._heap_id += 1
+        heap = open(self.path / _heap_name(self._heap_id), "wb")
+        offset = 0
+        with open(old_path, "rb") as f:
+            old = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            live = [*self._entries.values(), *self._staged.values()]
+            for entry in sorted(live, key=lambda e: e[1]):
+                heap.write(old[entry[1]:entry[1] + entry[2]])
+                entry[1] = offset
+                offset += entry[2]
+            old.close()
+        heap.close()
+        self._heap = open(self.path / _heap_name(self._heap_id), "ab")
+        self._heap_size = offset
+        # Старый heap читают воркеры, ещё не перешедшие на новое поколение
+        self._retired[old_id] = generation + 1
+        self.stats["compactions"] += 1
+
+    def _write_index(self, generation: int):
+        entries = sorted(self._entries.values())
+        table = np.array([entry[:3] for entry in entries], dtype="<u8").reshape(-1, 3)
+        symbols = json.dumps(self.store.symbols.names, ensure_ascii=False).encode()
+
+        tmp_path = self.path / (_index_name(generation) + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(INDEX_HEADER.pack(
+                INDEX_MAGIC, generation, self._heap_id, self._heap_size, len(entries), len(symbols)
+            ))
+            f.write(symbols.ljust(_pad(len(symbols)), b"\0"))
+            for column in range(3):
+                f.write(np.ascontiguousarray(table[:, column]).tobytes())
+        os.replace(tmp_path, self.path / _index_name(generation))
+
+    def _remove_old(self, generation: int):
+        """Удалить индексы старше предыдущего поколения и heap, на которые они ссылались"""
+        for path in self.path.glob("index-*.idx"):
+            if int(path.stem.split("-")[1]) < generation - 1:
+                path.unlink(missing_ok=True)
+        for heap_id, until in list(self._retired.items()):
+            if generation >= until:
+                (self.path / _heap_name(heap_id)).unlink(missing_ok=True)
+                del self._retired[heap_id]
+
+    def close(self):
+        self._heap.close()
+        self._control.close()
+        self._control_file.close()
+
+
+class SnapshotPublisher:
+    """
+    Публикация из event loop писателя с объединением запросов
+
+    Пока пишется одно поколение, игроки из следующих вызовов копятся и
+    уходят одним следующим поколением. publish() возвращается, когда
+    поколение с этими игроками уже видно воркерам. Пока первого поколения
+    нет, publish() ждёт окончания backfill(): воркеры не начинают отвечать
+    по снимку, в котором есть только синхронизированные игроки.
+    """
+
+    def __init__(self, writer: SnapshotWriter, batch_players: int = 100):
+        self.writer = writer
+        self.batch_players = batch_players
+        self._pending: Set[str] = set()
+        self._next: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+        # Запись в heap идёт в потоке; одновременно пишет только один
+        self._lock = asyncio.Lock()
+        self._ready = asyncio.Event()
+        if writer.generation:
+            self._ready.set()
+
+    async def publish(self, player_ids: Iterable[str]) -> int:
+        self._pending.update(player_ids)
+        if self._next is None:
+            self._next = asyncio.get_running_loop().create_future()
+        waiter = self._next
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return await asyncio.shield(waiter)
+
+    async def _run(self):
+        await self._ready.wait()
+        while self._pending:
+            players, self._pending = self._pending, set()
+            waiter, self._next = self._next, None
+            try:
+                blobs = self.writer.prepare(players)
+                async with self._lock:
+                    waiter.set_result(await asyncio.to_thread(self.writer.commit, blobs))
+            except Exception as e:
+                waiter.set_exception(e)
+
+    async def backfill(self, player_ids: List[str]) -> int:
+        """
+        Опубликовать много игроков (запуск писателя) пачками по batch_players
+
+        Блобы пачки собираются в event loop и сразу дописываются в heap в
+        потоке, поэтому в памяти не больше одной пачки, а между пачками
+        писатель обслуживает синхронизации. Поколения синхронизаций содержат
+        только своих игроков, отложенные блобы попадают в индекс одним
+        поколением в конце; до него воркеры видят предыдущее поколение.
+        """
+        for start in range(0, len(player_ids), self.batch_players):
+            blobs = self.writer.prepare(player_ids[start:start + self.batch_players])
+            async with self._lock:
+                await asyncio.to_thread(self.writer.stage, blobs)
+            if start and start // self.batch_players % 100 == 0:
+                logger.info(f"Снимок: опубликовано {start:,} из {len(player_ids):,} игроков")
+        async with self._lock:
+            generation = await asyncio.to_thread(self.writer.commit, {}, True)
+        self._ready.set()
+        return generation
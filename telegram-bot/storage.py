@@ -0,0 +1,346 @@
+"""
+Локальное хранилище сырых боёв
+
+Бои пишутся в append-only сегменты фиксированными записями. Каждый вызов
+append() кладёт бои одного игрока непрерывным блоком, а в индекс
+(index.log) дописывается строка «игрок → сегмент, смещение, количество».
+Поэтому чтение боёв одного игрока — это несколько чтений его блоков,
+без сканирования чужих данных.
+
+Структура каталога:
+    symbols.log           - словарь имён бойцов/карт/режимов (строка = id)
+    index.log             - индекс блоков по игрокам
+    segments/NNNNNNNN.seg - сегменты с записями боёв
+"""
+
+import os
+import struct
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# timestamp (unix, сек), brawler id, map id, mode id, result
+RECORD = struct.Struct("<qHHBB")
+
+RESULTS = ("defeat", "victory", "draw")
+RESULT_CODES = {name: code for code, name in enumerate(RESULTS)}
+
+SYMBOL_KINDS = ("brawler", "map", "mode")
+
+IngestListener = Callable[[str, List["Battle"]], None]
+
+
+class Battle(NamedTuple):
+    player_id: str
+    brawler: str
+    map: str
+    mode: str
+    result: str
+    timestamp: int
+
+    @property
+    def is_win(self) -> bool:
+        return self.result == "victory"
+
+    @property
+    def date(self) -> str:
+        return datetime.fromtimestamp(self.timestamp, timezone.utc).strftime("%Y-%m-%d")
+
+
+class Block(NamedTuple):
+    segment: int
+    offset: int
+    count: int
+
+
+class SymbolTable:
+    """Append-only словарь строк → компактные id для записей"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.names: Dict[str, List[str]] = {kind: [] for kind in SYMBOL_KINDS}
+        self.ids: Dict[str, Dict[str, int]] = {kind: {} for kind in SYMBOL_KINDS}
+
+        if path.exists():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    kind, _, name = line.rstrip("\n").partition("\t")
+                    if kind in self.names:
+                        self._add(kind, name)
+
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _add(self, kind: str, name: str) -> int:
+        symbol_id = len(self.names[kind])
+        self.names[kind].append(name)
+        self.ids[kind][name] = symbol_id
+        return symbol_id
+
+    def encode(self, kind: str, name: str) -> int:
+        symbol_id = self.ids[kind].get(name)
+        if symbol_id is None:
+            symbol_id = self._add(kind, name)
+            self._file.write(f"{kind}\t{name}\n")
+        return symbol_id
+
+    def decode(self, kind: str, symbol_id: int) -> str:
+        return self.names[kind][symbol_id]
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class BattleStore:
+    """Хранилище боёв с индексом по игрокам"""
+
+    def __init__(self, path: str, segment_max_bytes: int = 64 * 1024 * 1024):
+        self.path = Path(path)
+        self.segment_max_bytes = segment_max_bytes
+        self.segments_dir = self.path / "segments"
+        self.segments_dir.mkdir(parents=True, exist_ok=True)
+
+        self.symbols = SymbolTable(self.path / "symbols.log")
+
+        # player_id -> блоки и время последнего сохранённого боя
+        self._blocks: Dict[str, List[Block]] = {}
+        self._last_ts: Dict[str, int] = {}
+        self._counts: Dict[str, int] = {}
+        self._load_index()
+        self._index = open(self.path / "index.log", "a", encoding="utf-8")
+
+        self._readers: Dict[int, BinaryIO] = {}
+        self._listeners: List[IngestListener] = []
+        self._open_writer()
+
+    # ----- Индекс -----
+
+    def _load_index(self):
+        index_path = self.path / "index.log"
+        if not index_path.exists():
+            return
+
+        valid_bytes = 0
+        with open(index_path, "rb") as f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    # Недописанная строка после аварийного завершения
+                    break
+                player_id, segment, offset, count, last_ts = raw.decode("utf-8").rstrip("\n").split("\t")
+                self._add_block(player_id, Block(int(segment), int(offset), int(count)), int(last_ts))
+                valid_bytes += len(raw)
+
+        if valid_bytes != index_path.stat().st_size:
+            os.truncate(index_path, valid_bytes)
+
+    def _add_block(self, player_id: str, block: Block, last_ts: int):
+        self._blocks.setdefault(player_id, []).append(block)
+        self._counts[player_id] = self._counts.get(player_id, 0) + block.count
+        self._last_ts[player_id] = max(self._last_ts.get(player_id, 0), last_ts)
+
+    # ----- Сегменты -----
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.segments_dir / f"{segment:08d}.seg"
+
+    def _open_writer(self):
+        existing = sorted(int(p.stem) for p in self.segments_dir.glob("*.seg"))
+        self._segment = existing[-1] if existing else 1
+        self._writer = open(self._segment_path(self._segment), "ab")
+        self._write_offset = self._writer.seek(0, os.SEEK_END)
+
+    def _roll_segment(self):
+        self._writer.close()
+        self._segment += 1
+        self._writer = open(self._segment_path(self._segment), "ab")
+        self._write_offset = 0
+
+    def _reader(self, segment: int) -> BinaryIO:
+        reader = self._readers.get(segment)
+        if reader is None:
+            reader = open(self._segment_path(segment), "rb", buffering=0)
+            self._readers[segment] = reader
+        return reader
+
+    # ----- Запись -----
+
+    def add_listener(self, listener: IngestListener):
+        """Подписаться на новые бои: listener(player_id, new_battles) после записи"""
+        self._listeners.append(listener)
+
+    def append(self, player_id: str, battles: Iterable[Battle]) -> List[Battle]:
+        """
+        Дописать бои игрока
+
+        Бои не новее последнего сохранённого отбрасываются, поэтому
+        повторная синхронизация одного и того же battlelog безопасна.
+
+        Returns:
+            List[Battle]: реально добавленные бои в порядке времени
+        """
+        last_ts = self._last_ts.get(player_id, 0)
+        new_battles = sorted(
+            (b for b in battles if b.timestamp > last_ts),
+            key=lambda b: b.timestamp
+        )
+        if not new_battles:
+            return []
+
+        encode = self.symbols.encode
+        payload = b"".join(
+            RECORD.pack(
+                b.timestamp,
+                encode("brawler", b.brawler),
+                encode("map", b.map),
+                encode("mode", b.mode),
+                RESULT_CODES[b.result],
+            )
+            for b in new_battles
+        )
+
+        block = self._write_payload(payload, len(new_battles))
+        self._commit_blocks([(player_id, block, new_battles[-1].timestamp)])
+
+        for listener in self._listeners:
+            listener(player_id, new_battles)
+
+        return new_battles
+
+    def append_blocks(self, blocks: Iterable[Tuple[str, bytes, int]]) -> int:
+        """
+        Массовая загрузка готовых записей: (player_id, payload, время последнего боя)
+
+        payload — записи RECORD одного игрока, отсортированные по времени и
+        новее его последнего сохранённого боя (вызывающий код отвечает за
+        это сам, проверки нет). Данные и индекс сбрасываются на диск один
+        раз на вызов, поэтому генератор или импорт пишут тысячи игроков
+        пачкой. Слушатели получают бои, как после append().
+
+        Returns:
+            int: записано боёв
+        """
+        written = [
+            (player_id, self._write_payload(payload, len(payload) // RECORD.size), last_ts)
+            for player_id, payload, last_ts in blocks
+        ]
+        self._commit_blocks(written)
+
+        if self._listeners:
+            for player_id, block, _ in written:
+                battles = list(self.iter_player(player_id, skip=self._counts[player_id] - block.count))
+                for listener in self._listeners:
+                    listener(player_id, battles)
+
+        return sum(block.count for _, block, _ in written)
+
+    def _write_payload(self, payload: bytes, count: int) -> Block:
+        if self._write_offset and self._write_offset + len(payload) > self.segment_max_bytes:
+            self._roll_segment()
+
+        block = Block(self._segment, self._write_offset, count)
+        self._writer.write(payload)
+        self._write_offset += len(payload)
+        return block
+
+    def _commit_blocks(self, blocks: List[Tuple[str, Block, int]]):
+        # Индекс пишется только после данных: строка индекса никогда не
+        # ссылается на байты, которых нет в сегменте
+        self.symbols.flush()
+        self._writer.flush()
+        self._index.write("".join(
+            f"{player_id}\t{block.segment}\t{block.offset}\t{block.count}\t{last_ts}\n"
+            for player_id, block, last_ts in blocks
+        ))
+        self._index.flush()
+
+        for player_id, block, last_ts in blocks:
+            self._add_block(player_id, block, last_ts)
+
+    # ----- Чтение -----
+
+    def iter_records(self, player_id: str, skip: int = 0) -> Iterator[Tuple[int, int, int, int, int]]:
+        """Сырые записи игрока: (timestamp, brawler_id, map_id, mode_id, result)"""
+        for block in self._blocks.get(player_id, ()):
+            if skip >= block.count:
+                # Блок целиком пропускается без чтения с диска
+                skip -= block.count
+                continue
+            reader = self._reader(block.segment)
+            reader.seek(block.offset + skip * RECORD.size)
+            yield from RECORD.iter_unpack(reader.read((block.count - skip) * RECORD.size))
+            skip = 0
+
+    def iter_chunks(self, player_id: str, chunk_records: int = 16384) -> Iterator[bytes]:
+        """
+        Сырые записи игрока кусками по chunk_records (последний — короче)
+
+        Для потоковой выгрузки длинной истории: в памяти не больше одного
+        куска, мелкие блоки синхронизаций склеиваются в куски целиком.
+        Сегменты читаются своими дескрипторами, а не общими _readers, так
+        что генератор можно крутить в потоке параллельно с другими
+        чтениями. Список блоков снимается при вызове: блоки, дописанные
+        после него, не попадают, а словарь имён, прочитанный после вызова,
+        покрывает все id в выгрузке.
+        """
+        return self._read_chunks(list(self._blocks.get(player_id, ())), chunk_records)
+
+    def _read_chunks(self, blocks: List[Block], chunk_records: int) -> Iterator[bytes]:
+        limit = chunk_records * RECORD.size
+        readers: Dict[int, BinaryIO] = {}
+        buffer = bytearray()
+        try:
+            for block in blocks:
+                reader = readers.get(block.segment)
+                if reader is None:
+                    reader = readers[block.segment] = open(self._segment_path(block.segment), "rb")
+                reader.seek(block.offset)
+                remaining = block.count * RECORD.size
+                while remaining:
+                    data = reader.read(min(remaining, limit - len(buffer)))
+                    if not data:
+                        break
+                    remaining -= len(data)
+                    buffer += data
+                    if len(buffer) == limit:
+                        yield bytes(buffer)
+                        buffer.clear()
+            if buffer:
+                yield bytes(buffer)
+        finally:
+            for reader in readers.values():
+                reader.close()
+
+    def iter_player(self, player_id: str, since: Optional[int] = None, skip: int = 0) -> Iterator[Battle]:
+        """Бои игрока в порядке времени: начиная с since и/или после первых skip"""
+        names = self.symbols.names
+        brawlers, maps, modes = names["brawler"], names["map"], names["mode"]
+
+        for ts, brawler, map_id, mode, result in self.iter_records(player_id, skip):
+            if since is not None and ts < since:
+                continue
+            yield Battle(player_id, brawlers[brawler], maps[map_id], modes[mode], RESULTS[result], ts)
+
+    def read_player(self, player_id: str, since: Optional[int] = None) -> List[Battle]:
+        return list(self.iter_player(player_id, since))
+
+    def has_player(self, player_id: str) -> bool:
+        return player_id in self._blocks
+
+    def battle_count(self, player_id: str) -> int:
+        return self._counts.get(player_id, 0)
+
+    def last_battle_time(self, player_id: str) -> Optional[int]:
+        return self._last_ts.get(player_id)
+
+    def players(self) -> List[str]:
+        return list(self._blocks)
+
+    def close(self):
+        self._writer.close()
+        self._index.close()
+        self.symbols.close()
+        for reader in self._readers.values():
+            reader.close()
+        self._readers.clear()
@@ -0,0 +1,271 @@
+"""
+Синтетические бои для нагрузочных тестов и проверки на масштабе
+
+Генератор детерминирован: одинаковые параметры и seed дают байт в байт
+одинаковое хранилище. Игроки обрабатываются блоками по BLOCK_PLAYERS,
+у каждого блока свой поток случайных чисел ([seed, номер блока]), всё
+считается векторно на NumPy и сразу пишется в BattleStore пачкой
+(append_blocks). Память зависит от размера блока, а не от числа игроков.
+
+Модель:
+- навык игрока ~ N(0, 1) сдвигает его винрейт по логистической кривой;
+- у каждого игрока свой порядок любимых бойцов: номер в этом порядке
+  ~ геометрическое распределение, на любимых бойцах он играет чаще и
+  выигрывает больше (mastery); у пары карта × боец свой небольшой
+  сдвиг винрейта, общий для всех игроков;
+- карты идут по ротации: в каждом режиме одна карта активна
+  rotation_hours часов, режим боя выбирается по весам;
+- активность — сессии: число сессий ~ Пуассон от личной активности
+  (логнормальной), в сессии геометрическое число боёв с интервалом
+  2-4 минуты; сессии чаще вечером (UTC), в выходные и в дни событий;
+- игроки приходят в разное время: первый день игрока равномерен по
+  первым 80% окна.
+
+Запуск (повторный запуск дописывает только игроков, которых ещё нет):
+    python synthetic.py --players 1000000 --days 90 --data-dir ./data
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from game_data import BRAWLERS, EVENTS
+from map_engine import RECORD_DTYPE
+from storage import RESULT_CODES, BattleStore
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except Exception:
+        pass
+
+BLOCK_PLAYERS = 2048
+DAY = 86400
+
+# Доля режима в выборе режима боя; карты режима берутся из EVENTS по порядку
+MODE_WEIGHTS = {
+    "gemGrab": 0.22, "brawlBall": 0.22, "heist": 0.10, "knockout": 0.12,
+    "bounty": 0.08, "hotZone": 0.08, "soloShowdown": 0.12, "duoShowdown": 0.06,
+}
+
+# Доля сессий по часу суток (UTC): ночью мало, пик вечером
+DIURNAL = np.array([
+    2, 1, 1, 1, 1, 1, 2, 3, 4, 4, 4, 5, 6, 6, 6, 7, 8, 9, 10, 10, 9, 7, 5, 3
+], dtype=np.float64)
+
+
+def today_start() -> int:
+    now = int(datetime.now(timezone.utc).timestamp())
+    return now - now % DAY
+
+
+class SyntheticConfig(NamedTuple):
+    players: int = 10_000
+    days: int = 90
+    seed: int = 42
+    end: int = 0  # начало дня после окна (unix); 0 — сегодня, UTC
+    prefix: str = "SYN"
+    sessions_per_day: float = 1.2  # медиана сессий в день у игрока
+    battles_per_session: float = 4.0
+    skill_spread: float = 0.35  # вес навыка в логите винрейта
+    mastery: float = 0.30  # прибавка к логиту на любимом бойце
+    favorite_decay: float = 0.15  # параметр геометрического распределения номера бойца
+    rotation_hours: int = 24
+    event_every: int = 14  # дней между событиями с двойной активностью
+    draw_rate: float = 0.02
+
+
+class BattleGenerator:
+    """Поток синтетических боёв игроков блоками по BLOCK_PLAYERS"""
+
+    def __init__(self, config: SyntheticConfig = SyntheticConfig(),
+                 brawlers: Sequence[str] = BRAWLERS, events: Sequence[Tuple[str, str]] = EVENTS):
+        self.config = config
+        self.end = config.end or today_start()
+        self.start = self.end - config.days * DAY
+        self.brawlers = list(brawlers)
+        self.modes: List[str] = []
+        self.maps: List[str] = []
+        for mode, map_name in events:
+            if mode not in self.modes:
+                self.modes.append(mode)
+        first, size = [], []
+        for mode in self.modes:
+            # Карты сквозные и идут по режимам: первая карта и число карт в ротации
+            first.append(len(self.maps))
+            self.maps.extend(map_name for event_mode, map_name in events if event_mode == mode)
+            size.append(len(self.maps) - first[-1])
+        weights = np.array([MODE_WEIGHTS.get(mode, 0.1) for mode in self.modes])
+        self.mode_weights = weights / weights.sum()
+        self.mode_first_map = np.array(first, dtype=np.int64)
+        self.mode_maps = np.array(size, dtype=np.int64)
+
+        # Общие для всех игроков: сдвиги винрейта карта × боец и вес каждого дня окна
+        rng = np.random.default_rng([config.seed, 0xFFFF_FFFF])
+        self.map_bias = rng.normal(0.0, 0.15, (len(self.maps), len(self.brawlers)))
+        days = np.arange(config.days)
+        weekday = (self.start // DAY + days + 3) % 7  # 0 — понедельник
+        day_weight = 1.0 + 0.4 * (weekday >= 5) + 1.0 * (days % config.event_every == config.event_every - 1)
+        self.day_cdf = np.concatenate(([0.0], np.cumsum(day_weight)))
+        self.hour_p = DIURNAL / DIURNAL.sum()
+
+    @property
+    def blocks(self) -> int:
+        return -(-self.config.players // BLOCK_PLAYERS)
+
+    def player_id(self, index: int) -> str:
+        return f"{self.config.prefix}{index}"
+
+    def block(self, number: int) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """
+        Бои блока игроков
+
+        Returns:
+            (player_ids, records, bounds): записи RECORD_DTYPE с локальными
+            номерами бойцов/карт/режимов, отсортированные по игроку и
+            времени; бои игрока i — records[bounds[i]:bounds[i + 1]]
+        """
+        config = self.config
+        rng = np.random.default_rng([config.seed, number])
+        first = number * BLOCK_PLAYERS
+        n = min(BLOCK_PLAYERS, config.players - first)
+        brawlers = len(self.brawlers)
+
+        skill = rng.normal(0.0, 1.0, n)
+        activity = rng.lognormal(np.log(config.sessions_per_day), 0.8, n)
+        join_day = rng.integers(0, max(1, int(config.days * 0.8)), n)
+        favorites = rng.permuted(np.tile(np.arange(brawlers, dtype=np.int16), (n, 1)), axis=1)
+
+        # Сессии: день по весам дней от первого дня игрока, час — по суточному профилю
+        sessions = rng.poisson(activity * (config.days - join_day))
+        session_player = np.repeat(np.arange(n), sessions)
+        low = self.day_cdf[join_day[session_player]]
+        u = low + rng.random(len(session_player)) * (self.day_cdf[-1] - low)
+        session_day = np.searchsorted(self.day_cdf, u, side="right") - 1
+        session_start = (
+            self.start + session_day * DAY
+            + rng.choice(24, len(session_player), p=self.hour_p) * 3600
+            + rng.integers(0, 3600, len(session_player))
+        )
+
+        # Бои сессии идут друг за другом с интервалом 2-4 минуты
+        per_session = rng.geometric(1.0 / config.battles_per_session, len(session_player))
+        player = np.repeat(session_player, per_session)
+        ordinal = np.arange(len(player)) - np.repeat(np.cumsum(per_session) - per_session, per_session)
+        timestamps = np.repeat(session_start, per_session) + ordinal * 180 + rng.integers(-60, 60, len(player))
+
+        # Порядок: игрок, время; время игрока строго возрастает (хранилище отбрасывает повторы)
+        order = np.lexsort((timestamps, player))
+        player, timestamps = player[order], timestamps[order]
+        counts = np.bincount(player, minlength=n)
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        within = np.arange(len(player)) - bounds[player]
+        shifted = timestamps - within + player.astype(np.int64) * (1 << 40)
+        timestamps = np.maximum.accumulate(shifted) - player.astype(np.int64) * (1 << 40) + within
+        # Сдвинутые вперёд бои последнего дня могут выйти за окно
+        inside = timestamps < self.end
+        player, timestamps = player[inside], timestamps[inside]
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(player, minlength=n))))
+
+        total = len(player)
+        rank = np.minimum(rng.geometric(config.favorite_decay, total) - 1, brawlers - 1)
+        brawler = favorites[player, rank].astype(np.int64)
+        mode = rng.choice(len(self.modes), total, p=self.mode_weights)
+        slot = (timestamps // (config.rotation_hours * 3600) + mode) % self.mode_maps[mode]
+        map_index = self.mode_first_map[mode] + slot
+
+        logit = (
+            config.skill_spread * skill[player]
+            + config.mastery * np.exp(-rank / 5.0)
+            + self.map_bias[map_index, brawler]
+        )
+        roll = rng.random(total)
+        win_p = (1.0 - config.draw_rate) / (1.0 + np.exp(-logit))
+        result = np.where(
+            roll < win_p, RESULT_CODES["victory"],
+            np.where(roll >= 1.0 - config.draw_rate, RESULT_CODES["draw"], RESULT_CODES["defeat"])
+        )
+
+        records = np.empty(total, dtype=RECORD_DTYPE)
+        records["timestamp"] = timestamps
+        records["brawler"] = brawler
+        records["map"] = map_index
+        records["mode"] = mode
+        records["result"] = result
+        player_ids = [self.player_id(first + i) for i in range(n)]
+        return player_ids, records, bounds
+
+    def iter_blocks(self) -> Iterator[Tuple[List[str], np.ndarray, np.ndarray]]:
+        for number in range(self.blocks):
+            yield self.block(number)
+
+    def write(self, store: BattleStore,
+              progress: Optional[Callable[[int, int, int], None]] = None) -> int:
+        """
+        Записать всех игроков в хранилище; игроки, которые уже есть, пропускаются
+
+        Локальные номера заменяются id словаря хранилища одним индексированием
+        массива. progress(блок, блоков, боёв) вызывается после каждого блока.
+        """
+        encode = store.symbols.encode
+        brawler_ids = np.array([encode("brawler", name) for name in self.brawlers], dtype=np.uint16)
+        map_ids = np.array([encode("map", name) for name in self.maps], dtype=np.uint16)
+        mode_ids = np.array([encode("mode", name) for name in self.modes], dtype=np.uint8)
+
+        written = 0
+        for number, (player_ids, records, bounds) in enumerate(self.iter_blocks(), 1):
+            records["brawler"] = brawler_ids[records["brawler"]]
+            records["map"] = map_ids[records["map"]]
+            records["mode"] = mode_ids[records["mode"]]
+            data = records.tobytes()
+            size = RECORD_DTYPE.itemsize
+            written += store.append_blocks(
+                (player_id, data[bounds[i] * size:bounds[i + 1] * size], int(records["timestamp"][bounds[i + 1] - 1]))
+                for i, player_id in enumerate(player_ids)
+                if bounds[i + 1] > bounds[i] and not store.has_player(player_id)
+            )
+            if progress is not None:
+                progress(number, self.blocks, written)
+        return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация синтетических боёв")
+    parser.add_argument("--players", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--end", default=None, help="последний день окна YYYY-MM-DD (по умолчанию вчера, UTC)")
+    parser.add_argument("--prefix", default="SYN", help="префикс id игроков: SYN0, SYN1, ...")
+    parser.add_argument("--data-dir", default=None, help="каталог хранилища (по умолчанию DATA_DIR)")
+    args = parser.parse_args()
+
+    data_dir = args.data_dir
+    if data_dir is None:
+        from config import settings
+        data_dir = settings.DATA_DIR
+
+    end = 0
+    if args.end:
+        end = int(datetime.strptime(args.end, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()) + DAY
+    generator = BattleGenerator(SyntheticConfig(
+        players=args.players, days=args.days, seed=args.seed, end=end, prefix=args.prefix
+    ))
+    store = BattleStore(data_dir)
+    started = time.perf_counter()
+
+    def progress(block: int, blocks: int, written: int):
+        elapsed = time.perf_counter() - started
+        print(f"\r  блок {block}/{blocks}: {written:,} боёв, {written / elapsed:,.0f} боёв/с", end="", flush=True)
+
+    written = generator.write(store, progress)
+    store.close()
+    print(f"\nГотово: {written:,} боёв за {time.perf_counter() - started:.1f} с в {data_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,117 +1,138 @@
 """
 Интеграция с Telegram WebApp
+
+Проверка initData Mini App по инструкции Telegram: HMAC-SHA256 от
+отсортированных полей на ключе HMAC("WebAppData", токен бота).
+Ключ зависит только от токена и считается один раз. Проверенные строки
+запоминаются по дайджесту до истечения auth_date + max_age, поэтому
+повторные запросы Mini App с тем же initData не пересчитывают подпись.
 """
 
-from typing import Optional
+from collections import OrderedDict
+from typing import Optional, Tuple
 import hashlib
 import hmac
 import json
-from urllib.parse import parse_qsl
+import time
+from urllib.parse import parse_qsl, urlencode
+
+# Допустимое опережение auth_date (рассинхронизация часов)
+CLOCK_SKEW = 60
 
 
 class TelegramWebApp:
     """Класс для работы с Telegram WebApp"""
-    
-    def __init__(self, bot_token: str):
+
+    def __init__(self, bot_token: str, max_age: int = 86400, cache_size: int = 10_000):
+        """
+        Args:
+            bot_token: токен бота, которым подписан initData
+            max_age: сколько секунд после auth_date initData считается действительным
+            cache_size: проверенных initData в памяти
+        """
         self.bot_token = bot_token
-    
+        self.max_age = max_age
+        self.cache_size = cache_size
+        self._secret_key = hmac.new(b'WebAppData', bot_token.encode(), hashlib.sha256).digest()
+        self._verified: "OrderedDict[bytes, Tuple[int, dict]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "invalid": 0, "expired": 0}
+
+    def validate(self, init_data: str) -> Optional[dict]:
+        """
+        Проверить initData и вернуть его поля
+
+        Returns:
+            dict: поля initData (user — уже разобранный JSON, auth_date — int)
+            или None, если подпись неверна или данные устарели
+        """
+        key = hashlib.blake2b(init_data.encode(), digest_size=16).digest()
+        now = time.time()
+
+        cached = self._verified.get(key)
+        if cached is not None:
+            expires_at, data = cached
+            if now < expires_at:
+                self.stats["hits"] += 1
+                self._verified.move_to_end(key)
+                return data
+            del self._verified[key]
+            self.stats["expired"] += 1
+            return None
+
+        self.stats["misses"] += 1
+        data = self._check(init_data, now)
+        if data is None:
+            return None
+
+        self._verified[key] = (data["auth_date"] + self.max_age, data)
+        while len(self._verified) > self.cache_size:
+            self._verified.popitem(last=False)
+        return data
+
+    def _check(self, init_data: str, now: float) -> Optional[dict]:
+        try:
+            fields = dict(parse_qsl(init_data, keep_blank_values=True, strict_parsing=True))
+        except ValueError:
+            self.stats["invalid"] += 1
+            return None
+
+        received_hash = fields.pop('hash', None)
+        if received_hash is None:
+            self.stats["invalid"] += 1
+            return None
+
+        # Строка для проверки: все поля, кроме hash, по алфавиту
+        data_check_string = '\n'.join(f'{k}={v}' for k, v in sorted(fields.items()))
+        calculated_hash = hmac.new(self._secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(calculated_hash.encode(), received_hash.encode()):
+            self.stats["invalid"] += 1
+            return None
+
+        try:
+            auth_date = int(fields['auth_date'])
+            user = json.loads(fields['user']) if 'user' in fields else None
+        except (KeyError, ValueError):
+            self.stats["invalid"] += 1
+            return None
+
+        if now - auth_date > self.max_age or auth_date - now > CLOCK_SKEW:
+            self.stats["expired"] += 1
+            return None
+
+        data = dict(fields, auth_date=auth_date)
+        if user is not None:
+            data['user'] = user
+        return data
+
     def verify_init_data(self, init_data: str) -> bool:
         """
         Проверка подлинности данных из Telegram WebApp
-        
+
         Args:
             init_data: Строка initData из Telegram.WebApp
-            
+
         Returns:
-            bool: True если данные подлинные
+            bool: True если данные подлинные и не устарели
         """
-        try:
-            parsed_data = dict(parse_qsl(init_data))
-            
-            if 'hash' not in parsed_data:
-                return False
-            
-            received_hash = parsed_data.pop('hash')
-            
-            # Создаем строку для проверки
-            data_check_string = '\n'.join(
-                f'{k}={v}' for k, v in sorted(parsed_data.items())
-            )
-            
-            # Вычисляем hash
-            secret_key = hmac.new(
-                b'WebAppData',
-                self.bot_token.encode(),
-                hashlib.sha256
-            ).digest()
-            
-            calculated_hash = hmac.new(
-                secret_key,
-                data_check_string.encode(),
-                hashlib.sha256
-            ).hexdigest()
-            
-            return calculated_hash == received_hash
-            
-        except Exception as e:
-            print(f"Error verifying init data: {e}")
-            return False
-    
+        return self.validate(init_data) is not None
+
     def extract_user_data(self, init_data: str) -> Optional[dict]:
         """
-        Извлечь данные пользователя из initData
-        
+        Извлечь данные пользователя из проверенного initData
+
         Args:
             init_data: Строка initData
-            
+
         Returns:
             dict: Данные пользователя или None
         """
-        try:
-            parsed_data = dict(parse_qsl(init_data))
-            
-            if 'user' in parsed_data:
-                return json.loads(parsed_data['user'])
-            
-            return None
-            
-        except Exception as e:
-            print(f"Error extracting user data: {e}")
-            return None
+        data = self.validate(init_data)
+        return data.get('user') if data else None
 
 
-# Пример использования в FastAPI
-
-from fastapi import FastAPI, Header, HTTPException
-from config import settings
-
-app = FastAPI()
-telegram_webapp = TelegramWebApp(settings.BOT_TOKEN)
-
-
-@app.get("/api/user-data")
-async def get_user_data(authorization: str = Header(None)):
-    """
-    Получить данные пользователя из Telegram WebApp
-    
-    Frontend должен отправить initData в заголовке Authorization
-    """
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Authorization header required")
-    
-    # Проверяем подлинность данных
-    if not telegram_webapp.verify_init_data(authorization):
-        raise HTTPException(status_code=403, detail="Invalid init data")
-    
-    # Извлекаем данные пользователя
-    user_data = telegram_webapp.extract_user_data(authorization)
-    
-    if not user_data:
-        raise HTTPException(status_code=400, detail="User data not found")
-    
-    return {
-        "user_id": user_data.get("id"),
-        "first_name": user_data.get("first_name"),
-        "last_name": user_data.get("last_name"),
-        "username": user_data.get("username")
-    }
+def sign_init_data(bot_token: str, fields: dict) -> str:
+    """initData с подписью, как его формирует Telegram (для заглушек и бенчмарков)"""
+    secret_key = hmac.new(b'WebAppData', bot_token.encode(), hashlib.sha256).digest()
+    data_check_string = '\n'.join(f'{k}={v}' for k, v in sorted(fields.items()))
+    signed = dict(fields, hash=hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest())
+    return urlencode(signed)
@@ -0,0 +1,168 @@
+"""
+Привязка пользователей Telegram к Player ID
+
+Таблица users в SQLite (DATABASE_URL, драйвер aiosqlite) и кэш в памяти
+перед ней:
+- чтение: сначала кэш (включая ещё не записанные изменения), при промахе
+  один запрос к базе; отсутствие привязки тоже кэшируется
+- запись: обновляет кэш сразу, а в базу уходит пачкой в одной транзакции
+  раз в flush_interval секунд или при накоплении flush_batch изменений;
+  повторные /player одного пользователя до сброса сливаются в одну запись
+
+При старте кэш прогревается последними сохранёнными привязками, поэтому
+обычная команда получает Player ID без обращения к базе.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import aiosqlite
+
+from brawl_api import canonical_player_id
+
+logger = logging.getLogger(__name__)
+
+# Привязки нет: кэшируется, чтобы не ходить в базу за каждым новым пользователем
+MISSING = ""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    player_id TEXT NOT NULL,
+    updated_at INTEGER NOT NULL
+)
+"""
+
+
+def sqlite_path(database_url: str) -> str:
+    """sqlite+aiosqlite:///./brawlstars.db -> ./brawlstars.db"""
+    if "://" not in database_url:
+        return database_url
+    scheme, rest = database_url.split("://", 1)
+    if not scheme.startswith("sqlite"):
+        raise ValueError(f"Поддерживается только SQLite, получено: {scheme}")
+    return rest[1:] if rest.startswith("/") else rest or ":memory:"
+
+
+class UserStore:
+    """user_id -> player_id с кэшем чтения и отложенной пакетной записью"""
+
+    def __init__(
+        self,
+        database_url: str,
+        cache_size: int = 100_000,
+        flush_interval: float = 1.0,
+        flush_batch: int = 500
+    ):
+        self.path = sqlite_path(database_url)
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self._db: Optional[aiosqlite.Connection] = None
+        self._cache: "OrderedDict[int, str]" = OrderedDict()
+        self._pending: Dict[int, str] = {}
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "flushes": 0, "flushed_rows": 0}
+
+    async def open(self):
+        self._db = await aiosqlite.connect(self.path)
+        await self._db.execute("PRAGMA journal_mode=WAL")
+        await self._db.execute("PRAGMA synchronous=NORMAL")
+        await self._db.execute(SCHEMA)
+        await self._db.commit()
+
+        # Прогрев кэша последними сохранёнными привязками
+        async with self._db.execute(
+            "SELECT user_id, player_id FROM users ORDER BY updated_at DESC LIMIT ?",
+            (self.cache_size,)
+        ) as cursor:
+            rows = await cursor.fetchall()
+        for user_id, player_id in reversed(rows):
+            self._remember(user_id, player_id)
+
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        if self._db is not None:
+            await self.flush()
+            await self._db.close()
+            self._db = None
+
+    def _remember(self, user_id: int, player_id: str):
+        self._cache[user_id] = player_id
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def get(self, user_id: int) -> Optional[str]:
+        """Player ID пользователя или None, если он его не задавал"""
+        player_id = self._pending.get(user_id)
+        if player_id is None:
+            player_id = self._cache.get(user_id)
+            if player_id is not None:
+                self._cache.move_to_end(user_id)
+        if player_id is not None:
+            self.stats["hits"] += 1
+            return player_id or None
+
+        self.stats["misses"] += 1
+        async with self._db.execute("SELECT player_id FROM users WHERE user_id = ?", (user_id,)) as cursor:
+            row = await cursor.fetchone()
+        player_id = row[0] if row else MISSING
+        # set() мог выполниться, пока шёл запрос, — его значение новее
+        if user_id not in self._cache:
+            self._remember(user_id, player_id)
+        return player_id or None
+
+    def set(self, user_id: int, player_id: str):
+        """Запомнить Player ID (канонический, canonical_player_id): сразу в кэше, в базе — при ближайшем сбросе"""
+        player_id = canonical_player_id(player_id)
+        self.stats["writes"] += 1
+        self._remember(user_id, player_id)
+        self._pending[user_id] = player_id
+        if len(self._pending) >= self.flush_batch:
+            self._flush_requested.set()
+
+    async def flush(self):
+        """Записать накопленные изменения одной транзакцией"""
+        async with self._flush_lock:
+            if not self._pending or self._db is None:
+                return
+            batch, self._pending = self._pending, {}
+            now = int(time.time())
+            try:
+                await self._db.executemany(
+                    "INSERT INTO users (user_id, player_id, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET player_id = excluded.player_id, "
+                    "updated_at = excluded.updated_at",
+                    [(user_id, player_id, now) for user_id, player_id in batch.items()]
+                )
+                await self._db.commit()
+            except Exception:
+                # Вернуть в очередь то, что не перезаписано новыми вызовами set()
+                for user_id, player_id in batch.items():
+                    self._pending.setdefault(user_id, player_id)
+                raise
+            self.stats["flushes"] += 1
+            self.stats["flushed_rows"] += len(batch)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Не удалось записать привязки игроков: {e}")
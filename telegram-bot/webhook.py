@@ -0,0 +1,187 @@
+"""
+Приём апдейтов Telegram через webhook
+
+aiohttp-приёмник проверяет заголовок X-Telegram-Bot-Api-Secret-Token
+(без секрета приёмник не создаётся: иначе апдейты мог бы слать кто угодно),
+кладёт тело апдейта в ограниченную очередь и сразу отвечает 200, не
+дожидаясь обработки. Пул воркеров разбирает очередь и передаёт апдейты
+диспетчеру. Если очередь заполнена, приёмник отвечает 503 — Telegram
+повторит доставку позже, а память не растёт без предела.
+"""
+
+import asyncio
+import hmac
+import logging
+import secrets
+from typing import List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+from metrics import Registry
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookReceiver:
+    """Приёмник webhook с очередью и пулом воркеров"""
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        secret_token: str,
+        path: str = "/telegram/webhook",
+        queue_size: int = 1000,
+        workers: int = 64,
+        metrics: Optional[Registry] = None
+    ):
+        if not secret_token:
+            raise ValueError("Webhook без secret_token принимал бы поддельные апдейты")
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.secret_token = secret_token
+        self.path = path
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.stats = {"received": 0, "processed": 0, "failed": 0, "rejected": 0, "unauthorized": 0}
+        self._tasks: List[asyncio.Task] = []
+        if metrics is not None:
+            metrics.callback(
+                "bot_update_queue_depth", "Апдейты webhook в очереди на обработку", "gauge",
+                lambda: [((), self.queue.qsize())]
+            )
+            metrics.callback(
+                "bot_webhook_updates", "Апдейты webhook: received, processed, failed, rejected, unauthorized",
+                "counter", lambda: [((event,), value) for event, value in self.stats.items()], ("event",)
+            )
+
+    def _authorized(self, request: web.Request) -> bool:
+        header = request.headers.get(SECRET_HEADER, "")
+        return hmac.compare_digest(header.encode(), self.secret_token.encode())
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not self._authorized(request):
+            self.stats["unauthorized"] += 1
+            return web.Response(status=401)
+
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            return web.Response(status=503)
+
+        self.stats["received"] += 1
+        return web.Response()
+
+    async def _worker(self):
+        while True:
+            data = await self.queue.get()
+            try:
+                update = Update.model_validate(data, context={"bot": self.bot})
+                await self.dispatcher.feed_update(self.bot, update)
+                self.stats["processed"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.exception(f"Ошибка обработки апдейта: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Дообработать очередь (не дольше drain_timeout) и остановить воркеры"""
+        try:
+            await asyncio.wait_for(self.queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Webhook: не обработано {self.queue.qsize()} апдейтов при остановке")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def create_app(self, start_workers: bool = True) -> web.Application:
+        """
+        aiohttp-приложение с маршрутом webhook
+
+        С start_workers=False воркеры запускает и останавливает вызывающий
+        (start/stop), а принятые до этого апдейты ждут в очереди.
+        """
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        if not start_workers:
+            return app
+
+        async def on_startup(_):
+            await self.start()
+
+        async def on_shutdown(_):
+            await self.stop()
+
+        app.on_startup.append(on_startup)
+        app.on_shutdown.append(on_shutdown)
+        return app
+
+
+async def run_webhook(
+    dispatcher: Dispatcher,
+    bot: Bot,
+    url: str,
+    host: str = "0.0.0.0",
+    port: int = 8443,
+    secret_token: str = "",
+    path: str = "/telegram/webhook",
+    queue_size: int = 1000,
+    workers: int = 64,
+    max_connections: Optional[int] = None,
+    metrics: Optional[Registry] = None
+):
+    """
+    Зарегистрировать webhook и принимать апдейты до отмены
+
+    Без secret_token генерируется случайный секрет на время работы процесса
+    и передаётся в set_webhook. Исключение при запуске приёмника или
+    регистрации webhook пробрасывается до startup диспетчера, поэтому
+    polling после такой ошибки (WEBHOOK_FALLBACK_POLLING) не открывает
+    хранилища бота второй раз.
+    """
+    if not url:
+        raise ValueError("WEBHOOK_URL не задан")
+    if not secret_token:
+        secret_token = secrets.token_urlsafe(32)
+        logger.info("WEBHOOK_SECRET не задан, используется случайный секрет")
+
+    receiver = WebhookReceiver(dispatcher, bot, secret_token, path, queue_size, workers, metrics)
+    runner = web.AppRunner(receiver.create_app(start_workers=False))
+    started = False
+    try:
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        await bot.set_webhook(
+            url=f"{url.rstrip('/')}{path}",
+            secret_token=secret_token,
+            allowed_updates=dispatcher.resolve_used_update_types(),
+            max_connections=max_connections
+        )
+
+        await dispatcher.emit_startup(bot=bot)
+        started = True
+        # Апдейты, пришедшие до конца startup, ждали в очереди
+        await receiver.start()
+        logger.info(f"Webhook: {url.rstrip('/')}{path}, приём на {host}:{port}, воркеров {workers}")
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        if started:
+            await receiver.stop()
+            await dispatcher.emit_shutdown(bot=bot)